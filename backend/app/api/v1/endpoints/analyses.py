@@ -1,18 +1,44 @@
-# app/api/v1/endpoints/analyses.py
+from typing import Optional
+
 from app import auth, db
-from app.services.analysis_service import AnalysisService
-from fastapi import APIRouter, Depends
+from app.services.analysis_service import AnalysisService, parse_fields
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
 
 router = APIRouter(prefix="/analyses", tags=["analysis"])
 analysis_service = AnalysisService()
 
 get_db = Depends(db.get_db)
+# 履歴一覧はリードレプリカから読む（レプリケーション遅延分だけ古い可能性がある）
+get_read_db = Depends(db.get_read_db)
 
 
 @router.get("")
-async def list_analyses(limit: int = 50, db: AsyncSession = get_db, user_id: int = Depends(auth.get_current_userid)):
-    return await analysis_service.list_analyses(db, user_id, limit)
+async def list_analyses(
+    response: Response,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = Query(None, description="カンマ区切りの返す項目（例: id,name,summary）。省略時は全項目"),
+    db: AsyncSession = get_read_db,
+    user_id: int = Depends(auth.get_current_userid),
+):
+    """新しい順の鑑定一覧。続きがある場合は X-Next-Cursor ヘッダーの値を `cursor` に渡して次のページを取得する。"""
+    try:
+        items, next_cursor = await analysis_service.list_analyses(db, user_id, limit, cursor=cursor, fields=parse_fields(fields))
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e)) from e
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return items
+
+
+# 1 件の取得は鑑定完了直後にフロントエンドが呼ぶので、書き込み直後の行が見えるプライマリから読む
+@router.get("/{analysis_id}")
+async def get_analysis(analysis_id: int, db: AsyncSession = get_db, user_id: int = Depends(auth.get_current_userid)):
+    found = await analysis_service.get_analysis(db, user_id, analysis_id)
+    if found is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Analysis not found")
+    return found
 
 
 @router.delete("/{analysis_id}")
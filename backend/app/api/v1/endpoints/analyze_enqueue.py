@@ -1,20 +1,27 @@
 # app/api/v1/endpoints/analyze_enqueue.py
-from app import auth, db, models
+import json
+
+from app import auth, db
 from app.schemas.inputs.analyze_request import AnalyzeRequest
-from app.services.job_service import JobService
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy import select
+from app.services.job_service import ANALYZE_BATCH_MAX_ITEMS, JobService
+from app.services.kanji_lookup import StrokesMemo, get_lookup_service
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.exceptions import RequestValidationError
+from pydantic import TypeAdapter, ValidationError
 from sqlalchemy.ext.asyncio import AsyncSession
 
 router = APIRouter(prefix="/analyze", tags=["analysis"])
 job_service = JobService()
 
-get_db = Depends(db.get_db)
+# 文字の検証は読み取りだけなのでリードレプリカを使う
+get_read_db = Depends(db.get_read_db)
 
 
 @router.post("/enqueue")
-async def analyze_enqueue(req: AnalyzeRequest, db: AsyncSession = get_db, user_id: int = Depends(auth.get_current_userid)) -> dict:
-    if not await validate_kanji_characters(req.name_sei, req.name_mei, db):
+async def analyze_enqueue(req: AnalyzeRequest, db: AsyncSession = get_read_db, user_id: int = Depends(auth.get_current_userid)) -> dict:
+    # 検証で取得した画数はジョブ引数としてワーカーへ渡し、ワーカー側での再取得を省く
+    memo: StrokesMemo = {}
+    if not await validate_kanji_characters(req.name_sei, req.name_mei, db, memo):
         raise HTTPException(status_code=422, detail="One or more characters not found in Kanji table")
 
     job = await job_service.enqueue_analysis(
@@ -24,19 +31,75 @@ async def analyze_enqueue(req: AnalyzeRequest, db: AsyncSession = get_db, user_i
         req.birth_date.isoformat(),  # ArqはRedisにジョブ引数をシリアライズして保存するので、"YYYY-MM-DD"形式の文字列として渡す（AnalyzeRequestは日付のバリデーションのためにdate型指定）
         int(req.birth_hour),
         req.birth_tz,
+        kanji_strokes=memo,
     )
     if job is None:
         raise HTTPException(status_code=500, detail="failed to enqueue job")
     return {"job_id": job.job_id}
 
 
+_batch_adapter = TypeAdapter(list[AnalyzeRequest])
+
+
+async def _read_batch_body(request: Request) -> list[AnalyzeRequest]:
+    """Parse a JSON array or an NDJSON body (one AnalyzeRequest per line)."""
+    body = await request.body()
+    content_type = request.headers.get("content-type", "")
+    try:
+        if "ndjson" in content_type or "jsonl" in content_type:
+            items = [json.loads(line) for line in body.splitlines() if line.strip()]
+        else:
+            items = json.loads(body or b"null")
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail="Request body is not valid JSON / NDJSON") from e
+    if not isinstance(items, list) or not items:
+        raise HTTPException(status_code=422, detail="Request body must be a non-empty list of analyze requests")
+    if len(items) > ANALYZE_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Too many items (max {ANALYZE_BATCH_MAX_ITEMS})")
+    try:
+        return _batch_adapter.validate_python(items)
+    except ValidationError as e:
+        raise RequestValidationError(e.errors(include_url=False)) from e
+
+
+@router.post("/batch")
+async def analyze_batch(request: Request, db: AsyncSession = get_read_db, user_id: int = Depends(auth.get_current_userid)) -> dict:
+    # 全件の文字をまとめて 1 回で検証し、1 つでも未登録の文字があればバッチ全体を受け付けない
+    reqs = await _read_batch_body(request)
+    memo: StrokesMemo = {}
+    stored = await get_lookup_service(session=db).get_strokes({ch for req in reqs for ch in req.name_sei + req.name_mei}, memo)
+    invalid = [i for i, req in enumerate(reqs) if any(ch not in stored for ch in req.name_sei + req.name_mei)]
+    if invalid:
+        raise HTTPException(status_code=422, detail={"message": "One or more characters not found in Kanji table", "items": invalid})
+
+    jobs = [
+        (
+            (user_id, req.name_sei, req.name_mei, req.birth_date.isoformat(), int(req.birth_hour), req.birth_tz),
+            {"kanji_strokes": {ch: memo[ch] for ch in set(req.name_sei + req.name_mei)}},
+        )
+        for req in reqs
+    ]
+    try:
+        batch = await job_service.enqueue_analysis_batch(user_id, jobs)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail="failed to enqueue batch") from e
+    return batch
+
+
+@router.get("/batch/{batch_id}")
+async def analyze_batch_status(batch_id: str, include_jobs: bool = Query(False), user_id: int = Depends(auth.get_current_userid)) -> dict:
+    # バッチ内の全ジョブの状態を集計して返す（include_jobs=true でジョブごとの状態も返す）
+    status = await job_service.get_batch_status(batch_id, user_id, include_jobs=include_jobs)
+    if status is None:
+        raise HTTPException(status_code=404, detail="batch not found")
+    return status
+
+
 # req.name_seiとreq.name_meiに含まれる文字がKanjiテーブルに存在しない場合Falseを返す
-async def validate_kanji_characters(name_sei: str, name_mei: str, db: AsyncSession) -> bool:
-    # name_sei + name_meiの文字について重複を排除してList化
-    chars = list(set(name_sei + name_mei))
-    # select char from kanji where char in (:char1, :char2, ...) で一括取得
-    stmt = select(models.Kanji).where(models.Kanji.char.in_(chars))
-    kanji = await db.execute(stmt)
+async def validate_kanji_characters(name_sei: str, name_mei: str, db: AsyncSession, memo: StrokesMemo | None = None) -> bool:
+    # name_sei + name_meiの文字について重複を排除
+    chars = set(name_sei + name_mei)
+    # select * from kanji where char in (:char1, :char2, ...) で一括取得（memo に画数が残る）
+    stored = await get_lookup_service(session=db).get_strokes(chars, memo)
     # 取得文字数がcharsの長さと一致しなければ存在しない文字があると判断
-    stored_chars = {row[0].char for row in kanji.fetchall()}
-    return len(stored_chars) == len(chars)
+    return len(stored) == len(chars)
@@ -5,7 +5,7 @@ from typing import Literal, Optional, cast
 
 from app import auth
 from app.db import get_db
-from app.services import mailer
+from app.services import mailer, password_service
 from app.services.user_service import create_user, get_user_by_id, get_user_by_username
 from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from fastapi.security import OAuth2PasswordRequestForm
@@ -53,8 +53,15 @@ async def login(response: Response, form_data: OAuth2PasswordRequestForm = oauth
     # lookup user in db
     user = await get_user_by_username(db, username)
     # If user not found or password invalid, return 401
-    if not user or not auth.verify_password(form_data.password, user.password_hash):
+    if not user:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid username or password")
+    verified, new_hash = await password_service.verify_and_update(form_data.password, user.password_hash)
+    if not verified:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid username or password")
+    if new_hash:
+        # stored hash used an outdated scheme / cost; replace it while we have the plain password
+        user.password_hash = new_hash
+        await db.commit()
 
     # Use immutable user id as the JWT `sub` so username changes won't invalidate tokens
     access_token = auth.create_access_token(subject=str(user.id), expires_delta=timedelta(minutes=15))
@@ -178,6 +185,8 @@ async def logout(response: Response):
 @router.get("/me")
 async def me(db: AsyncSession = asyncSession, user_id: int = Depends(auth.get_current_userid)):
     # Return basic user info including whether their email is verified.
+    # Read from the primary: right after signup / confirm-email a replica may not
+    # have the user (404) or may still report the old email_verified.
     # Frontend should use `email_verified` to decide whether to treat the session
     # as fully logged-in for protected flows.
     user = await get_user_by_id(db, user_id)
@@ -262,11 +271,14 @@ async def change_password(payload: ChangePasswordIn, db: AsyncSession = asyncSes
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
 
     # verify current password
-    if not auth.verify_password(payload.current_password, user.password_hash):
+    if not await password_service.verify_password(payload.current_password, user.password_hash):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="current password is incorrect")
 
     # set new password hash
-    user.password_hash = auth.get_password_hash(payload.new_password)
+    try:
+        user.password_hash = await password_service.hash_password(payload.new_password)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e)) from None
     db.add(user)
     await db.commit()
     return {"detail": "password changed"}
@@ -1,8 +1,9 @@
 # app/api/v1/endpoints/health.py
 import os
 
-from app import db
-from fastapi import APIRouter, HTTPException
+from app import auth, db
+from app.services import password_service
+from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy import text
 
 router = APIRouter(tags=["health"])
@@ -13,6 +14,24 @@ def health():
     return {"status": "ok"}
 
 
+@router.get("/health/db-pool")
+def db_pool(user_id: int = Depends(auth.get_current_userid)):
+    # 接続プールの使用状況と、接続を保持していた時間の分布（構成が分かるのでログイン必須）
+    return db.pool_stats()
+
+
+@router.get("/health/token-cache")
+def token_cache():
+    # JWT 検証結果キャッシュのヒット率など
+    return auth.token_cache.stats()
+
+
+@router.get("/health/password-hasher")
+def password_hasher():
+    # パスワード計算の順番待ち・処理中の数と待ち時間
+    return password_service.stats()
+
+
 @router.get("/ready")
 async def ready():
     checks = {"db": False, "redis": False}
@@ -20,7 +39,7 @@ async def ready():
 
     # DB check
     try:
-        async with db.engine.connect() as conn:
+        async with db.get_engine().connect() as conn:
             await conn.execute(text("SELECT 1"))
         checks["db"] = True
     except Exception as e:
@@ -0,0 +1,33 @@
+# app/api/v1/endpoints/job_stream.py
+from app import auth
+from app.services import llm_stream
+from app.services.job_service import JobService
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import StreamingResponse
+
+router = APIRouter(prefix="/jobs", tags=["jobs"])
+job_service = JobService()
+
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+@router.get("/{job_id}/stream")
+async def stream_job(job_id: str, request: Request, user_id: int = Depends(auth.get_current_userid)) -> StreamingResponse:
+    # Server-Sent Events: relays LLM chunks published by the worker (LLM_STREAMING=true).
+    # Reconnecting clients resume from the Last-Event-ID header.
+    # Fail fast instead of holding the connection open for a stream nothing will write to.
+    # Another user's job is reported as missing: the stream carries their name, birth data and reading.
+    if not llm_stream.LLM_STREAMING:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="LLM streaming is disabled")
+    if not await job_service.is_owner(job_id, user_id) or not await job_service.stream_available(job_id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    last_event_id = request.headers.get("last-event-id")
+    return StreamingResponse(job_service.stream_events(job_id, last_event_id), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+@router.get("/{job_id}/events")
+async def job_events(job_id: str, user_id: int = Depends(auth.get_current_userid)) -> StreamingResponse:
+    # Server-Sent Events: the current job status, then every status change until it finishes.
+    if not await job_service.is_owner(job_id, user_id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    return StreamingResponse(job_service.status_events(job_id), media_type="text/event-stream", headers=SSE_HEADERS)
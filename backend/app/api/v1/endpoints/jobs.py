@@ -1,12 +1,15 @@
 # app/api/v1/endpoints/jobs.py
 from app.services.job_service import JobService
-from fastapi import APIRouter
+from fastapi import APIRouter, Query
 
 router = APIRouter(prefix="/jobs", tags=["jobs"])
 job_service = JobService()
 
 
 @router.get("/{job_id}")
-async def get_job_status(job_id: str) -> dict:
+async def get_job_status(job_id: str, wait: int = Query(0, ge=0, le=60)) -> dict:
     # public endpoint: return job status (authorization handled elsewhere if needed)
+    # wait > 0: long-poll, respond as soon as the job finishes (or after `wait` seconds)
+    if wait:
+        return await job_service.wait_for_status(job_id, wait)
     return await job_service.get_job_status(job_id)
@@ -0,0 +1,37 @@
+# app/api/v1/endpoints/name_search.py
+import json
+
+from app import auth
+from app.schemas.inputs.name_search_request import NameSearchRequest
+from app.services import kanji_index, name_search
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+
+router = APIRouter(prefix="/names", tags=["names"])
+
+
+@router.post("/search")
+async def search_names(req: NameSearchRequest, user_id: int = Depends(auth.get_current_userid)) -> StreamingResponse:
+    # 姓に対して五格の点数が高い名の候補を、点数の高い順に NDJSON で 1 行ずつ返す（LLM は使わない）
+    index = await kanji_index.get_index()
+    sei = [ch for ch in req.name_sei if ch.strip()]
+    if not sei or any(ch not in index for ch in sei):
+        raise HTTPException(status_code=422, detail="One or more characters not found in Kanji table")
+
+    if req.chars:
+        groups = name_search.build_stroke_groups((ch, index.strokes_min(ch)) for ch in dict.fromkeys(req.chars) if ch in index)
+    else:
+        groups = name_search.default_stroke_groups(index)
+    groups = {s: chars for s, chars in groups.items() if s <= req.max_char_strokes}
+
+    candidates = name_search.search_names(
+        [index.strokes_min(ch) for ch in sei],
+        groups,
+        length=req.length,
+        k=req.k,
+        min_total=req.min_strokes or 0,
+        max_total=req.max_strokes if req.max_strokes is not None else req.length * req.max_char_strokes,
+        min_point=req.min_point,
+    )
+    lines = (json.dumps(c.to_dict(), ensure_ascii=False) + "\n" for c in candidates)
+    return StreamingResponse(lines, media_type="application/x-ndjson")
@@ -3,13 +3,15 @@ from fastapi import APIRouter
 
 from .endpoints import analyses, analyze_enqueue
 from .endpoints import auth as auth_router_module
-from .endpoints import health, jobs
+from .endpoints import health, job_stream, jobs, name_search
 
 api_router = APIRouter()
 api_router.include_router(health.router)
 api_router.include_router(jobs.router)
+api_router.include_router(job_stream.router)
 api_router.include_router(analyses.router)
 api_router.include_router(analyze_enqueue.router)
+api_router.include_router(name_search.router)
 
 # authentication routes
 api_router.include_router(auth_router_module.router)
@@ -1,7 +1,11 @@
+import hashlib
 import logging
 import os
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta, timezone
-from typing import Optional
+from typing import Any, Optional
 
 from app.db import get_db
 from fastapi import Depends, HTTPException, Request, status
@@ -10,13 +14,29 @@ from passlib.context import CryptContext
 from passlib.hash import pbkdf2_sha256
 from sqlalchemy.ext.asyncio import AsyncSession
 
-pwd_context = CryptContext(schemes=["bcrypt", "pbkdf2_sha256"], deprecated="auto")
+# Cost parameters for new hashes. Stored hashes with a lower cost (or a deprecated
+# scheme) are re-hashed on the next successful login (see verify_and_update_password).
+PASSWORD_BCRYPT_ROUNDS = int(os.getenv("PASSWORD_BCRYPT_ROUNDS", "12"))
+PASSWORD_PBKDF2_ROUNDS = int(os.getenv("PASSWORD_PBKDF2_ROUNDS", "29000"))
+
+pwd_context = CryptContext(
+    schemes=["bcrypt", "pbkdf2_sha256"],
+    deprecated="auto",
+    bcrypt__default_rounds=PASSWORD_BCRYPT_ROUNDS,
+    bcrypt__min_rounds=PASSWORD_BCRYPT_ROUNDS,
+    pbkdf2_sha256__default_rounds=PASSWORD_PBKDF2_ROUNDS,
+    pbkdf2_sha256__min_rounds=PASSWORD_PBKDF2_ROUNDS,
+)
 
 SECRET_KEY = os.getenv("JWT_SECRET", "change-me")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "15"))
 REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "7"))
 EMAIL_CONFIRM_EXPIRE_HOURS = int(os.getenv("EMAIL_CONFIRM_EXPIRE_HOURS", "24"))
+# Verified-token cache: max entries (0 disables it)
+JWT_CACHE_SIZE = int(os.getenv("JWT_CACHE_SIZE", "10000"))
+# "auto" uses PyJWT when it is installed (faster HS256 verification), else python-jose
+JWT_BACKEND = os.getenv("JWT_BACKEND", "auto").lower()
 
 async_session = Depends(get_db)
 
@@ -38,7 +58,43 @@ def get_password_hash(password: str) -> str:
         # an incompatible 'bcrypt' package), fall back to pbkdf2_sha256 to
         # avoid failing user signup. Log the exception for diagnostics.
         logging.exception("bcrypt hashing failed; falling back to pbkdf2_sha256")
-        return pbkdf2_sha256.hash(password)
+        return pbkdf2_sha256.using(rounds=PASSWORD_PBKDF2_ROUNDS).hash(password)
+
+
+def password_needs_rehash(hashed_password: str) -> bool:
+    """True when the hash uses a deprecated scheme or a lower cost than configured."""
+    try:
+        return pwd_context.needs_update(hashed_password)
+    except ValueError:
+        # not a hash format this context knows (nothing to upgrade to)
+        return False
+
+
+_rehash_unavailable = False
+
+
+def verify_and_update_password(plain_password: str, hashed_password: str) -> tuple[bool, Optional[str]]:
+    """Verify a password and, if its hash is outdated, return a new hash to store.
+
+    Returns (verified, new_hash); new_hash is None when the stored hash is current.
+    If a fresh hash would itself be outdated (bcrypt unusable, so hashing falls
+    back to pbkdf2_sha256) upgrading is skipped from then on instead of
+    re-hashing on every login.
+    """
+    global _rehash_unavailable
+    if not verify_password(plain_password, hashed_password):
+        return False, None
+    if _rehash_unavailable or not password_needs_rehash(hashed_password):
+        return True, None
+    try:
+        new_hash = get_password_hash(plain_password)
+    except ValueError:
+        return True, None
+    if password_needs_rehash(new_hash):
+        logging.warning("password hashes cannot be upgraded with the available backends; skipping rehash on login")
+        _rehash_unavailable = True
+        return True, None
+    return True, new_hash
 
 
 def create_access_token(subject: str, expires_delta: Optional[timedelta] = None) -> str:
@@ -63,16 +119,134 @@ def create_email_token(subject: str, expires_delta: Optional[timedelta] = None)
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
+def _select_backend(name: str) -> str:
+    if name in ("auto", "pyjwt"):
+        try:
+            import jwt as _pyjwt  # noqa: F401
+        except ImportError:
+            if name == "pyjwt":
+                logging.warning("JWT_BACKEND=pyjwt but PyJWT is not installed; using python-jose")
+            return "jose"
+        return "pyjwt"
+    return "jose"
+
+
+jwt_backend = _select_backend(JWT_BACKEND)
+
+
+def _verify_signature(token: str) -> dict:
+    """Check the signature and return the claims; `exp` is checked by the caller."""
+    if jwt_backend == "pyjwt":
+        import jwt as pyjwt
+
+        try:
+            return pyjwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM], options={"verify_exp": False})
+        except pyjwt.PyJWTError as e:
+            raise JWTError(str(e)) from e
+    return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM], options={"verify_exp": False})
+
+
+class TokenCache:
+    """LRU of verified token claims keyed by the token's sha256, valid until the token's `exp`.
+
+    Tokens are stateless (there is no revocation list), so serving a cached
+    result until `exp` accepts exactly the tokens a fresh verification would.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries: OrderedDict[bytes, tuple[dict, float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def key(token: str) -> bytes:
+        return hashlib.sha256(token.encode("utf-8")).digest()
+
+    def get(self, key: bytes, now: float) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            payload, exp = entry
+            if exp <= now:
+                del self._entries[key]
+                self.expired += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return payload
+
+    def put(self, key: bytes, payload: dict, exp: float) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (payload, exp)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.expired = self.evictions = 0
+
+    def stats(self) -> dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "backend": jwt_backend,
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "expired": self.expired,
+            "evictions": self.evictions,
+        }
+
+
+token_cache = TokenCache(JWT_CACHE_SIZE)
+
+
+def _invalid_credentials() -> HTTPException:
+    return HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not validate credentials")
+
+
 def decode_token(token: str) -> dict:
+    now = time.time()
+    key = TokenCache.key(token)
+    cached = token_cache.get(key, now)
+    if cached is not None:
+        return dict(cached)
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        # Ensure token contains a subject ('sub'). Centralized validation
-        # helps callers rely on decode_token to raise on malformed tokens.
-        if not payload.get("sub"):
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token payload: missing subject")
-        return payload
+        payload = _verify_signature(token)
     except JWTError:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not validate credentials") from None
+        raise _invalid_credentials() from None
+    # Ensure token contains a subject ('sub'). Centralized validation
+    # helps callers rely on decode_token to raise on malformed tokens.
+    if not payload.get("sub"):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token payload: missing subject")
+    if "exp" not in payload:
+        # no expiry to bound a cache entry with; verify it every time
+        return payload
+    # 'exp' is stored as a string of epoch seconds (see create_access_token)
+    try:
+        exp = float(payload["exp"])
+    except (TypeError, ValueError):
+        raise _invalid_credentials() from None
+    if exp <= now:
+        raise _invalid_credentials()
+    token_cache.put(key, payload, exp)
+    return dict(payload)
 
 
 async def get_current_userid(request: Request, db: AsyncSession = async_session) -> int:
@@ -1,11 +1,33 @@
+import logging
 import os
+from contextlib import asynccontextmanager
 
+from app import db
 from app.api.v1.router import api_router
 from app.middleware import CSRFMiddleware
-from fastapi import FastAPI
+from app.services import job_service, password_service
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 
-app = FastAPI(title="Fortunes API")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Pooled DB engine bound to the server's event loop (connections are reused across requests).
+    await db.init_engine()
+    # Long-lived Redis pool shared by every request (enqueue / job polling).
+    try:
+        await job_service.init_pool()
+    except Exception:
+        # Redis may not be up yet; JobService opens the pool lazily on first use.
+        logging.exception("Failed to open Redis pool at startup")
+    yield
+    await job_service.close_pool()
+    await db.dispose_engine()
+    password_service.shutdown()
+
+
+app = FastAPI(title="Fortunes API", lifespan=lifespan)
 
 # Allow origins can be configured via FRONTEND_ORIGINS env var (comma-separated).
 # When using cookies with cross-site requests, do NOT use '*' as allow_origins; set specific origins.
@@ -21,9 +43,17 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # GET /analyses のページング用カーソル
+    expose_headers=["X-Next-Cursor"],
 )
 
 # CSRF protection (double submit cookie). CSRF cookie is created on safe requests.
 app.add_middleware(CSRFMiddleware)
 
 app.include_router(api_router, prefix="/api/v1")
+
+
+@app.exception_handler(password_service.PasswordHasherBusy)
+async def password_hasher_busy(request: Request, exc: password_service.PasswordHasherBusy):
+    # ログイン集中時はパスワード計算の順番待ちを打ち切り、少し待って再試行してもらう
+    return JSONResponse(status_code=503, content={"detail": "Too many login requests, try again shortly"}, headers={"Retry-After": "1"})
@@ -1,6 +1,6 @@
 from datetime import datetime
 
-from sqlalchemy import JSON, TIMESTAMP, Boolean, ForeignKey, Integer, Text
+from sqlalchemy import JSON, TIMESTAMP, Boolean, ForeignKey, Index, Integer, Text
 from sqlalchemy.orm import Mapped, mapped_column  # mypy の推論を利用するためmapped_columnを使用
 from sqlalchemy.sql import func
 
@@ -21,6 +21,8 @@ class Analysis(Base):
     detail: Mapped[str | None] = mapped_column(Text)
     created_at: Mapped[datetime] = mapped_column(TIMESTAMP(timezone=True), server_default=func.now())
 
+    __table_args__ = (Index("idx_analyses_user_created", "user_id", created_at.desc(), id.desc()),)
+
 
 class Kanji(Base):
     __tablename__ = "kanji"
@@ -33,6 +35,14 @@ class Kanji(Base):
     source: Mapped[str] = mapped_column(Text, nullable=True)
 
 
+class KanjiMeta(Base):
+    __tablename__ = "kanji_meta"
+
+    key: Mapped[str] = mapped_column(Text, primary_key=True)
+    value: Mapped[str] = mapped_column(Text, nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(TIMESTAMP(timezone=True), server_default=func.now())
+
+
 class LLMResponse(Base):
     __tablename__ = "llm_responses"
 
@@ -47,6 +57,7 @@ class LLMResponse(Base):
     response_text: Mapped[str] = mapped_column(Text, nullable=True)
     usage: Mapped[dict] = mapped_column(JSON, nullable=True)
     raw: Mapped[dict] = mapped_column(JSON, nullable=True)  # TODO: 生データのマスク処理を追加する
+    cache_hit: Mapped[bool] = mapped_column(Boolean, nullable=False, server_default="false")
     created_at: Mapped[str] = mapped_column(TIMESTAMP(timezone=True), server_default=func.now())
 
 
@@ -0,0 +1,14 @@
+from typing import Annotated, Optional
+
+from pydantic import BaseModel, Field
+
+
+class NameSearchRequest(BaseModel):
+    name_sei: Annotated[str, Field(min_length=1, max_length=50)]
+    length: Annotated[int, Field(ge=1, le=3)] = 2  # 名の文字数
+    k: Annotated[int, Field(ge=1, le=500)] = 50  # 返す候補数
+    min_strokes: Annotated[Optional[int], Field(ge=0)] = None  # 名の画数合計（地格）の下限
+    max_strokes: Annotated[Optional[int], Field(ge=0)] = None  # 名の画数合計（地格）の上限
+    max_char_strokes: Annotated[int, Field(ge=1, le=64)] = 30  # 1 文字あたりの画数の上限
+    min_point: Annotated[int, Field(ge=0, le=5)] = 0  # 人格・地格・外格・総格すべてがこの点数以上
+    chars: Annotated[Optional[str], Field(max_length=5000)] = None  # 候補に使う漢字（未指定なら基本漢字すべて）
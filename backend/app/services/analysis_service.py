@@ -1,45 +1,104 @@
-# app/services/analysis_service.py
-from typing import List
+import base64
+import binascii
+from datetime import datetime
+from typing import Any, Iterable, List, Optional
 
 from app import models
 from app.schemas.outputs.analysis_out import AnalysisOut
-from app.utils.dto import dto_list
-from sqlalchemy import Integer, cast, func, select
+from app.utils.dto import dto_list, dto_one
+from sqlalchemy import Integer, cast, func, literal, select, tuple_
 from sqlalchemy.ext.asyncio import AsyncSession
 
+# SQL: (birth_datetime AT TIME ZONE timezone) yields timestamp without tz in that zone,
+# so wrap with date() / extract(hour ...)
+_local_ts = func.timezone(models.Analysis.birth_tz, models.Analysis.birth_datetime)  # timezone(zone, timestamptz)
+
+# AnalysisOut field -> column expression (birth_date / birth_hour are only computed when requested)
+ANALYSIS_COLUMNS: dict[str, Any] = {
+    "id": models.Analysis.id,
+    "name": models.Analysis.name,
+    "birth_date": func.date(_local_ts).label("birth_date"),
+    "birth_hour": cast(func.extract("hour", _local_ts), Integer).label("birth_hour"),
+    "birth_tz": models.Analysis.birth_tz,
+    "result_name": models.Analysis.result_name,
+    "result_birth": models.Analysis.result_birth,
+    "summary": models.Analysis.summary,
+    "detail": models.Analysis.detail,
+    "created_at": models.Analysis.created_at,
+}
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(created_at: datetime, analysis_id: int) -> str:
+    """Opaque page cursor: the (created_at, id) of the last row returned."""
+    raw = f"{created_at.isoformat()}|{analysis_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, analysis_id = raw.split("|")
+        return datetime.fromisoformat(created_at), int(analysis_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise InvalidCursor(f"invalid cursor: {cursor!r}") from e
+
+
+def parse_fields(fields: Optional[str]) -> Optional[list[str]]:
+    """`fields=id,name,summary` -> ["id", "name", "summary"] (None = every field). `id` is always included."""
+    if fields is None:
+        return None
+    names = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in names if f not in ANALYSIS_COLUMNS]
+    if unknown:
+        raise ValueError(f"unknown fields: {', '.join(unknown)}")
+    return ["id", *dict.fromkeys(f for f in names if f != "id")]
+
 
 class AnalysisService:
-    async def list_analyses(self, db: AsyncSession, user_id: int, limit: int = 50) -> List[AnalysisOut]:
-        # stmt = select(models.Analysis).order_by(models.Analysis.id.desc()).limit(limit)
-
-        # SQL: (birth_datetime AT TIME ZONE timezone) yields timestamp without tz in that zone,
-        # so wrap with date() / extract(hour ...)
-        local_ts = func.timezone(models.Analysis.birth_tz, models.Analysis.birth_datetime)  # timezone(zone, timestamptz)
-
-        stmt = (
-            select(
-                models.Analysis.id,
-                models.Analysis.user_id,
-                models.Analysis.name,
-                func.date(local_ts).label("birth_date"),
-                cast(func.extract("hour", local_ts), Integer).label("birth_hour"),
-                models.Analysis.birth_tz,
-                models.Analysis.result_birth,
-                models.Analysis.result_name,
-                models.Analysis.summary,
-                models.Analysis.detail,
-                models.Analysis.created_at,
-            )
-            .where(models.Analysis.user_id == user_id)
-            .order_by(models.Analysis.created_at.desc())
-            .limit(limit)
-        )
+    async def list_analyses(
+        self,
+        db: AsyncSession,
+        user_id: int,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        fields: Optional[Iterable[str]] = None,
+    ) -> tuple[List[Any], Optional[str]]:
+        """One page of the user's analyses, newest first, and the cursor of the next page (None on the last page).
+
+        Keyset pagination on (created_at, id) served by idx_analyses_user_created,
+        so deep pages cost the same as the first one. With `fields` only those
+        columns are selected and the rows are returned as dicts.
+        """
+        names = list(fields) if fields is not None else list(ANALYSIS_COLUMNS)
+        # created_at / id are needed for the next cursor even if not requested
+        selected = list(dict.fromkeys([*names, "id", "created_at"]))
+
+        stmt = select(*(ANALYSIS_COLUMNS[f] for f in selected)).where(models.Analysis.user_id == user_id).order_by(models.Analysis.created_at.desc(), models.Analysis.id.desc()).limit(limit + 1)
+        if cursor:
+            created_at, analysis_id = decode_cursor(cursor)
+            stmt = stmt.where(tuple_(models.Analysis.created_at, models.Analysis.id) < tuple_(literal(created_at), literal(analysis_id)))
 
         res = await db.execute(stmt)
         rows = [r._mapping for r in res]
         # rows[i]["birth_date"] -> date, rows[i]["birth_hour"] -> int, rows[i]["birth_tz"] -> str
 
-        return dto_list(rows, AnalysisOut)
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1]["created_at"], rows[-1]["id"])
+
+        if fields is None:
+            return dto_list(rows, AnalysisOut), next_cursor
+        return [{f: row[f] for f in names} for row in rows], next_cursor
+
+    async def get_analysis(self, db: AsyncSession, user_id: int, analysis_id: int) -> Optional[AnalysisOut]:
+        stmt = select(*ANALYSIS_COLUMNS.values()).where(models.Analysis.id == analysis_id, models.Analysis.user_id == user_id)
+        row = (await db.execute(stmt)).first()
+        return dto_one(row._mapping, AnalysisOut) if row is not None else None
 
     async def delete_analysis(self, db: AsyncSession, user_id: int, analysis_id: int) -> bool:
         stmt = select(models.Analysis).where(models.Analysis.id == analysis_id, models.Analysis.user_id == user_id)
@@ -0,0 +1,91 @@
+"""
+命式・五行バランス・総合鑑定のメモ化
+
+命式から先の計算（五行バランス、四柱の解釈、総合鑑定）は四柱の組み合わせだけで決まるので、
+柱コード (年, 月, 日, 時) をキーにした LRU キャッシュで結果を共有します。
+同じ誕生日（とその時刻帯）の鑑定はキャッシュから返るため、辞書の組み立てはほぼ発生しません。
+
+- 返す構造は読み取り専用（`FrozenDict` / `FrozenList`）で、ジョブ間で同じオブジェクトを共有する
+  変更が必要な場合は `dict(...)` などでコピーしてから使うこと
+- BIRTH_READING_CACHE_SIZE: キャッシュの上限件数（既定 4096）
+- ヒット数・ミス数は `cache_info()` で取得できる
+"""
+
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass
+from datetime import datetime
+from functools import lru_cache
+from typing import Any
+
+from app.services.calc_birth_analysis import synthesize_reading
+from app.services.calc_gogyo import calc_wuxing_balance
+from app.services.calc_meishiki import decode_pillars, get_meishiki_codes
+
+BIRTH_READING_CACHE_SIZE = int(os.getenv("BIRTH_READING_CACHE_SIZE", "4096"))
+
+
+class FrozenDict(dict):
+    """A dict that refuses mutation (still JSON-serializable and `|`-mergeable)."""
+
+    def _readonly(self, *args: Any, **kwargs: Any) -> None:
+        raise TypeError("birth reading is shared and read-only; copy it before modifying")
+
+    __setitem__ = __delitem__ = __ior__ = _readonly  # type: ignore[assignment]
+    clear = pop = popitem = setdefault = update = _readonly  # type: ignore[assignment]
+
+
+class FrozenList(tuple):
+    """A tuple that renders and compares like a list, so prompts stay identical (`['木']`)."""
+
+    def __repr__(self) -> str:
+        return repr(list(self))
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, list):
+            return list(self) == other
+        return tuple.__eq__(self, other)
+
+    def __ne__(self, other: object) -> bool:
+        return not self == other
+
+    __hash__ = tuple.__hash__
+
+
+def freeze(obj: Any) -> Any:
+    """Recursively convert dicts / lists into their read-only counterparts."""
+    if isinstance(obj, dict):
+        return FrozenDict((k, freeze(v)) for k, v in obj.items())
+    if isinstance(obj, (list, tuple)):
+        return FrozenList(freeze(v) for v in obj)
+    return obj
+
+
+@dataclass(frozen=True, slots=True)
+class BirthReading:
+    meishiki: FrozenDict  # {"年柱": "甲子", ...}
+    gogyo: FrozenDict  # {"木": 2, ...}
+    reading: FrozenDict  # synthesize_reading() の結果
+
+
+@lru_cache(maxsize=BIRTH_READING_CACHE_SIZE)
+def reading_for_pillars(codes: tuple[int, int, int, int]) -> BirthReading:
+    """Build (once per pillar combination) the shared reading for pillar codes."""
+    meishiki = decode_pillars(codes)
+    balance = calc_wuxing_balance(meishiki)
+    return BirthReading(freeze(meishiki), freeze(balance), freeze(synthesize_reading(meishiki, balance)))
+
+
+def get_birth_reading(dt: datetime) -> BirthReading:
+    """Return the memoized meishiki, gogyo balance and reading for a birth datetime."""
+    return reading_for_pillars(get_meishiki_codes(dt))
+
+
+def cache_info() -> dict[str, int]:
+    info = reading_for_pillars.cache_info()
+    return {"hits": info.hits, "misses": info.misses, "size": info.currsize, "maxsize": info.maxsize or 0}
+
+
+def cache_clear() -> None:
+    reading_for_pillars.cache_clear()
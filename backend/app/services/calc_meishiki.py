@@ -4,79 +4,61 @@
 ここでは「実装しやすいけど、それなりに四柱推命っぽくなる“簡易版”」を出します。
 - 西暦年月日＋24時制の時刻 →
 年柱・月柱・日柱・時柱（十干十二支）
-※本格的にやるなら「節入り（立春など）の厳密計算」が必要ですが、ここでは
-- 立春を毎年 2/4 固定
+- 年柱は立春、月柱は節入り（`solar_terms` の前計算テーブル、1900〜2100 年）で切り替える
+  テーブル範囲外の日時は「立春を毎年 2/4 固定・暦月で月を決める」近似にフォールバック
 - 月干は「年干＋月番号」ルール
-という、実装しやすい近似を使っています。
+- タイムゾーンの無い日時は日本時間（+09:00）として扱う
+
+命式は (日付, 時刻) だけで決まるので、干支の組み合わせはモジュール読み込み時に
+テーブルとして前計算し、1 件の計算は数回の配列参照で済ませます。
+- 柱は整数コード（十干 index × 12 + 十二支 index、0〜119）で表す
+  ※月柱は簡易ルールのため 60 干支に無い組み合わせ（乙寅など）も出るので 120 通り
+- 大量の日時は `get_meishiki_many()` で NumPy によりまとめて計算できる
 """
 
-from datetime import date, datetime
+from datetime import date, datetime, timedelta, timezone
+from typing import Iterable, Sequence
+
+import numpy as np
+
+from . import solar_terms
 
 # 1. 基本データの準備
 from .constants import HOUR_STEM_TABLE, JUNISHI, TENKAN
 
-# 甲子を基準にした60干支
-_KANSHI = [TENKAN[i % 10] + JUNISHI[i % 12] for i in range(60)]
+DEFAULT_TZ = timezone(timedelta(hours=9))
+_DEFAULT_OFFSET = int(DEFAULT_TZ.utcoffset(None).total_seconds())
 
 
-# 2. 年柱の計算（簡易版：立春を2/4固定）
-def _get_year_pillar(dt: datetime) -> str:
-    """
-    年柱を求める簡易ロジック
-    ・立春を毎年 2月4日 固定とする
-    """
-    y = dt.year
-    # 立春前なら前年として扱う
-    lichun = date(y, 2, 4)
-    if dt.date() < lichun:
-        y -= 1
-
-    # 参考基準：1984年を甲子年とする（実務でよく使われる近似）
-    # 1984年 = 甲子
-    offset = y - 1984
-    idx = offset % 60
-    return _KANSHI[idx]
-
-
-# 3. 月柱の計算（簡易：節入り無視で“月番号”を使う）
-# 四柱推命の月柱は本来「節入り」で変わりますが、
-# ここではざっくり「2月＝寅月」として扱う簡易版です。
-# - 寅月を1番、卯月を2番、…、丑月を12番として
-# 月干＝年干の番号＋月番号−1
-def _get_month_index(dt: datetime) -> int:
-    """
-    寅月を1とした月番号の簡易版。
-    本来は節入りで月が変わるが、ここではざっくりグレゴリオ暦の月で近似。
-    2月 → 寅月(1), 3月 → 卯月(2), ..., 1月 → 丑月(12)
-    """
-    m = dt.month
-    # 2月を1としてローテーション
-    idx = (m - 2) % 12 + 1
-    return idx
+def pillar_code(stem: int, branch: int) -> int:
+    """Encode a (stem index, branch index) pair as an integer pillar code."""
+    return stem * 12 + branch
 
 
-def _get_month_pillar(dt: datetime, year_pillar: str):
-    """
-    月柱を求める簡易ロジック
-    ・寅月 = 1 として月番号を計算
-    ・月支：寅から順に
-    ・月干：年干の位置＋月番号−1
-    """
-    month_index = _get_month_index(dt)  # 1〜12
+# 柱コード → 文字列（例: 0 → 甲子）
+PILLAR_NAMES = tuple(TENKAN[c // 12] + JUNISHI[c % 12] for c in range(120))
+_PILLAR_NAMES_ARR = np.array(PILLAR_NAMES)
 
-    # 月支：寅(寅=2番目)からスタート
-    month_branch = JUNISHI[(2 + month_index - 1) % 12]  # 寅を起点
+# 甲子を基準にした60干支（60 干支 index → 柱コード）
+_KANSHI_CODES = tuple(pillar_code(i % 10, i % 12) for i in range(60))
+_KANSHI = [PILLAR_NAMES[c] for c in _KANSHI_CODES]
 
-    # 年干
-    year_stem = year_pillar[0]  # 甲乙丙...
 
-    # 年干のインデックス
-    y_idx = TENKAN.index(year_stem)
+# 2. 年柱の計算（立春で切り替え。テーブル範囲外は立春を2/4固定）
+# ・立春前なら前年として扱う
+# ・参考基準：1984年を甲子年とする（実務でよく使われる近似）
+_BASE_YEAR = 1984
+_LICHUN = (2, 4)
 
-    # 月干：年干＋月番号−1
-    month_stem = TENKAN[(y_idx + month_index - 1) % 10]
 
-    return month_stem + month_branch
+# 3. 月柱の計算（節入りで切り替え）
+# - 寅月（立春〜）を0番、卯月（啓蟄〜）を1番、…、丑月（小寒〜）を11番として
+# 月干＝年干の番号＋月番号、月支＝寅から順に
+# テーブル範囲外は「2月＝寅月」として暦月で近似する
+# 2月 → 寅月(0), 3月 → 卯月(1), ..., 1月 → 丑月(11)
+_MONTH_INDEX = tuple((m - 2) % 12 for m in range(1, 13))  # 暦月-1 → 月番号
+# 年柱（60 干支 index）× 月番号 → 月柱コード（60×12）
+_MONTH_TABLE = tuple(pillar_code((y % 10 + mi) % 10, (2 + mi) % 12) for y in range(60) for mi in range(12))
 
 
 # 4. 日柱の計算（基準日からの経過日で干支を求める）
@@ -84,15 +66,9 @@ def _get_month_pillar(dt: datetime, year_pillar: str):
 # ここではよく使われる
 # - 1984-02-02 を 甲子日
 # として扱います。
-def _get_day_pillar(dt: datetime) -> str:
-    """
-    日柱（その日の干支）を求める。
-    ・1984-02-02 を 甲子日 として基準にする。
-    """
-    base = date(1984, 2, 2)  # 甲子日（近似）
-    delta = dt.date() - base
-    idx = delta.days % 60
-    return _KANSHI[idx]
+_BASE_DAY = date(1984, 2, 2).toordinal()  # 甲子日（近似）
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+_BASE_DAY_EPOCH = _BASE_DAY - _EPOCH_ORDINAL
 
 
 # 5. 時柱の計算（時刻＋日干から求める）
@@ -100,44 +76,48 @@ def _get_day_pillar(dt: datetime) -> str:
 # - 時刻 → 地支（2時間ごと）
 # - 日干＋時支 → 時干
 # というルールです。
-def _get_hour_branch(hour: int) -> str:
-    """
-    時刻（0〜23）から時支を求める。
-    子：23〜1時、丑：1〜3時... だが、
-    ここでは簡易的に
-    23,0 → 子
-    1,2 → 丑
-    3,4 → 寅
-    ...
-    とする。
-    """
-    # 23時は子とみなす
-    if hour == 23:
-        idx = 0
-    else:
-        idx = ((hour + 1) // 2) % 12
-    return JUNISHI[idx]
+# 時支は簡易的に 23,0 → 子 / 1,2 → 丑 / 3,4 → 寅 ... とする。
+_HOUR_BRANCH = tuple(0 if h == 23 else ((h + 1) // 2) % 12 for h in range(24))
+# 日干 × 時支 → 時柱コード（10×12）
+_HOUR_TABLE = tuple(pillar_code(TENKAN.index(HOUR_STEM_TABLE[TENKAN[s]][b]), b) for s in range(10) for b in range(12))
 
+_MONTH_INDEX_ARR = np.array(_MONTH_INDEX, dtype=np.int64)
+_MONTH_TABLE_ARR = np.array(_MONTH_TABLE, dtype=np.int16)
+_HOUR_BRANCH_ARR = np.array(_HOUR_BRANCH, dtype=np.int64)
+_HOUR_TABLE_ARR = np.array(_HOUR_TABLE, dtype=np.int16)
+_KANSHI_CODES_ARR = np.array(_KANSHI_CODES, dtype=np.int16)
 
-def _get_hour_pillar(dt: datetime, day_pillar: str) -> str:
-    """
-    時柱を求める
-    ・時支：時刻から算出
-    ・時干：日干＋時支の位置からテーブルで取得
-    """
-    h = dt.hour
-    branch = _get_hour_branch(h)
-    day_stem = day_pillar[0]
 
-    # 子〜亥を 0〜11 に対応
-    b_idx = JUNISHI.index(branch)
-    stem = HOUR_STEM_TABLE[day_stem][b_idx]
+# 6. 命式をまとめて計算する関数
+def _timestamp(dt: datetime) -> float:
+    if dt.tzinfo is not None:
+        return dt.timestamp()
+    return (dt.toordinal() - _EPOCH_ORDINAL) * 86400 + dt.hour * 3600 + dt.minute * 60 + dt.second - _DEFAULT_OFFSET
 
-    return stem + branch
+
+def get_meishiki_codes(dt: datetime) -> tuple[int, int, int, int]:
+    """Return the (year, month, day, hour) pillar codes for a datetime."""
+    found = solar_terms.sekki_month(_timestamp(dt))
+    if found is not None:
+        year, month_index = found
+    else:
+        year, month_index = dt.year - ((dt.month, dt.day) < _LICHUN), _MONTH_INDEX[dt.month - 1]
+    year_i = (year - _BASE_YEAR) % 60
+    day_i = (dt.toordinal() - _BASE_DAY) % 60
+    return (
+        _KANSHI_CODES[year_i],
+        _MONTH_TABLE[year_i * 12 + month_index],
+        _KANSHI_CODES[day_i],
+        _HOUR_TABLE[(day_i % 10) * 12 + _HOUR_BRANCH[dt.hour]],
+    )
+
+
+def decode_pillars(codes: Sequence[int]) -> dict[str, str]:
+    """Turn (year, month, day, hour) pillar codes into the `get_meishiki` dict."""
+    y, m, d, h = codes
+    return {"年柱": PILLAR_NAMES[y], "月柱": PILLAR_NAMES[m], "日柱": PILLAR_NAMES[d], "時柱": PILLAR_NAMES[h]}
 
 
-# 6. 命式をまとめて計算する関数
-# ここまでを1つにまとめます。
 def get_meishiki(dt: datetime) -> dict[str, str]:
     """
     与えられた日時から
@@ -147,14 +127,55 @@ def get_meishiki(dt: datetime) -> dict[str, str]:
     ・時柱
     を簡易計算する。
     """
-    year_p = _get_year_pillar(dt)
-    month_p = _get_month_pillar(dt, year_p)
-    day_p = _get_day_pillar(dt)
-    hour_p = _get_hour_pillar(dt, day_p)
-
-    return {
-        "年柱": year_p,
-        "月柱": month_p,
-        "日柱": day_p,
-        "時柱": hour_p,
-    }
+    return decode_pillars(get_meishiki_codes(dt))
+
+
+def _split_datetimes(dts: Iterable[datetime] | np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Split datetimes into (datetime64[D] wall-clock dates, int hours, UTC epoch seconds)."""
+    if isinstance(dts, np.ndarray) and dts.dtype.kind == "M":
+        # datetime64 は DEFAULT_TZ の壁時計時刻とみなす
+        seconds = dts.astype("datetime64[s]")
+        days = seconds.astype("datetime64[D]")
+        hours = (seconds - days).astype("timedelta64[h]").astype(np.int64)
+        return days, hours, seconds.astype(np.int64) - _DEFAULT_OFFSET
+    # タイムゾーン付きの datetime もその地域の壁時計時刻で計算する（get_meishiki と同じ）
+    # 1 件ずつ datetime64 に変換するより、序数と時を 1 つの整数にまとめて取り出す方が速い
+    dts = dts if isinstance(dts, Sequence) else list(dts)
+    packed = np.fromiter((dt.toordinal() * 24 + dt.hour for dt in dts), dtype=np.int64, count=len(dts))
+    timestamps = np.fromiter(map(_timestamp, dts), dtype=np.float64, count=len(dts))
+    days = (packed // 24 - _EPOCH_ORDINAL).astype("datetime64[D]")
+    return days, packed % 24, timestamps
+
+
+def get_meishiki_codes_many(dts: Iterable[datetime] | np.ndarray) -> np.ndarray:
+    """Vectorized `get_meishiki_codes`: an `(n, 4)` int16 array of pillar codes.
+
+    Accepts datetimes or a `datetime64` array (read as DEFAULT_TZ wall-clock time).
+    """
+    days, hour, timestamps = _split_datetimes(dts)
+    months = days.astype("datetime64[M]")
+    years = months.astype("datetime64[Y]")
+
+    month0 = (months - years).astype(np.int64)  # 0〜11
+    day0 = (days - months).astype(np.int64)  # 0 始まりの日
+    before_lichun = (month0 < _LICHUN[0] - 1) | ((month0 == _LICHUN[0] - 1) & (day0 < _LICHUN[1] - 1))
+
+    sekki_year, sekki_month, in_table = solar_terms.sekki_month_many(timestamps)
+    year = np.where(in_table, sekki_year, years.astype(np.int64) + 1970 - before_lichun)
+    month_index = np.where(in_table, sekki_month, _MONTH_INDEX_ARR[month0])
+
+    year_i = (year - _BASE_YEAR) % 60
+    day_i = (days.astype(np.int64) - _BASE_DAY_EPOCH) % 60
+
+    out = np.empty((len(days), 4), dtype=np.int16)
+    out[:, 0] = _KANSHI_CODES_ARR[year_i]
+    out[:, 1] = _MONTH_TABLE_ARR[year_i * 12 + month_index]
+    out[:, 2] = _KANSHI_CODES_ARR[day_i]
+    out[:, 3] = _HOUR_TABLE_ARR[(day_i % 10) * 12 + _HOUR_BRANCH_ARR[hour]]
+    return out
+
+
+def get_meishiki_many(dts: Iterable[datetime] | np.ndarray) -> list[dict[str, str]]:
+    """Vectorized `get_meishiki` for bulk recomputation."""
+    names = _PILLAR_NAMES_ARR[get_meishiki_codes_many(dts)].tolist()
+    return [{"年柱": y, "月柱": m, "日柱": d, "時柱": h} for y, m, d, h in names]
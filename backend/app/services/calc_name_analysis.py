@@ -1,5 +1,7 @@
-from typing import Optional, TypedDict
+from dataclasses import dataclass
+from typing import Optional, Sequence, TypedDict
 
+import numpy as np
 from app import models
 from app.services.constants import FORTUNE_POINT, KAKUSUU_FORTUNE, TOUGEN_FORTUNE
 from sqlalchemy.orm import Session
@@ -40,6 +42,29 @@ def get_kanji(session: Session, char: str) -> tuple[str, int] | None:
     return char, int(k.strokes_min)
 
 
+def _gogaku_entry(value: int) -> GogakuEntry:
+    """Get the fortune dictionary for a given stroke count value."""
+    fortune_key = KAKUSUU_FORTUNE.get(value)
+    fortune_point = FORTUNE_POINT.get(fortune_key) if fortune_key is not None else None
+    tougen = TOUGEN_FORTUNE.get(fortune_key) if fortune_key is not None else None
+    short = tougen.get("短文") if tougen is not None else ""
+    if short is None:
+        short = ""
+    long = tougen.get("長文") if tougen is not None else ""
+    if long is None:
+        long = ""
+
+    return {
+        "値": value,
+        "吉凶": fortune_key,
+        "吉凶ポイント": fortune_point,
+        "桃源": {
+            "短文": short,
+            "長文": long,
+        },
+    }
+
+
 def get_gogaku(sei: list[tuple[str, int]], mei: list[tuple[str, int]]) -> GokakuDict:
     """Calculate the Five Grids (五格) based on the strokes of the surname (姓) and given name (名).
     Args:
@@ -57,28 +82,6 @@ def get_gogaku(sei: list[tuple[str, int]], mei: list[tuple[str, int]]) -> Gokaku
             total += strokes
         return total
 
-    def get_gogaku_dict(value: int) -> GogakuEntry:
-        """Get the fortune dictionary for a given stroke count value."""
-        fortune_key = KAKUSUU_FORTUNE.get(value)
-        fortune_point = FORTUNE_POINT.get(fortune_key) if fortune_key is not None else None
-        tougen = TOUGEN_FORTUNE.get(fortune_key) if fortune_key is not None else None
-        short = tougen.get("短文") if tougen is not None else ""
-        if short is None:
-            short = ""
-        long = tougen.get("長文") if tougen is not None else ""
-        if long is None:
-            long = ""
-
-        return {
-            "値": value,
-            "吉凶": fortune_key,
-            "吉凶ポイント": fortune_point,
-            "桃源": {
-                "短文": short,
-                "長文": long,
-            },
-        }
-
     # Build a dictionary of character to stroke count
     kakusuu_dict = {}
     for ch in sei + mei:
@@ -98,7 +101,90 @@ def get_gogaku(sei: list[tuple[str, int]], mei: list[tuple[str, int]]) -> Gokaku
     soukaku = sei_kakusu + mei_kakusu  # 姓名すべての画数合計
     gaikaku = soukaku - jinkaku  # 総格 − 人格
 
-    return {"五格": {"天格": get_gogaku_dict(tenkaku), "人格": get_gogaku_dict(jinkaku), "地格": get_gogaku_dict(chikaku), "外格": get_gogaku_dict(gaikaku), "総格": get_gogaku_dict(soukaku)}}
+    return {"五格": {"天格": _gogaku_entry(tenkaku), "人格": _gogaku_entry(jinkaku), "地格": _gogaku_entry(chikaku), "外格": _gogaku_entry(gaikaku), "総格": _gogaku_entry(soukaku)}}
+
+
+# 名前カタログの一括採点（NumPy）
+# 画数 → 吉凶 / 吉凶ポイントは画数をインデックスにした配列として前計算しておく
+GRID_NAMES = ("天格", "人格", "地格", "外格", "総格")
+FORTUNE_KEYS = tuple(FORTUNE_POINT)  # 大吉, 吉, 半吉, 末吉, 凶, 大凶
+# 画数配列の詰め物（名前の長さが揃わない分は右側を STROKE_PAD で埋める）
+STROKE_PAD = -1
+
+_FORTUNE_INDEX_ARR = np.full(max(KAKUSUU_FORTUNE) + 1, -1, dtype=np.int8)  # 画数 → FORTUNE_KEYS の index（-1 = 該当なし）
+_FORTUNE_POINT_ARR = np.full(max(KAKUSUU_FORTUNE) + 1, -1, dtype=np.int8)  # 画数 → 吉凶ポイント（-1 = 該当なし）
+for _value, _key in KAKUSUU_FORTUNE.items():
+    _FORTUNE_INDEX_ARR[_value] = FORTUNE_KEYS.index(_key)
+    _FORTUNE_POINT_ARR[_value] = FORTUNE_POINT[_key]
+
+
+@dataclass(frozen=True)
+class GogakuBatch:
+    """Five-grid scores for many names; columns follow GRID_NAMES."""
+
+    values: np.ndarray  # (n, 5) 画数
+    fortunes: np.ndarray  # (n, 5) FORTUNE_KEYS の index（-1 = 該当なし）
+    points: np.ndarray  # (n, 5) 吉凶ポイント（-1 = 該当なし）
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def column(self, grid: str) -> np.ndarray:
+        """Stroke totals of one grid, e.g. `column("総格")`."""
+        return self.values[:, GRID_NAMES.index(grid)]
+
+    def entry(self, i: int) -> GokakuDict:
+        """The `get_gogaku` result for row i (for displaying selected candidates)."""
+        return {"五格": {grid: _gogaku_entry(int(v)) for grid, v in zip(GRID_NAMES, self.values[i], strict=True)}}
+
+
+def pad_strokes(names: Sequence[Sequence[int]]) -> np.ndarray:
+    """Pack per-character stroke lists into an `(n, max_len)` array padded with STROKE_PAD."""
+    out = np.full((len(names), max((len(n) for n in names), default=0) or 1), STROKE_PAD, dtype=np.int32)
+    for i, strokes in enumerate(names):
+        out[i, : len(strokes)] = strokes
+    return out
+
+
+def _lookup(table: np.ndarray, values: np.ndarray) -> np.ndarray:
+    in_range = (values >= 0) & (values < len(table))
+    return np.where(in_range, table[np.where(in_range, values, 0)], -1).astype(np.int8)
+
+
+def get_gogaku_batch(sei: np.ndarray | Sequence[Sequence[int]], mei: np.ndarray | Sequence[Sequence[int]]) -> GogakuBatch:
+    """Vectorized `get_gogaku` over many (sei, mei) stroke arrays.
+
+    Args:
+        sei: `(n, len)` surname strokes, right-padded with STROKE_PAD (see `pad_strokes`).
+            A single row is broadcast against every given name (one surname, many candidates).
+        mei: `(n, len)` given-name strokes, right-padded with STROKE_PAD.
+    Returns:
+        GogakuBatch with the 天/人/地/外/総格 stroke totals, fortune indexes and points.
+    """
+    sei_arr = np.atleast_2d(np.asarray(sei, dtype=np.int32))
+    mei_arr = np.atleast_2d(np.asarray(mei, dtype=np.int32))
+    n = max(len(sei_arr), len(mei_arr))
+    sei_arr = np.broadcast_to(sei_arr, (n, sei_arr.shape[1]))
+    mei_arr = np.broadcast_to(mei_arr, (n, mei_arr.shape[1]))
+
+    sei_valid = sei_arr != STROKE_PAD
+    mei_valid = mei_arr != STROKE_PAD
+    sei_len = sei_valid.sum(axis=1)
+    mei_len = mei_valid.sum(axis=1)
+    sei_total = np.where(sei_valid, sei_arr, 0).sum(axis=1)
+    mei_total = np.where(mei_valid, mei_arr, 0).sum(axis=1)
+
+    # 人格：姓の最後の字と名の最初の字（どちらかが空なら 0）
+    sei_last = sei_arr[np.arange(n), np.maximum(sei_len - 1, 0)]
+    jinkaku = np.where((sei_len > 0) & (mei_len > 0), sei_last + mei_arr[:, 0], 0)
+
+    values = np.empty((n, 5), dtype=np.int32)
+    values[:, 0] = sei_total  # 天格
+    values[:, 1] = jinkaku  # 人格
+    values[:, 2] = mei_total  # 地格
+    values[:, 4] = sei_total + mei_total  # 総格
+    values[:, 3] = values[:, 4] - jinkaku  # 外格
+    return GogakuBatch(values, _lookup(_FORTUNE_INDEX_ARR, values), _lookup(_FORTUNE_POINT_ARR, values))
 
 
 """
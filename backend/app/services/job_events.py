@@ -0,0 +1,133 @@
+"""
+ジョブ状態の通知（Redis pub/sub）
+
+ワーカーは `process_analysis` の開始・完了・失敗時に `job:events:{job_id}` へ PUBLISH します。
+API プロセスは 1 本の PSUBSCRIBE 接続（`JobEventHub`）で全ジョブのイベントを受け取り、
+そのジョブを待っているリクエスト（ロングポーリング / SSE）へ配ります。
+待機中のクライアント数に関わらず Redis への接続は 1 本です。
+
+イベント: {"job_id": "...", "status": "JobStatus.in_progress" | "JobStatus.complete" | "JobStatus.failed", "result": ...}
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Optional
+
+from arq.jobs import JobStatus
+
+logger = logging.getLogger(__name__)
+
+CHANNEL_PREFIX = "job:events:"
+
+# arq の JobStatus に無い、タスク失敗を表す状態
+STATUS_FAILED = "JobStatus.failed"
+TERMINAL_STATUSES = (str(JobStatus.complete), STATUS_FAILED)
+
+
+def channel(job_id: str) -> str:
+    return CHANNEL_PREFIX + job_id
+
+
+async def publish_job_event(redis: Any, job_id: str, status: str, result: Any = None) -> None:
+    """Publish a status change for a job; failures are logged, never raised."""
+    try:
+        await redis.publish(channel(job_id), json.dumps({"job_id": job_id, "status": status, "result": result}, ensure_ascii=False, default=str))
+    except Exception as e:
+        logger.warning("job event publish failed: %s", e)
+
+
+class JobEventHub:
+    """Fan out job events from one pattern subscription to local waiters."""
+
+    def __init__(self) -> None:
+        self._waiters: dict[str, set[asyncio.Queue]] = {}
+        self._pubsub: Any = None
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # asyncio.Lock belongs to one event loop; recreated when used from another
+        self._lock: Optional[asyncio.Lock] = None
+        self._lock_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _listening(self, loop: asyncio.AbstractEventLoop) -> bool:
+        return self._task is not None and not self._task.done() and self._loop is loop
+
+    def _get_lock(self) -> asyncio.Lock:
+        loop = asyncio.get_running_loop()
+        if self._lock is None or self._lock_loop is not loop:
+            self._lock = asyncio.Lock()
+            self._lock_loop = loop
+        return self._lock
+
+    async def _ensure_listener(self, redis: Any) -> None:
+        loop = asyncio.get_running_loop()
+        if self._listening(loop):
+            return
+        # waiters arriving together must not each open a PSUBSCRIBE connection and listener
+        async with self._get_lock():
+            if self._listening(loop):
+                return
+            old, self._pubsub = self._pubsub, None
+            if old is not None:
+                # the stopped listener's connection (or one from another loop)
+                try:
+                    await old.aclose()
+                except Exception:
+                    pass
+            pubsub = redis.pubsub()
+            await pubsub.psubscribe(CHANNEL_PREFIX + "*")
+            self._pubsub = pubsub
+            self._loop = loop
+            self._task = asyncio.create_task(self._listen(pubsub))
+
+    async def _listen(self, pubsub: Any) -> None:
+        try:
+            async for message in pubsub.listen():
+                if message.get("type") != "pmessage":
+                    continue
+                name = message["channel"]
+                name = name.decode() if isinstance(name, bytes) else name
+                try:
+                    event = json.loads(message["data"])
+                except (TypeError, ValueError):
+                    continue
+                for queue in list(self._waiters.get(name[len(CHANNEL_PREFIX) :], ())):
+                    queue.put_nowait(event)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # 次の subscribe() で張り直す
+            logger.exception("job event listener stopped")
+
+    @asynccontextmanager
+    async def subscribe(self, redis: Any, job_id: str) -> AsyncIterator[asyncio.Queue]:
+        """Register a queue that receives this job's events while the context is open."""
+        await self._ensure_listener(redis)
+        queue: asyncio.Queue = asyncio.Queue()
+        self._waiters.setdefault(job_id, set()).add(queue)
+        try:
+            yield queue
+        finally:
+            waiters = self._waiters.get(job_id)
+            if waiters is not None:
+                waiters.discard(queue)
+                if not waiters:
+                    del self._waiters[job_id]
+
+    async def close(self) -> None:
+        task, pubsub = self._task, self._pubsub
+        self._task = self._pubsub = self._loop = None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        if pubsub is not None:
+            try:
+                await pubsub.aclose()
+            except Exception:
+                pass
+
+
+hub = JobEventHub()
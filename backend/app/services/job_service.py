@@ -1,10 +1,54 @@
 # app/services/job_service.py
+import asyncio
 import json
-from typing import Any
+import logging
+import os
+import time
+import uuid
+from typing import Any, AsyncIterator, Optional
 
-from arq import create_pool
-from arq.connections import RedisSettings
-from arq.jobs import Job
+from app.services import job_events, llm_stream
+from arq.connections import ArqRedis
+from arq.constants import in_progress_key_prefix, job_key_prefix, result_key_prefix
+from arq.jobs import Job, JobStatus, deserialize_result, serialize_job
+from arq.utils import timestamp_ms
+from redis.asyncio import BlockingConnectionPool
+
+logger = logging.getLogger(__name__)
+
+# ロングポーリング（GET /jobs/{id}?wait=N）で待つ最大秒数
+JOB_WAIT_MAX_SECONDS = int(os.getenv("JOB_WAIT_MAX_SECONDS", "60"))
+# 状態通知 SSE のキープアライブ間隔（秒）
+JOB_EVENTS_KEEPALIVE_SECONDS = float(os.getenv("JOB_EVENTS_KEEPALIVE_SECONDS", "15"))
+
+# Redis 接続プール設定（API プロセスでプールを共有する）
+# リクエスト処理用: 上限に達したら REDIS_POOL_TIMEOUT 秒まで空きを待ち、それでも無ければエラー
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "50"))
+REDIS_POOL_TIMEOUT = int(os.getenv("REDIS_POOL_TIMEOUT", "5"))
+# SSE / ロングポーリング用（XREAD BLOCK や pub/sub で接続を長く保持する）は別のプールにして、
+# 開いているストリームが多くても enqueue やジョブ参照の接続が枯渇しないようにする
+REDIS_STREAM_MAX_CONNECTIONS = int(os.getenv("REDIS_STREAM_MAX_CONNECTIONS", "200"))
+# アイドル接続を使う前に PING で生存確認する間隔（秒、0 で無効）
+REDIS_HEALTH_CHECK_INTERVAL = int(os.getenv("REDIS_HEALTH_CHECK_INTERVAL", "30"))
+
+# 一括投入（POST /analyze/batch）の上限件数と、バッチ情報を Redis に残す秒数
+ANALYZE_BATCH_MAX_ITEMS = int(os.getenv("ANALYZE_BATCH_MAX_ITEMS", "5000"))
+BATCH_KEEP_SECONDS = int(os.getenv("BATCH_KEEP_SECONDS", "86400"))
+BATCH_KEY_PREFIX = "analysis:batch:"
+
+ANALYSIS_TASK = "app.tasks.process_analysis"
+# LLM 段（app.tasks.enrich_analysis）のタスク名とキュー名（LLM_QUEUE_NAME で変更可能）
+ENRICH_TASK = "app.tasks.enrich_analysis"
+LLM_QUEUE_NAME = os.getenv("LLM_QUEUE_NAME", "arq:queue:llm")
+# ジョブ引数のうち所有者（user_id）の位置
+_OWNER_ARG = {ANALYSIS_TASK: 0, ENRICH_TASK: 1}
+
+_BATCH_COUNT_KEYS = ("queued", "in_progress", "complete", "failed", "not_found")
+
+_pool: Optional[ArqRedis] = None
+_pool_loop: Optional[asyncio.AbstractEventLoop] = None
+_stream_pool: Optional[ArqRedis] = None
+_stream_pool_loop: Optional[asyncio.AbstractEventLoop] = None
 
 
 def _safe_serialize(obj: Any) -> Any:
@@ -23,33 +67,284 @@ def _safe_serialize(obj: Any) -> Any:
         return repr(obj)
 
 
+def _format_status_sse(status: dict) -> str:
+    return f"event: status\ndata: {json.dumps(status, ensure_ascii=False)}\n\n"
+
+
+async def create_pool(host: str = "redis", max_connections: int = REDIS_MAX_CONNECTIONS) -> ArqRedis:
+    """Open an ArqRedis client on a `BlockingConnectionPool`.
+
+    Built here rather than with arq's `create_pool` so the pool waits for a free
+    connection (instead of raising "Too many connections" at the cap) and every
+    connection, including the first, gets `health_check_interval`.
+    """
+    pool = BlockingConnectionPool(
+        host=host,
+        port=6379,
+        socket_connect_timeout=1,
+        encoding="utf8",
+        max_connections=max_connections,
+        timeout=REDIS_POOL_TIMEOUT,
+        health_check_interval=REDIS_HEALTH_CHECK_INTERVAL,
+    )
+    redis = ArqRedis(pool)
+    await redis.ping()
+    return redis
+
+
+async def _discard(pool: Optional[ArqRedis]) -> None:
+    """Close a pool; one opened on another (possibly closed) loop just drops its connections."""
+    if pool is None:
+        return
+    try:
+        await pool.aclose()
+    except Exception:
+        connection_pool = getattr(pool, "connection_pool", None)
+        if connection_pool is not None:
+            connection_pool.reset()
+
+
+async def init_pool(host: str = "redis") -> ArqRedis:
+    """Open the shared ArqRedis pools (called from the FastAPI lifespan)."""
+    global _pool, _pool_loop, _stream_pool, _stream_pool_loop
+    loop = asyncio.get_running_loop()
+    old, _pool = _pool, None
+    await _discard(old)
+    _pool, _pool_loop = await create_pool(host, REDIS_MAX_CONNECTIONS), loop
+    old, _stream_pool = _stream_pool, None
+    await _discard(old)
+    _stream_pool, _stream_pool_loop = await create_pool(host, REDIS_STREAM_MAX_CONNECTIONS), loop
+    return _pool
+
+
+async def close_pool() -> None:
+    """Close the shared pools and the job event listener (called on shutdown)."""
+    global _pool, _pool_loop, _stream_pool, _stream_pool_loop
+    await job_events.hub.close()
+    pool, _pool, _pool_loop = _pool, None, None
+    stream_pool, _stream_pool, _stream_pool_loop = _stream_pool, None, None
+    await _discard(pool)
+    await _discard(stream_pool)
+
+
+async def get_pool(host: str = "redis") -> ArqRedis:
+    """Return the shared pool for short request-path commands, opening it lazily.
+
+    Connections are bound to the event loop they were created on, so a pool
+    from another loop (tests, scripts using asyncio.run) is closed and replaced.
+    """
+    global _pool, _pool_loop
+    loop = asyncio.get_running_loop()
+    if _pool is None or _pool_loop is not loop:
+        old, _pool = _pool, None
+        await _discard(old)
+        _pool, _pool_loop = await create_pool(host, REDIS_MAX_CONNECTIONS), loop
+    return _pool
+
+
+async def get_stream_pool(host: str = "redis") -> ArqRedis:
+    """Return the pool for long-lived readers (SSE XREAD, job event pub/sub)."""
+    global _stream_pool, _stream_pool_loop
+    loop = asyncio.get_running_loop()
+    if _stream_pool is None or _stream_pool_loop is not loop:
+        old, _stream_pool = _stream_pool, None
+        await _discard(old)
+        _stream_pool, _stream_pool_loop = await create_pool(host, REDIS_STREAM_MAX_CONNECTIONS), loop
+    return _stream_pool
+
+
 class JobService:
     def __init__(self, host: str = "redis"):
         self.host = host
 
     # TODO: job_id と user_id を照合して、他ユーザーのジョブ状況を取得できないようにする
-    async def enqueue_analysis(self, *args: Any):
-        pool = await create_pool(RedisSettings(host=self.host))
-        try:
-            job = await pool.enqueue_job("app.tasks.process_analysis", *args)
-            return job
-        finally:
-            await pool.aclose()
+    async def enqueue_analysis(self, *args: Any, **kwargs: Any):
+        pool = await get_pool(self.host)
+        return await pool.enqueue_job(ANALYSIS_TASK, *args, **kwargs)
+
+    async def enqueue_analysis_batch(self, user_id: int, jobs: list[tuple[tuple[Any, ...], dict[str, Any]]]) -> dict:
+        """Enqueue many analyses (`(args, kwargs)` each) and record them as one batch.
+
+        Writes the same keys as `ArqRedis.enqueue_job`, but for all jobs in a
+        single MULTI/EXEC pipeline (one round trip, all or nothing). Job ids are
+        fresh uuids, so arq's duplicate-id check is not needed.
+        """
+        pool = await get_pool(self.host)
+        batch_id = uuid.uuid4().hex
+        job_ids = [uuid.uuid4().hex for _ in jobs]
+        enqueue_time_ms = timestamp_ms()
+        async with pool.pipeline(transaction=True) as pipe:
+            for job_id, (args, kwargs) in zip(job_ids, jobs, strict=True):
+                payload = serialize_job(ANALYSIS_TASK, args, kwargs, None, enqueue_time_ms, serializer=pool.job_serializer)
+                pipe.psetex(job_key_prefix + job_id, pool.expires_extra_ms, payload)
+                pipe.zadd(pool.default_queue_name, {job_id: enqueue_time_ms})
+            batch = {"user_id": user_id, "job_ids": job_ids, "created_at": enqueue_time_ms}
+            pipe.set(BATCH_KEY_PREFIX + batch_id, json.dumps(batch), ex=BATCH_KEEP_SECONDS)
+            await pipe.execute()
+        return {"batch_id": batch_id, "job_ids": job_ids}
+
+    async def get_batch_status(self, batch_id: str, user_id: int, include_jobs: bool = False) -> Optional[dict]:
+        """Aggregate the status of every job in a batch (None if unknown or not the user's).
+
+        `counts` covers the analysis jobs (stage 1) and `enrich_counts` the LLM
+        enrichment each finished analysis enqueued (stage 2); the batch is `done`
+        only when neither stage has jobs waiting or running. Each stage is read
+        in one pipeline.
+        """
+        pool = await get_pool(self.host)
+        raw = await pool.get(BATCH_KEY_PREFIX + batch_id)
+        if raw is None:
+            return None
+        batch = json.loads(raw)
+        if batch.get("user_id") != user_id:
+            return None
+
+        job_ids: list[str] = batch["job_ids"]
+        stage1 = await self._read_job_states(pool, job_ids, pool.default_queue_name)
+        enrich_ids = {job_id: result["enrich_job_id"] for job_id, (_, _, result) in zip(job_ids, stage1, strict=True) if isinstance(result, dict) and result.get("enrich_job_id")}
+        stage2 = dict(zip(enrich_ids.values(), await self._read_job_states(pool, list(enrich_ids.values()), LLM_QUEUE_NAME), strict=True))
+
+        counts = dict.fromkeys(_BATCH_COUNT_KEYS, 0)
+        enrich_counts = dict.fromkeys(_BATCH_COUNT_KEYS, 0)
+        jobs = []
+        for job_id, (key, status, result) in zip(job_ids, stage1, strict=True):
+            counts[key] += 1
+            enrich = None
+            if job_id in enrich_ids:
+                enrich_id = enrich_ids[job_id]
+                enrich_key, enrich_status, _ = stage2[enrich_id]
+                enrich_counts[enrich_key] += 1
+                enrich = {"job_id": enrich_id, "status": enrich_status}
+            if include_jobs:
+                jobs.append({"job_id": job_id, "status": status, "result": result, "enrich": enrich})
+
+        out = {
+            "batch_id": batch_id,
+            "total": len(job_ids),
+            "counts": counts,
+            "enrich_counts": enrich_counts,
+            # 結果の保持期限（keep_result）を過ぎたジョブは not_found になるので、待ちが無くなった時点で完了とする
+            "done": all(c["queued"] + c["in_progress"] == 0 for c in (counts, enrich_counts)),
+            "created_at": batch.get("created_at"),
+        }
+        if include_jobs:
+            out["jobs"] = jobs
+        return out
+
+    @staticmethod
+    async def _read_job_states(pool: ArqRedis, job_ids: list[str], queue_name: str) -> list[tuple[str, str, Any]]:
+        """`(count key, status, result)` for each job from its result / in-progress / queue entries, in one pipeline."""
+        if not job_ids:
+            return []
+        async with pool.pipeline(transaction=False) as pipe:
+            for job_id in job_ids:
+                pipe.get(result_key_prefix + job_id)
+                pipe.exists(in_progress_key_prefix + job_id)
+                pipe.zscore(queue_name, job_id)
+            values = await pipe.execute()
+
+        states = []
+        for i in range(len(job_ids)):
+            result_raw, in_progress, score = values[3 * i : 3 * i + 3]
+            result = None
+            if result_raw is not None:
+                info = deserialize_result(result_raw, deserializer=pool.job_deserializer)
+                key, status = ("complete", str(JobStatus.complete)) if info.success else ("failed", job_events.STATUS_FAILED)
+                result = _safe_serialize(info.result)
+            elif in_progress:
+                key, status = "in_progress", str(JobStatus.in_progress)
+            elif score is not None:
+                key, status = "queued", str(JobStatus.queued)
+            else:
+                key, status = "not_found", str(JobStatus.not_found)
+            states.append((key, status, result))
+        return states
 
     async def get_job_status(self, job_id: str):
-        pool = await create_pool(RedisSettings(host=self.host))
+        """`{"status", "result"}`; a job that raised reports `job_events.STATUS_FAILED` (arq itself says complete)."""
+        pool = await get_pool(self.host)
+        job = Job(job_id, pool)
+        status = str(await job.status())
+
+        result = None
         try:
-            job = Job(job_id, pool)
-            status = await job.status()
+            info = await job.result_info()
+            if info:
+                result = _safe_serialize(info.result)
+                if not info.success:
+                    status = job_events.STATUS_FAILED
+        except Exception:
+            pass
 
-            result = None
-            try:
-                info = await job.result_info()
-                if info:
-                    result = _safe_serialize(info.result)
-            except Exception:
-                pass
-
-            return {"status": str(status), "result": result}
-        finally:
-            await pool.aclose()
+        return {"status": status, "result": result}
+
+    async def job_owner(self, job_id: str) -> Optional[int]:
+        """user_id the job was enqueued for, read from its stored arguments (None if unknown or expired)."""
+        pool = await get_pool(self.host)
+        info = await Job(job_id, pool).info()
+        if info is None or info.function not in _OWNER_ARG or len(info.args) <= _OWNER_ARG[info.function]:
+            return None
+        return info.args[_OWNER_ARG[info.function]]
+
+    async def is_owner(self, job_id: str, user_id: int) -> bool:
+        """False when the job is unknown, expired, or belongs to another user."""
+        return await self.job_owner(job_id) == user_id
+
+    async def stream_available(self, job_id: str) -> bool:
+        """True when the LLM job's stream exists or the job may still write to it (queued / running)."""
+        pool = await get_pool(self.host)
+        if await pool.exists(llm_stream.stream_key(job_id)):
+            return True
+        status = await Job(job_id, pool, _queue_name=LLM_QUEUE_NAME).status()
+        return status in (JobStatus.deferred, JobStatus.queued, JobStatus.in_progress)
+
+    async def stream_events(self, job_id: str, last_event_id: str | None = None) -> AsyncIterator[str]:
+        """Relay the job's LLM stream as SSE messages until the end event."""
+        pool = await get_stream_pool(self.host)
+        deadline = time.monotonic() + llm_stream.STREAM_MAX_SECONDS
+        async for entry in llm_stream.read_stream(pool, job_id, last_id=last_event_id or "0-0"):
+            if entry is None:
+                if time.monotonic() > deadline:
+                    return
+                # keep-alive comment so proxies do not close the idle connection
+                yield ": keep-alive\n\n"
+                continue
+            entry_id, fields = entry
+            yield llm_stream.format_sse(entry_id, fields)
+
+    async def wait_for_status(self, job_id: str, timeout: float) -> dict:
+        """Long-poll: return as soon as the job's status changes, or after `timeout` seconds.
+
+        Finished jobs return immediately. Subscribes before reading the current
+        status so a change published in between is not missed.
+        """
+        async with job_events.hub.subscribe(await get_stream_pool(self.host), job_id) as events:
+            current = await self.get_job_status(job_id)
+            if current["status"] in job_events.TERMINAL_STATUSES:
+                return current
+            deadline = time.monotonic() + min(timeout, JOB_WAIT_MAX_SECONDS)
+            while (remaining := deadline - time.monotonic()) > 0:
+                try:
+                    event = await asyncio.wait_for(events.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+                if event["status"] != current["status"]:
+                    return {"status": event["status"], "result": event.get("result")}
+        return current
+
+    async def status_events(self, job_id: str) -> AsyncIterator[str]:
+        """Push the job's status as SSE messages: the current one, then each change until it finishes."""
+        deadline = time.monotonic() + llm_stream.STREAM_MAX_SECONDS
+        async with job_events.hub.subscribe(await get_stream_pool(self.host), job_id) as events:
+            current = await self.get_job_status(job_id)
+            yield _format_status_sse(current)
+            while current["status"] not in job_events.TERMINAL_STATUSES:
+                if time.monotonic() > deadline:
+                    return
+                try:
+                    event = await asyncio.wait_for(events.get(), JOB_EVENTS_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                current = {"status": event["status"], "result": event.get("result")}
+                yield _format_status_sse(current)
@@ -0,0 +1,151 @@
+"""
+漢字画数のプロセス内インデックス
+
+`kanji` テーブルをワーカー起動時に一度だけ読み込み、コードポイント → 画数(min/max)
+の読み取り専用テーブルとして保持します。姓名判断の画数取得で DB I/O を発生させないための仕組みです。
+
+- 値は `array('H')` にコードポイントをインデックスとして格納（0 = 未登録、1 = 画数不明、n+1 = n画）
+- `kanji_meta.version`（`import_kanji.py` で行が変わったときに更新）と比較し、変わっていれば再読み込みする
+- バージョン確認は `KANJI_INDEX_CHECK_INTERVAL` 秒（既定 60 秒）に一度だけ
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import time
+from array import array
+from typing import Iterable, Iterator, Optional
+
+from app import db, models
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+logger = logging.getLogger(__name__)
+
+CHECK_INTERVAL = float(os.getenv("KANJI_INDEX_CHECK_INTERVAL", "60"))
+
+# 格納値のオフセット（0 を「未登録」に使うため画数は +1 して保持する）
+_ABSENT = 0
+_UNKNOWN = 1
+_MAX_STORED = 0xFFFF
+
+
+def _encode(strokes: int | None) -> int:
+    if strokes is None:
+        return _UNKNOWN
+    return min(int(strokes) + 1, _MAX_STORED)
+
+
+class KanjiStrokeIndex:
+    """Read-only codepoint -> (strokes_min, strokes_max) table."""
+
+    __slots__ = ("version", "_min", "_max", "_count")
+
+    def __init__(self, version: str | None, strokes_min: array, strokes_max: array, count: int):
+        self.version = version
+        self._min = strokes_min
+        self._max = strokes_max
+        self._count = count
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[tuple[str, int | None, int | None]], version: str | None = None) -> "KanjiStrokeIndex":
+        """Build the index from `(char, strokes_min, strokes_max)` rows."""
+        entries = [(ord(ch[0]), smin, smax) for ch, smin, smax in rows if ch]
+        size = max((cp for cp, _, _ in entries), default=-1) + 1
+        mins = array("H", bytes(2 * size))
+        maxs = array("H", bytes(2 * size))
+        for cp, smin, smax in entries:
+            mins[cp] = _encode(smin)
+            maxs[cp] = _encode(smax)
+        return cls(version, mins, maxs, len(entries))
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __contains__(self, char: object) -> bool:
+        if not isinstance(char, str) or not char:
+            return False
+        cp = ord(char[0])
+        return cp < len(self._min) and self._min[cp] != _ABSENT
+
+    def get(self, char: str) -> Optional[tuple[int | None, int | None]]:
+        """Return `(strokes_min, strokes_max)` for a character, or None if not registered."""
+        if char not in self:
+            return None
+        cp = ord(char[0])
+        smin, smax = self._min[cp], self._max[cp]
+        return (smin - 1 if smin != _UNKNOWN else None, smax - 1 if smax != _UNKNOWN else None)
+
+    def strokes_min(self, char: str) -> int:
+        """Return the minimum stroke count, or 0 when unknown (same as the previous DB lookup)."""
+        found = self.get(char)
+        if not found or found[0] is None:
+            return 0
+        return found[0]
+
+    def lookup(self, chars: Iterable[str]) -> list[tuple[str, int]]:
+        """Return `(char, strokes_min)` pairs for `get_gogaku`, skipping blank characters."""
+        return [(ch, self.strokes_min(ch)) for ch in chars if ch and ch.strip()]
+
+    def iter_strokes(self, first: int = 0, last: int | None = None) -> Iterator[tuple[str, int]]:
+        """Yield `(char, strokes_min)` for registered characters with known strokes in a codepoint range."""
+        stop = len(self._min) if last is None else min(last + 1, len(self._min))
+        for cp in range(first, stop):
+            stored = self._min[cp]
+            if stored > _UNKNOWN:
+                yield chr(cp), stored - 1
+
+
+async def fetch_version(session: AsyncSession) -> str | None:
+    """Return the current `kanji_meta.version`, or None if it has never been recorded."""
+    try:
+        res = await session.execute(text("SELECT value FROM kanji_meta WHERE key = 'version'"))
+        return res.scalar_one_or_none()
+    except Exception:
+        # kanji_meta が無い環境（古い DB / pg_restore のみ）ではバージョン管理なしで動かす
+        await session.rollback()
+        return None
+
+
+async def load_index(session: AsyncSession) -> KanjiStrokeIndex:
+    """Read the whole `kanji` table in one query and build an index."""
+    version = await fetch_version(session)
+    res = await session.execute(select(models.Kanji.char, models.Kanji.strokes_min, models.Kanji.strokes_max))
+    index = KanjiStrokeIndex.from_rows(res.tuples().all(), version=version)
+    logger.info("kanji stroke index loaded: %d chars (version=%s)", len(index), version)
+    return index
+
+
+_index: Optional[KanjiStrokeIndex] = None
+_checked_at: float = 0.0
+
+
+def set_index(index: Optional[KanjiStrokeIndex]) -> None:
+    """Install (or clear with None) the process-wide index."""
+    global _index, _checked_at
+    _index = index
+    _checked_at = time.monotonic()
+
+
+async def get_index() -> KanjiStrokeIndex:
+    """Return the process-wide index, (re)loading it when the import version changed."""
+    global _checked_at
+    if _index is not None and time.monotonic() - _checked_at < CHECK_INTERVAL:
+        return _index
+
+    async with db.ReadSessionLocal() as session:
+        if _index is not None:
+            try:
+                version = await fetch_version(session)
+            except Exception:
+                logger.exception("kanji index version check failed; keeping the loaded index")
+                _checked_at = time.monotonic()
+                return _index
+            if version == _index.version:
+                _checked_at = time.monotonic()
+                return _index
+        set_index(await load_index(session))
+
+    assert _index is not None
+    return _index
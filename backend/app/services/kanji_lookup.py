@@ -0,0 +1,187 @@
+"""
+漢字画数の一括取得サービス
+
+API（`/analyze/enqueue` の文字チェック）とワーカー（姓名判断の画数取得）で共通に使う。
+- `get_strokes()` は文字の集合をまとめて 1 回で取得する（DB なら `IN (...)` 1 クエリ）
+- `memo` を渡すと取得済みの文字は再取得しない。API で検証した結果をジョブ引数として
+  ワーカーへ渡すことで、1 件の鑑定あたりの画数クエリは最大 1 回になる
+- バックエンドは `KANJI_LOOKUP_BACKEND`（memory / redis / postgres）で切り替え
+- Redis のハッシュには TTL がないため、`import_kanji` が変更・削除された文字を
+  `invalidate_redis_hash()` で消す（全件インポート時はハッシュごと削除）
+"""
+
+from __future__ import annotations
+
+import os
+from typing import Iterable, Optional, Protocol
+
+from app import db, models
+from app.services import kanji_index
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# (strokes_min, strokes_max)
+Strokes = tuple[Optional[int], Optional[int]]
+# char -> Strokes（未登録の文字は None）
+StrokesMemo = dict[str, Optional[Strokes]]
+
+REDIS_HASH_KEY = "kanji:strokes"
+# HDEL に一度に渡す文字数
+REDIS_HDEL_BATCH = 1000
+
+
+class KanjiLookupBackend(Protocol):
+    async def fetch(self, chars: set[str]) -> dict[str, Strokes]:
+        """Return strokes for the registered characters among `chars`."""
+        ...
+
+
+class MemoryBackend:
+    """Process-wide `kanji_index` (no DB I/O once loaded)."""
+
+    async def fetch(self, chars: set[str]) -> dict[str, Strokes]:
+        index = await kanji_index.get_index()
+        out: dict[str, Strokes] = {}
+        for ch in chars:
+            found = index.get(ch)
+            if found is not None:
+                out[ch] = found
+        return out
+
+
+class PostgresBackend:
+    """One `SELECT ... WHERE char IN (...)` per call.
+
+    Uses the given session, or a short-lived one when None (worker).
+    """
+
+    def __init__(self, session: AsyncSession | None = None):
+        self.session = session
+
+    async def fetch(self, chars: set[str]) -> dict[str, Strokes]:
+        if not chars:
+            return {}
+        if self.session is None:
+            async with db.ReadSessionLocal() as session:
+                return await self._fetch(session, chars)
+        return await self._fetch(self.session, chars)
+
+    @staticmethod
+    async def _fetch(session: AsyncSession, chars: set[str]) -> dict[str, Strokes]:
+        stmt = select(models.Kanji).where(models.Kanji.char.in_(sorted(chars)))
+        res = await session.execute(stmt)
+        return {k.char: (k.strokes_min, k.strokes_max) for (k,) in res.fetchall()}
+
+
+class RedisHashBackend:
+    """Read-through Redis hash (`HMGET kanji:strokes ...`).
+
+    Characters missing from the hash are fetched from `fallback` and written back.
+    """
+
+    def __init__(self, redis, fallback: KanjiLookupBackend, key: str = REDIS_HASH_KEY):
+        self.redis = redis
+        self.fallback = fallback
+        self.key = key
+
+    @staticmethod
+    def _encode(strokes: Strokes) -> str:
+        return ",".join("" if v is None else str(v) for v in strokes)
+
+    @staticmethod
+    def _decode(raw: bytes | str) -> Strokes:
+        value = raw.decode() if isinstance(raw, bytes) else raw
+        smin, _, smax = value.partition(",")
+        return (int(smin) if smin else None, int(smax) if smax else None)
+
+    async def fetch(self, chars: set[str]) -> dict[str, Strokes]:
+        if not chars:
+            return {}
+        ordered = sorted(chars)
+        values = await self.redis.hmget(self.key, ordered)
+        out: dict[str, Strokes] = {}
+        misses: set[str] = set()
+        for ch, raw in zip(ordered, values, strict=True):
+            if raw is None:
+                misses.add(ch)
+            else:
+                out[ch] = self._decode(raw)
+        if misses:
+            found = await self.fallback.fetch(misses)
+            if found:
+                await self.redis.hset(self.key, mapping={ch: self._encode(v) for ch, v in found.items()})
+            out.update(found)
+        return out
+
+
+async def invalidate_redis_hash(redis, chars: Iterable[str] | None = None, key: str = REDIS_HASH_KEY) -> None:
+    """Remove `chars` from the strokes hash (the whole hash when None) so they are re-read from Postgres."""
+    if chars is None:
+        await redis.delete(key)
+        return
+    ordered = sorted(set(chars))
+    for i in range(0, len(ordered), REDIS_HDEL_BATCH):
+        await redis.hdel(key, *ordered[i : i + REDIS_HDEL_BATCH])
+
+
+class KanjiLookupService:
+    def __init__(self, backend: KanjiLookupBackend):
+        self.backend = backend
+
+    async def get_strokes(self, chars: Iterable[str], memo: StrokesMemo | None = None) -> dict[str, Strokes]:
+        """Return `{char: (strokes_min, strokes_max)}` for the registered characters.
+
+        `memo` is filled with every looked-up character (None for unregistered ones)
+        so later calls for the same request do not hit the backend again.
+        """
+        memo = {} if memo is None else memo
+        wanted = {ch for ch in chars if ch}
+        missing = wanted - memo.keys()
+        if missing:
+            found = await self.backend.fetch(missing)
+            for ch in missing:
+                memo[ch] = found.get(ch)
+        return {ch: s for ch in wanted if (s := memo[ch]) is not None}
+
+
+def strokes_pairs(name: str, strokes: dict[str, Strokes]) -> list[tuple[str, int]]:
+    """Return `(char, strokes_min)` pairs for `get_gogaku`; unknown strokes count as 0."""
+    out = []
+    for ch in name:
+        if not ch or not ch.strip():
+            continue
+        found = strokes.get(ch)
+        out.append((ch, found[0] if found and found[0] is not None else 0))
+    return out
+
+
+_redis = None
+
+
+def redis_url() -> str:
+    return os.getenv("KANJI_REDIS_URL") or os.getenv("ARQ_REDIS_URL") or "redis://redis:6379"
+
+
+def _get_redis():
+    global _redis
+    if _redis is None:
+        from redis.asyncio import Redis
+
+        _redis = Redis.from_url(redis_url())
+    return _redis
+
+
+def get_lookup_service(session: AsyncSession | None = None, backend: str | None = None) -> KanjiLookupService:
+    """Build a lookup service for the configured backend.
+
+    The default is `postgres` when a request session is given (API) and
+    `memory` otherwise (worker).
+    """
+    name = (backend or os.getenv("KANJI_LOOKUP_BACKEND") or ("postgres" if session is not None else "memory")).lower()
+    if name == "memory":
+        return KanjiLookupService(MemoryBackend())
+    if name == "postgres":
+        return KanjiLookupService(PostgresBackend(session))
+    if name == "redis":
+        return KanjiLookupService(RedisHashBackend(_get_redis(), PostgresBackend(session)))
+    raise ValueError(f"unknown KANJI_LOOKUP_BACKEND: {name}")
@@ -3,14 +3,33 @@ from __future__ import annotations
 import asyncio
 import logging
 import os
-from typing import Any
+import weakref
+from typing import Any, Awaitable, Callable
 
 import litellm
 from app import models
-from litellm import completion
+from app.services import llm_cache
+from litellm import acompletion, completion
 
 logger = logging.getLogger(__name__)
 
+# LLM_CALL_MODE: "async"（litellm.acompletion、既定）または "thread"（completion をスレッドで実行）
+LLM_CALL_MODE = os.getenv("LLM_CALL_MODE", "async").lower()
+# provider/model ごとの同時実行数の上限（async モード）
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+
+# event loop -> {(provider, model): Semaphore}
+# Semaphore はイベントループに紐づくため、ループごとに持つ
+_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict[tuple[str, str], asyncio.Semaphore]]" = weakref.WeakKeyDictionary()
+
+
+def _get_semaphore(provider: str, model: str) -> asyncio.Semaphore:
+    per_loop = _semaphores.setdefault(asyncio.get_running_loop(), {})
+    key = (provider, model)
+    if key not in per_loop:
+        per_loop[key] = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+    return per_loop[key]
+
 
 class LiteLlmAdapter:
     """Adapter for litellm LLM calls."""
@@ -24,7 +43,14 @@ class LiteLlmAdapter:
         self.model: str = model
         os.environ["GEMINI_API_KEY"] = os.getenv("GEMINI_API_KEY", "")
 
-    async def make_analysis(self, user_id: int, system_prompt: str, user_prompt: str) -> models.LLMResponse:
+    async def make_analysis(
+        self,
+        user_id: int,
+        system_prompt: str,
+        user_prompt: str,
+        bypass_cache: bool = False,
+        on_chunk: Callable[[str], Awaitable[None]] | None = None,
+    ) -> models.LLMResponse:
         return await self._generate(
             user_id=user_id,
             provider=self.provider,
@@ -33,6 +59,8 @@ class LiteLlmAdapter:
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": user_prompt},
             ],
+            bypass_cache=bypass_cache,
+            on_chunk=on_chunk,
         )
 
     async def _generate(self, user_id: int, **llm_param) -> models.LLMResponse:
@@ -46,28 +74,51 @@ class LiteLlmAdapter:
             - temperature: float (optional)
             - num_retries: int (optional)
             - messages: list[dict[str, str]]
+            - bypass_cache: bool (optional) skip the response cache for this call
+            - on_chunk: async callable (optional) receives the text as it is generated
         """
         temperature: float = llm_param.get("temperature", 0.8)
         num_retries: int = llm_param.get("num_retries", 3)
         messages: list[dict[str, str]] = llm_param["messages"]
+        bypass_cache: bool = llm_param.get("bypass_cache", False) or llm_cache.LLM_CACHE_BYPASS
+        on_chunk: Callable[[str], Awaitable[None]] | None = llm_param.get("on_chunk")
+
+        prompt_hash = llm_cache.prompt_hash(self.model, temperature, messages)
+        cache = None if bypass_cache else llm_cache.get_cache()
+
+        if cache is not None:
+            cached = await self._cache_get(cache, prompt_hash)
+            if cached is not None:
+                # キャッシュヒット: プロバイダーは呼ばない
+                if on_chunk is not None:
+                    await on_chunk(cached.get("response_text") or "")
+                return models.LLMResponse(
+                    user_id=user_id,
+                    request_id=None,
+                    provider=self.provider,
+                    model=self.model,
+                    prompt_hash=prompt_hash,
+                    cache_hit=True,
+                    **cached,
+                )
 
         try:
-            llm_response = await self._call_llm(self.model, temperature, num_retries, messages)
-            text = self._extract_text_from_response(llm_response)
+            llm_response, text = await self._request(temperature, num_retries, messages, on_chunk)
             model_version = llm_response.get("model_version", None)
             response_id = llm_response.get("id", None)
             usage_obj = llm_response.get("usage", None)
-            return models.LLMResponse(
+            result = models.LLMResponse(
                 user_id=user_id,
                 request_id=None,
                 provider=self.provider,
                 model=self.model,
                 model_version=model_version,
                 response_id=response_id,
-                prompt_hash=None,
+                prompt_hash=prompt_hash,
                 response_text=text,
                 usage=usage_obj,
                 raw=llm_response,
+                cache_hit=False,
             )
 
         except litellm.AuthenticationError as e:
@@ -83,11 +134,94 @@ class LiteLlmAdapter:
             logger.error("llm error: %s", e)
             raise
 
+        if cache is not None:
+            await self._cache_set(cache, prompt_hash, {f: getattr(result, f) for f in llm_cache.CACHED_FIELDS})
+        return result
+
+    async def _request(
+        self,
+        temperature: float,
+        num_retries: int,
+        messages: list[dict[str, str]],
+        on_chunk: Callable[[str], Awaitable[None]] | None,
+    ) -> tuple[dict[str, Any], str]:
+        """Call the provider (streaming when `on_chunk` is given) and return `(raw, text)`."""
+        if on_chunk is None:
+            llm_response = await self._call_llm(self.model, temperature, num_retries, messages)
+            return llm_response, self._extract_text_from_response(llm_response)
+        if LLM_CALL_MODE == "thread":
+            # thread mode cannot stream: deliver the whole text at once
+            llm_response = await self._call_llm(self.model, temperature, num_retries, messages)
+            text = self._extract_text_from_response(llm_response)
+            await on_chunk(text)
+            return llm_response, text
+        llm_response = await self._call_llm_stream(self.model, temperature, num_retries, messages, on_chunk)
+        return llm_response, self._extract_text_from_response(llm_response)
+
+    async def _cache_get(self, cache: llm_cache.LLMCache, key: str) -> dict[str, Any] | None:
+        # キャッシュ障害で鑑定を止めない
+        try:
+            return await cache.get(key)
+        except Exception as e:
+            logger.warning("llm cache get failed: %s", e)
+            return None
+
+    async def _cache_set(self, cache: llm_cache.LLMCache, key: str, value: dict[str, Any]) -> None:
+        try:
+            await cache.set(key, value)
+        except Exception as e:
+            logger.warning("llm cache set failed: %s", e)
+
     async def _call_llm(self, model: str, temperature: float, num_retries: int, messages: list[dict[str, str]]) -> dict[str, Any]:
         """Call the provider (or return fake response). Returns raw response or string for fake.
 
-        Calls the sync `completion` in a thread to avoid blocking the event loop.
+        Uses litellm's native async API unless LLM_CALL_MODE=thread.
         """
+        if LLM_CALL_MODE == "thread":
+            return await self._call_llm_thread(model, temperature, num_retries, messages)
+        return await self._call_llm_async(model, temperature, num_retries, messages)
+
+    async def _call_llm_async(self, model: str, temperature: float, num_retries: int, messages: list[dict[str, str]]) -> dict[str, Any]:
+        """Await `acompletion` directly, bounded by a per provider/model semaphore."""
+        async with _get_semaphore(self.provider, model):
+            return await acompletion(
+                model=model,
+                messages=messages,
+                temperature=temperature,
+                num_retries=num_retries,
+            )
+
+    async def _call_llm_stream(
+        self,
+        model: str,
+        temperature: float,
+        num_retries: int,
+        messages: list[dict[str, str]],
+        on_chunk: Callable[[str], Awaitable[None]],
+    ) -> dict[str, Any]:
+        """Stream tokens to `on_chunk` and return the assembled (non-streaming shaped) response."""
+        async with _get_semaphore(self.provider, model):
+            stream = await acompletion(
+                model=model,
+                messages=messages,
+                temperature=temperature,
+                num_retries=num_retries,
+                stream=True,
+            )
+            chunks = []
+            async for chunk in stream:
+                chunks.append(chunk)
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    await on_chunk(delta)
+        built = litellm.stream_chunk_builder(chunks, messages=messages)
+        if built is None:
+            # the provider closed the stream without sending any chunk
+            raise RuntimeError(f"LLM stream for {model} returned no chunks")
+        return built.model_dump()
+
+    async def _call_llm_thread(self, model: str, temperature: float, num_retries: int, messages: list[dict[str, str]]) -> dict[str, Any]:
+        """Fallback: call the sync `completion` in a thread to avoid blocking the event loop."""
         # call blocking completion in a thread — use keyword args to avoid
         # accidental positional-argument mismatches with litellm.signature
         completion_return = await asyncio.to_thread(
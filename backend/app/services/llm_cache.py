@@ -0,0 +1,159 @@
+"""
+LLM レスポンスキャッシュ
+
+同じ model + temperature + messages（同じ氏名・生年月日から作られたプロンプト）に対する
+LLM 呼び出しを再利用します。キーはそれらの SHA-256（`llm_responses.prompt_hash` と同じ値）。
+
+- LLM_CACHE_BACKEND: none / memory（既定）/ redis / postgres
+- LLM_CACHE_TTL: 有効期限（秒、既定 86400）
+- LLM_CACHE_MAXSIZE: 保持件数の上限（memory / redis は LRU で追い出し、既定 1000）
+- LLM_CACHE_BYPASS: true ならキャッシュを参照しない（保存もしない）
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Optional, Protocol
+
+from app import db, models
+from sqlalchemy import select
+
+LLM_CACHE_BACKEND = os.getenv("LLM_CACHE_BACKEND", "memory").lower()
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", "86400"))
+LLM_CACHE_MAXSIZE = int(os.getenv("LLM_CACHE_MAXSIZE", "1000"))
+LLM_CACHE_BYPASS = os.getenv("LLM_CACHE_BYPASS", "0").lower() in ("1", "true", "yes")
+
+# キャッシュに保存する LLMResponse のフィールド
+CACHED_FIELDS = ("model_version", "response_id", "response_text", "usage", "raw")
+
+
+def prompt_hash(model: str, temperature: float, messages: list[dict[str, str]]) -> str:
+    """Return the content hash of an LLM request."""
+    payload = json.dumps({"model": model, "temperature": temperature, "messages": messages}, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _json_default(obj: Any) -> Any:
+    # litellm の ModelResponse などは pydantic モデル
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump()
+    return str(obj)
+
+
+class LLMCache(Protocol):
+    async def get(self, key: str) -> Optional[dict[str, Any]]: ...
+
+    async def set(self, key: str, value: dict[str, Any]) -> None: ...
+
+
+class MemoryLLMCache:
+    """In-process LRU cache with a TTL."""
+
+    def __init__(self, maxsize: int = LLM_CACHE_MAXSIZE, ttl: int = LLM_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[str, tuple[float, dict[str, Any]]] = OrderedDict()
+
+    async def get(self, key: str) -> Optional[dict[str, Any]]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: dict[str, Any]) -> None:
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+
+class RedisLLMCache:
+    """Redis strings with a TTL; a sorted set of access times enforces the LRU cap."""
+
+    def __init__(self, redis, maxsize: int = LLM_CACHE_MAXSIZE, ttl: int = LLM_CACHE_TTL, prefix: str = "llm:cache:"):
+        self.redis = redis
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.prefix = prefix
+        self.lru_key = prefix + "lru"
+
+    async def get(self, key: str) -> Optional[dict[str, Any]]:
+        raw = await self.redis.get(self.prefix + key)
+        if raw is None:
+            return None
+        await self.redis.zadd(self.lru_key, {key: time.time()})
+        return json.loads(raw)
+
+    async def set(self, key: str, value: dict[str, Any]) -> None:
+        pipe = self.redis.pipeline()
+        pipe.set(self.prefix + key, json.dumps(value, ensure_ascii=False, default=_json_default), ex=self.ttl)
+        pipe.zadd(self.lru_key, {key: time.time()})
+        pipe.zcard(self.lru_key)
+        *_, size = await pipe.execute()
+        if size > self.maxsize:
+            evicted = await self.redis.zpopmin(self.lru_key, size - self.maxsize)
+            if evicted:
+                await self.redis.delete(*(self.prefix + (k.decode() if isinstance(k, bytes) else k) for k, _ in evicted))
+
+
+class PostgresLLMCache:
+    """Reuse the newest non-cached `llm_responses` row with the same prompt_hash.
+
+    Rows are written by the task that persists the LLM log, so `set` is a no-op.
+    """
+
+    def __init__(self, ttl: int = LLM_CACHE_TTL):
+        self.ttl = ttl
+
+    async def get(self, key: str) -> Optional[dict[str, Any]]:
+        since = datetime.now(timezone.utc) - timedelta(seconds=self.ttl)
+        stmt = (
+            select(models.LLMResponse)
+            .where(
+                models.LLMResponse.prompt_hash == key,
+                models.LLMResponse.cache_hit.is_(False),
+                models.LLMResponse.created_at >= since,
+            )
+            .order_by(models.LLMResponse.id.desc())
+            .limit(1)
+        )
+        async with db.SessionLocal() as session:
+            row = (await session.execute(stmt)).scalar_one_or_none()
+        if row is None:
+            return None
+        return {f: getattr(row, f) for f in CACHED_FIELDS}
+
+    async def set(self, key: str, value: dict[str, Any]) -> None:
+        return None
+
+
+_cache: Optional[LLMCache] = None
+
+
+def get_cache() -> Optional[LLMCache]:
+    """Return the configured cache, or None when caching is disabled."""
+    global _cache
+    if LLM_CACHE_BACKEND == "none":
+        return None
+    if _cache is None:
+        if LLM_CACHE_BACKEND == "memory":
+            _cache = MemoryLLMCache()
+        elif LLM_CACHE_BACKEND == "redis":
+            from redis.asyncio import Redis
+
+            _cache = RedisLLMCache(Redis.from_url(os.getenv("LLM_CACHE_REDIS_URL") or os.getenv("ARQ_REDIS_URL") or "redis://redis:6379"))
+        elif LLM_CACHE_BACKEND == "postgres":
+            _cache = PostgresLLMCache()
+        else:
+            raise ValueError(f"unknown LLM_CACHE_BACKEND: {LLM_CACHE_BACKEND}")
+    return _cache
@@ -0,0 +1,107 @@
+"""
+LLM 出力のストリーミング配信
+
+ワーカーがプロバイダーのトークンストリームを受け取りながら、ジョブ ID ごとの Redis Stream
+(`analysis:stream:{job_id}`) にチャンクを XADD し、API の SSE エンドポイントが XREAD で中継します。
+
+- チャンク: {"event": "chunk", "part": "detail" | "summary", "text": "..."}
+- 終了:     {"event": "end", "status": "complete" | "failed"}
+- やり直し: {"event": "reset", "attempt": "2"}  LLM 段の再試行の開始。前の試行のチャンクは Stream から
+  削除済みで、接続中のクライアントは受け取ったテキストを破棄してから続きを表示する
+- LLM_STREAMING: true でストリーミングを有効化（既定: false）
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+from typing import Any, AsyncIterator
+
+logger = logging.getLogger(__name__)
+
+LLM_STREAMING = os.getenv("LLM_STREAMING", "0").lower() in ("1", "true", "yes")
+# Stream の保持件数（おおよそ）と有効期限（秒）
+STREAM_MAXLEN = int(os.getenv("LLM_STREAM_MAXLEN", "10000"))
+STREAM_TTL = int(os.getenv("LLM_STREAM_TTL", "3600"))
+# SSE 接続を維持する最大秒数（ストリームが始まらないジョブで接続が残り続けないように）
+STREAM_MAX_SECONDS = int(os.getenv("LLM_STREAM_MAX_SECONDS", "600"))
+
+END_EVENT = "end"
+CHUNK_EVENT = "chunk"
+RESET_EVENT = "reset"
+
+
+def stream_key(job_id: str) -> str:
+    return f"analysis:stream:{job_id}"
+
+
+class StreamPublisher:
+    """Publish LLM chunks for one job to its Redis stream."""
+
+    def __init__(self, redis: Any, job_id: str):
+        self.redis = redis
+        self.key = stream_key(job_id)
+
+    async def _add(self, fields: dict[str, str]) -> None:
+        await self.redis.xadd(self.key, fields, maxlen=STREAM_MAXLEN, approximate=True)
+
+    def chunk_writer(self, part: str):
+        """Return an `on_chunk` callback for `LiteLlmAdapter.make_analysis`."""
+
+        async def on_chunk(text: str) -> None:
+            if not text:
+                return
+            # 配信の失敗で鑑定自体は止めない
+            try:
+                await self._add({"event": CHUNK_EVENT, "part": part, "text": text})
+            except Exception as e:
+                logger.warning("stream publish failed: %s", e)
+
+        return on_chunk
+
+    async def reset(self, attempt: int) -> None:
+        """Drop the chunks of a failed attempt and tell connected clients to start over."""
+        try:
+            await self.redis.delete(self.key)
+            await self._add({"event": RESET_EVENT, "attempt": str(attempt)})
+        except Exception as e:
+            logger.warning("stream publish failed: %s", e)
+
+    async def end(self, status: str) -> None:
+        try:
+            await self._add({"event": END_EVENT, "status": status})
+            await self.redis.expire(self.key, STREAM_TTL)
+        except Exception as e:
+            logger.warning("stream publish failed: %s", e)
+
+
+def _decode(value: Any) -> str:
+    return value.decode() if isinstance(value, bytes) else str(value)
+
+
+async def read_stream(redis: Any, job_id: str, last_id: str = "0-0", block_ms: int = 15000) -> AsyncIterator[tuple[str, dict[str, str]] | None]:
+    """Yield `(entry_id, fields)` from the job's stream until the end event.
+
+    Yields None when `block_ms` passes without new entries (for keep-alives).
+    """
+    key = stream_key(job_id)
+    while True:
+        res = await redis.xread({key: last_id}, block=block_ms, count=100)
+        if not res:
+            yield None
+            continue
+        for _, entries in res:
+            for entry_id, raw in entries:
+                last_id = _decode(entry_id)
+                fields = {_decode(k): _decode(v) for k, v in raw.items()}
+                is_end = fields.get("event") == END_EVENT
+                yield last_id, fields
+                if is_end:
+                    return
+
+
+def format_sse(entry_id: str, fields: dict[str, str]) -> str:
+    """Format a stream entry as one SSE message."""
+    data = {k: v for k, v in fields.items() if k != "event"}
+    return f"id: {entry_id}\nevent: {fields.get('event', CHUNK_EVENT)}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
@@ -1,7 +1,90 @@
-from typing import Any
+"""
+鑑定文プロンプトのテンプレート描画
+
+テンプレート文字列は種類が少なく変わらないので、コンパイル結果をプロセス内のレジストリに保持し、
+ジョブごとに `Environment` を作って `from_string` する（毎回コンパイルする）無駄を省きます。
+
+- テンプレートはソース文字列そのものをキーにしてキャッシュする（同じ文字列なら同じ Template）
+- ビルド時に `python -m app.services.make_story precompile <dir>` で Python コードへ事前コンパイルでき、
+  JINJA_PRECOMPILED_DIR にそのディレクトリを指定すると起動後の初回コンパイルも不要になる
+  事前コンパイル済みのモジュール名はソースのハッシュなので、テンプレートを変えた場合は自動的に再コンパイルされる
+- バッチ処理では `render_many()` で 1 つのテンプレートを複数のコンテキストに適用できる
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import sys
+import threading
+from typing import Any, Iterable
 
 from jinja2 import Environment
 
+logger = logging.getLogger(__name__)
+
+JINJA_PRECOMPILED_DIR = os.getenv("JINJA_PRECOMPILED_DIR", "")
+
+
+def template_key(template: str) -> str:
+    """Stable name of a template source (used for precompiled modules)."""
+    return hashlib.sha1(template.encode("utf-8")).hexdigest()
+
+
+class TemplateRegistry:
+    """Compile-once cache of Jinja templates keyed by their source."""
+
+    def __init__(self, env: Any = None, precompiled_dir: str = ""):
+        self.env = env if env is not None else Environment()
+        self._templates: dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self._module_loader = None
+        if precompiled_dir and os.path.isdir(precompiled_dir):
+            from jinja2 import ModuleLoader
+
+            self._module_loader = ModuleLoader(precompiled_dir)
+
+    def __len__(self) -> int:
+        return len(self._templates)
+
+    def get(self, template: str) -> Any:
+        """Return the compiled template for a source string, compiling it on first use."""
+        found = self._templates.get(template)
+        if found is not None:
+            return found
+        with self._lock:
+            found = self._templates.get(template)
+            if found is None:
+                found = self._templates[template] = self._load(template)
+        return found
+
+    def _load(self, template: str) -> Any:
+        if self._module_loader is not None:
+            from jinja2 import TemplateNotFound
+
+            try:
+                return self._module_loader.load(self.env, template_key(template))
+            except TemplateNotFound:
+                logger.warning("precompiled template %s not found; compiling at runtime", template_key(template))
+        return self.env.from_string(template)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._templates.clear()
+
+
+def precompile(templates: Iterable[str], target: str) -> list[str]:
+    """Compile template sources to Python modules in `target`; returns their keys."""
+    from jinja2 import DictLoader
+
+    sources = {template_key(t): t for t in templates}
+    Environment(loader=DictLoader(sources)).compile_templates(target, zip=None, ignore_errors=False)
+    return list(sources)
+
+
+registry = TemplateRegistry(precompiled_dir=JINJA_PRECOMPILED_DIR)
+
 
 def render_life_analysis(context: dict[str, Any], template: str) -> str:
     """Render the life analysis template using Jinja2.
@@ -9,6 +92,27 @@ def render_life_analysis(context: dict[str, Any], template: str) -> str:
     - `context` may contain keys with non-ASCII names (e.g. '年柱').
     - Dotted keys like `年柱.干支` will resolve to nested dict values.
     """
-    env = Environment()
-    jtpl = env.from_string(template)
-    return jtpl.render(**context)
+    return registry.get(template).render(**context)
+
+
+def render_many(contexts: Iterable[dict[str, Any]], template: str) -> list[str]:
+    """Render one template for many contexts (batch jobs)."""
+    jtpl = registry.get(template)
+    return [jtpl.render(**context) for context in contexts]
+
+
+def _prompt_templates() -> list[str]:
+    from app.services.prompts.template_life_analysis import TEMPLATE_DETAIL_USER
+    from app.services.prompts.template_life_analysis_summary import (
+        TEMPLATE_SUMMARY_USER,
+    )
+
+    return [TEMPLATE_DETAIL_USER, TEMPLATE_SUMMARY_USER]
+
+
+if __name__ == "__main__":
+    # python -m app.services.make_story precompile <dir>
+    if len(sys.argv) != 3 or sys.argv[1] != "precompile":
+        sys.exit("usage: python -m app.services.make_story precompile <dir>")
+    keys = precompile(_prompt_templates(), sys.argv[2])
+    print(f"precompiled {len(keys)} templates into {sys.argv[2]}")
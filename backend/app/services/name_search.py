@@ -0,0 +1,137 @@
+"""
+名前候補の検索（姓に対して五格の点数が高くなる名を探す）
+
+LLM は使わず、画数と `KAKUSUU_FORTUNE` / `FORTUNE_POINT` だけで候補を列挙・順位付けします。
+
+1. 候補の漢字を画数ごとにまとめた索引（`StrokeGroups`）を作る
+2. 名の画数パターン（例: 2 文字なら (s1, s2)）を、画数合計の上下限で枝刈りしながら列挙
+3. 全パターンを `get_gogaku_batch` でまとめて採点し、点数の高い順に並べる
+4. 上位のパターンから順に漢字の組み合わせを展開し、k 件に達するまで 1 件ずつ返す
+   （同じパターンの名は点数も同じなので、この順で返せば上位 k 件になる）
+
+点数は 人格・地格・外格・総格 の吉凶ポイントの合計（天格は姓だけで決まるので含めない）。
+"""
+
+from __future__ import annotations
+
+import itertools
+from dataclasses import dataclass
+from typing import Iterable, Iterator, Optional
+
+import numpy as np
+from app.services import kanji_index
+from app.services.calc_name_analysis import (
+    FORTUNE_KEYS,
+    GRID_NAMES,
+    GogakuBatch,
+    get_gogaku_batch,
+)
+
+# 既定の候補：CJK 統合漢字の基本ブロック
+DEFAULT_FIRST_CODEPOINT = 0x4E00
+DEFAULT_LAST_CODEPOINT = 0x9FFF
+# 点数に数える格（天格は姓だけで決まるので除く）
+SCORED_GRIDS = ("人格", "地格", "外格", "総格")
+_SCORED_COLUMNS = [GRID_NAMES.index(g) for g in SCORED_GRIDS]
+_SOUKAKU_COLUMN = GRID_NAMES.index("総格")
+
+# 画数 → その画数の候補漢字
+StrokeGroups = dict[int, tuple[str, ...]]
+
+
+@dataclass(frozen=True)
+class NameCandidate:
+    mei: str
+    strokes: tuple[int, ...]
+    score: int
+    gogaku: dict[str, dict[str, object]]  # {"総格": {"値": 21, "吉凶": "大吉", "吉凶ポイント": 5}, ...}
+
+    def to_dict(self) -> dict[str, object]:
+        return {"mei": self.mei, "strokes": list(self.strokes), "score": self.score, "五格": self.gogaku}
+
+
+def build_stroke_groups(pairs: Iterable[tuple[str, int]]) -> StrokeGroups:
+    """Group `(char, strokes)` pairs by stroke count."""
+    groups: dict[int, list[str]] = {}
+    for ch, strokes in pairs:
+        groups.setdefault(strokes, []).append(ch)
+    return {s: tuple(chars) for s, chars in sorted(groups.items())}
+
+
+_groups_cache: Optional[tuple[kanji_index.KanjiStrokeIndex, StrokeGroups]] = None
+
+
+def default_stroke_groups(index: kanji_index.KanjiStrokeIndex) -> StrokeGroups:
+    """Stroke groups of the default candidate block, rebuilt only when the index is reloaded."""
+    global _groups_cache
+    if _groups_cache is None or _groups_cache[0] is not index:
+        _groups_cache = (index, build_stroke_groups(index.iter_strokes(DEFAULT_FIRST_CODEPOINT, DEFAULT_LAST_CODEPOINT)))
+    return _groups_cache[1]
+
+
+def enumerate_patterns(counts: list[int], length: int, min_total: int, max_total: int) -> np.ndarray:
+    """All stroke patterns of `length` chars whose total is within [min_total, max_total].
+
+    Prefixes that can no longer reach the bounds (even with the smallest /
+    largest remaining counts) are dropped before they are extended.
+    """
+    if not counts or length < 1:
+        return np.empty((0, max(length, 0)), dtype=np.int32)
+    values = np.array(sorted(counts), dtype=np.int32)
+    lo, hi = int(values[0]), int(values[-1])
+    patterns = np.empty((1, 0), dtype=np.int32)
+    for pos in range(length):
+        rest = length - pos - 1
+        grown = np.concatenate([np.repeat(patterns, len(values), axis=0), np.tile(values, len(patterns))[:, None]], axis=1)
+        totals = grown.sum(axis=1)
+        patterns = grown[(totals + rest * lo <= max_total) & (totals + rest * hi >= min_total)]
+    return patterns
+
+
+def rank_patterns(sei_strokes: list[int], patterns: np.ndarray, min_point: int = 0) -> tuple[np.ndarray, np.ndarray, GogakuBatch]:
+    """Score patterns against the surname; returns (patterns, scores, batch) in descending score order.
+
+    Patterns with a scored grid below `min_point` are dropped.
+    """
+    batch = get_gogaku_batch([sei_strokes], patterns)
+    points = batch.points[:, _SCORED_COLUMNS].astype(np.int32)
+    keep = np.asarray((points >= min_point).all(axis=1), dtype=bool)
+    scores = np.maximum(points, 0).sum(axis=1)
+    # 点数の高い順、同点なら総格の点数が高い順
+    order = np.lexsort((-batch.points[:, _SOUKAKU_COLUMN], -scores))
+    order = order[keep[order]]
+    return patterns[order], scores[order], GogakuBatch(batch.values[order], batch.fortunes[order], batch.points[order])
+
+
+def search_names(
+    sei_strokes: list[int],
+    groups: StrokeGroups,
+    length: int = 2,
+    k: int = 50,
+    min_total: int = 0,
+    max_total: int = 10**6,
+    min_point: int = 0,
+) -> Iterator[NameCandidate]:
+    """Yield up to k given-name candidates, best first."""
+    counts = [s for s, chars in groups.items() if chars and s > 0]
+    patterns = enumerate_patterns(counts, length, min_total, max_total)
+    if not len(patterns):
+        return
+    patterns, scores, batch = rank_patterns(sei_strokes, patterns, min_point)
+    values, fortunes, points = batch.values, batch.fortunes, batch.points
+
+    remaining = k
+    for i, pattern in enumerate(patterns.tolist()):
+        gogaku = {
+            grid: {
+                "値": int(values[i, j]),
+                "吉凶": FORTUNE_KEYS[fortunes[i, j]] if fortunes[i, j] >= 0 else None,
+                "吉凶ポイント": int(points[i, j]) if points[i, j] >= 0 else None,
+            }
+            for j, grid in enumerate(GRID_NAMES)
+        }
+        for chars in itertools.product(*(groups[s] for s in pattern)):
+            yield NameCandidate("".join(chars), tuple(pattern), int(scores[i]), gogaku)
+            remaining -= 1
+            if remaining <= 0:
+                return
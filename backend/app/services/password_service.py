@@ -0,0 +1,163 @@
+"""
+パスワードのハッシュ化・検証を専用の実行プールで行う
+
+bcrypt / pbkdf2 は 1 回で数十〜数百ミリ秒 CPU を使うため、async エンドポイントで直接呼ぶと
+その間イベントループが止まり、同じ uvicorn ワーカーの他のリクエストがすべて待たされます。
+ここでは計算を大きさ固定のプールに渡し、イベントループは待つだけにします。
+
+- PASSWORD_HASH_WORKERS: 同時に計算する数（既定 2）
+- PASSWORD_HASH_EXECUTOR: thread（既定。bcrypt / hashlib は計算中 GIL を解放する）/ process
+- PASSWORD_HASH_MAX_PENDING: 順番待ちの上限（既定 0 = 無制限）。超えた分は `PasswordHasherBusy`
+- `verify_and_update()` はログイン時に古い方式・コストのハッシュなら新しいハッシュも返す
+- 順番待ちの数・計算中の数・待ち時間は `stats()` で取得できる
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Optional, TypeVar
+
+from app import auth
+
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+PASSWORD_HASH_EXECUTOR = os.getenv("PASSWORD_HASH_EXECUTOR", "thread").lower()
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "0"))
+
+T = TypeVar("T")
+
+
+class PasswordHasherBusy(Exception):
+    """Too many hashing requests are already waiting."""
+
+
+# プロセスプールに渡すため関数はモジュールレベルに置く（auth の関数は呼び出し時に参照する）
+def _hash(password: str) -> str:
+    return auth.get_password_hash(password)
+
+
+def _verify(plain: str, hashed: str) -> bool:
+    return auth.verify_password(plain, hashed)
+
+
+def _verify_and_update(plain: str, hashed: str) -> tuple[bool, Optional[str]]:
+    return auth.verify_and_update_password(plain, hashed)
+
+
+class PasswordHasher:
+    """Runs password hashing on a bounded pool, at most `workers` at a time."""
+
+    def __init__(self, workers: int = PASSWORD_HASH_WORKERS, executor: str = PASSWORD_HASH_EXECUTOR, max_pending: int = PASSWORD_HASH_MAX_PENDING):
+        self.workers = max(workers, 1)
+        self.kind = executor
+        self.max_pending = max_pending
+        self._executor: Optional[Executor] = None
+        # asyncio.Semaphore belongs to one event loop; recreated when used from another
+        self._gate: Optional[asyncio.Semaphore] = None
+        self._gate_loop: Optional[asyncio.AbstractEventLoop] = None
+        self.reset_stats()
+
+    def reset_stats(self) -> None:
+        self.pending = 0
+        self.running = 0
+        self.max_pending_seen = 0
+        self.completed = 0
+        self.rejected = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.run_seconds_total = 0.0
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password-hash")
+        return self._executor
+
+    def _get_gate(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._gate is None or self._gate_loop is not loop:
+            self._gate = asyncio.Semaphore(self.workers)
+            self._gate_loop = loop
+        return self._gate
+
+    async def _run(self, fn: Callable[..., T], *args: Any) -> T:
+        if self.max_pending and self.pending >= self.max_pending:
+            self.rejected += 1
+            raise PasswordHasherBusy(f"{self.pending} password hashing requests are already waiting")
+        queued_at = time.monotonic()
+        self.pending += 1
+        self.max_pending_seen = max(self.max_pending_seen, self.pending)
+        try:
+            gate = self._get_gate()
+            await gate.acquire()
+        finally:
+            self.pending -= 1
+        started = time.monotonic()
+        waited = started - queued_at
+        self.wait_seconds_total += waited
+        self.wait_seconds_max = max(self.wait_seconds_max, waited)
+        self.running += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._get_executor(), fn, *args)
+        finally:
+            self.running -= 1
+            self.completed += 1
+            self.run_seconds_total += time.monotonic() - started
+            gate.release()
+
+    async def hash(self, password: str) -> str:
+        return await self._run(_hash, password)
+
+    async def verify(self, plain: str, hashed: str) -> bool:
+        return await self._run(_verify, plain, hashed)
+
+    async def verify_and_update(self, plain: str, hashed: str) -> tuple[bool, Optional[str]]:
+        """(verified, new_hash); new_hash is set when the stored hash should be replaced."""
+        return await self._run(_verify_and_update, plain, hashed)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "executor": self.kind,
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "pending": self.pending,
+            "running": self.running,
+            "max_pending_seen": self.max_pending_seen,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "wait_seconds_avg": round(self.wait_seconds_total / self.completed, 6) if self.completed else 0.0,
+            "wait_seconds_max": round(self.wait_seconds_max, 6),
+            "run_seconds_avg": round(self.run_seconds_total / self.completed, 6) if self.completed else 0.0,
+        }
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+hasher = PasswordHasher()
+
+
+async def hash_password(password: str) -> str:
+    return await hasher.hash(password)
+
+
+async def verify_password(plain: str, hashed: str) -> bool:
+    return await hasher.verify(plain, hashed)
+
+
+async def verify_and_update(plain: str, hashed: str) -> tuple[bool, Optional[str]]:
+    return await hasher.verify_and_update(plain, hashed)
+
+
+def stats() -> dict[str, Any]:
+    return hasher.stats()
+
+
+def shutdown() -> None:
+    hasher.shutdown()
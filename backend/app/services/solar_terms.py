@@ -0,0 +1,250 @@
+"""
+二十四節気（節入り）の時刻テーブル
+
+太陽の視黄経が 15° の倍数になる瞬間を天文計算（Meeus『Astronomical Algorithms』の
+VSOP87 打ち切り版 + 章動・光行差 + ΔT 補正、誤差 1 分程度）で求め、1900〜2100 年分を UTC エポック秒の配列として
+`data/solar_terms.npy` に前計算しておきます。鑑定時は天文計算をせず、メモリマップした
+配列を二分探索するだけです。
+
+- テーブルは年ごとに 24 件、小寒（黄経 285°）から冬至（270°）までの時刻順
+- 偶数番目（小寒・立春・啓蟄…）が月の境目になる「節」、奇数番目が「中気」
+- テーブルの再生成: `python -m app.services.solar_terms build`
+- 検索コストの計測: `python -m app.services.solar_terms bench`
+"""
+
+from __future__ import annotations
+
+import math
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+FIRST_YEAR = 1900
+LAST_YEAR = 2100
+TABLE_PATH = Path(__file__).with_name("data") / "solar_terms.npy"
+
+TERM_NAMES = (
+    "小寒",
+    "大寒",
+    "立春",
+    "雨水",
+    "啓蟄",
+    "春分",
+    "清明",
+    "穀雨",
+    "立夏",
+    "小満",
+    "芒種",
+    "夏至",
+    "小暑",
+    "大暑",
+    "立秋",
+    "処暑",
+    "白露",
+    "秋分",
+    "寒露",
+    "霜降",
+    "立冬",
+    "小雪",
+    "大雪",
+    "冬至",
+)
+
+_J2000 = 2451545.0
+_UNIX_EPOCH_JD = 2440587.5
+_DEGREES_PER_DAY = 360.0 / 365.2422
+
+
+def term_longitude(term: int) -> float:
+    """Solar longitude (degrees) of the term-th solar term of a year (0 = 小寒)."""
+    return (285.0 + 15.0 * term) % 360.0
+
+
+# VSOP87 地球の日心黄経（Meeus Appendix III の打ち切り版）: (A, B, C) -> A cos(B + C τ)
+# fmt: off
+_VSOP87_L = (
+    (
+        (175347046, 0, 0), (3341656, 4.6692568, 6283.07585), (34894, 4.6261, 12566.1517), (3497, 2.7441, 5753.3849),
+        (3418, 2.8289, 3.5231), (3136, 3.6277, 77713.7715), (2676, 4.4181, 7860.4194), (2343, 6.1352, 3930.2097),
+        (1324, 0.7425, 11506.7698), (1273, 2.0371, 529.691), (1199, 1.1096, 1577.3435), (990, 5.233, 5884.927),
+        (902, 2.045, 26.298), (857, 3.508, 398.149), (780, 1.179, 5223.694), (753, 2.533, 5507.553),
+        (505, 4.583, 18849.228), (492, 4.205, 775.523), (357, 2.92, 0.067), (317, 5.849, 11790.629),
+        (284, 1.899, 796.298), (271, 0.315, 10977.079), (243, 0.345, 5486.778), (206, 4.806, 2544.314),
+        (205, 1.869, 5573.143), (202, 2.458, 6069.777), (156, 0.833, 213.299), (132, 3.411, 2942.463),
+        (126, 1.083, 20.775), (115, 0.645, 0.98), (103, 0.636, 4694.003), (102, 0.976, 15720.839),
+        (102, 4.267, 7.114), (99, 6.21, 2146.17), (98, 0.68, 155.42), (86, 5.98, 161000.69),
+        (85, 1.3, 6275.96), (85, 3.67, 71430.7), (80, 1.81, 17260.15), (79, 3.04, 12036.46),
+        (75, 1.76, 5088.63), (74, 3.5, 3154.69), (74, 4.68, 801.82), (70, 0.83, 9437.76),
+        (62, 3.98, 8827.39), (61, 1.82, 7084.9), (57, 2.78, 6286.6), (56, 4.39, 14143.5),
+        (56, 3.47, 6279.55), (52, 0.19, 12139.55), (52, 1.33, 1748.02), (51, 0.28, 5856.48),
+        (49, 0.49, 1194.45), (41, 5.37, 8429.24), (41, 2.4, 19651.05), (39, 6.17, 10447.39),
+        (37, 6.04, 10213.29), (37, 2.57, 1059.38), (36, 1.71, 2352.87), (36, 1.78, 6812.77),
+        (33, 0.59, 17789.85), (30, 0.44, 83996.85), (30, 2.74, 1349.87), (25, 3.16, 4690.48),
+    ),
+    (
+        (628331966747, 0, 0), (206059, 2.678235, 6283.07585), (4303, 2.6351, 12566.1517), (425, 1.59, 3.523),
+        (119, 5.796, 26.298), (109, 2.966, 1577.344), (93, 2.59, 18849.23), (72, 1.14, 529.69),
+        (68, 1.87, 398.15), (67, 4.41, 5507.55), (59, 2.89, 5223.69), (56, 2.17, 155.42),
+        (45, 0.4, 796.3), (36, 0.47, 775.52), (29, 2.65, 7.11), (21, 5.34, 0.98),
+        (19, 1.85, 5486.78), (19, 4.97, 213.3), (17, 2.99, 6275.96), (16, 0.03, 2544.31),
+        (16, 1.43, 2146.17), (15, 1.21, 10977.08), (12, 2.83, 1748.02), (12, 3.26, 5088.63),
+        (12, 5.27, 1194.45), (12, 2.08, 4694.0), (11, 0.77, 553.57), (10, 1.3, 6286.6),
+        (10, 4.24, 1349.87), (9, 2.7, 242.73), (9, 5.64, 951.72), (8, 5.3, 2352.87),
+        (6, 2.65, 9437.76), (6, 4.67, 4690.48),
+    ),
+    (
+        (52919, 0, 0), (8720, 1.0721, 6283.0758), (309, 0.867, 12566.152), (27, 0.05, 3.52),
+        (16, 5.19, 26.3), (16, 3.68, 155.42), (10, 0.76, 18849.23), (9, 2.06, 77713.77),
+        (7, 0.83, 775.52), (5, 4.66, 1577.34), (4, 1.03, 7.11), (4, 3.44, 5573.14),
+        (3, 5.14, 796.3), (3, 6.05, 5507.55), (3, 1.19, 242.73), (3, 6.12, 529.69),
+        (3, 0.31, 398.15), (3, 2.28, 553.57), (2, 4.38, 5223.69), (2, 3.75, 0.98),
+    ),
+    ((289, 5.844, 6283.076), (35, 0, 0), (17, 5.49, 12566.15), (3, 5.2, 155.42), (1, 4.72, 3.52), (1, 5.3, 18849.23), (1, 5.97, 242.73)),
+    ((114, 3.142, 0), (8, 4.13, 6283.08), (1, 3.84, 12566.15)),
+    ((1, 3.14, 0),),
+)
+# fmt: on
+
+
+def sun_apparent_longitude(jde: float) -> float:
+    """Apparent geocentric longitude of the sun in degrees (Meeus ch. 25 with VSOP87)."""
+    t = (jde - _J2000) / 36525.0
+    tau = t / 10.0
+    helio = sum(sum(a * math.cos(b + c * tau) for a, b, c in series) * tau**n for n, series in enumerate(_VSOP87_L)) / 1e8
+    geometric = math.degrees(helio) + 180.0 - 0.09033 / 3600.0  # FK5 補正
+
+    # 章動（黄経）の主要項と光行差
+    omega = math.radians(125.04452 - 1934.136261 * t)
+    sun_mean = math.radians(280.4665 + 36000.7698 * t)
+    moon_mean = math.radians(218.3165 + 481267.8813 * t)
+    nutation = -17.20 * math.sin(omega) - 1.32 * math.sin(2 * sun_mean) - 0.23 * math.sin(2 * moon_mean) + 0.21 * math.sin(2 * omega)
+    m = math.radians(357.52911 + 35999.05029 * t)
+    e = 0.016708634 - 0.000042037 * t
+    center = math.radians((1.914602 - 0.004817 * t) * math.sin(m) + 0.019993 * math.sin(2 * m) + 0.000289 * math.sin(3 * m))
+    distance = 1.000001018 * (1 - e * e) / (1 + e * math.cos(m + center))
+    aberration = -20.4898 / distance
+    return (geometric + (nutation + aberration) / 3600.0) % 360.0
+
+
+def delta_t(year: float) -> float:
+    """TT - UT in seconds (Espenak & Meeus polynomials, 1900-2150)."""
+    if year < 1920:
+        t = year - 1900
+        return -2.79 + 1.494119 * t - 0.0598939 * t**2 + 0.0061966 * t**3 - 0.000197 * t**4
+    if year < 1941:
+        t = year - 1920
+        return 21.20 + 0.84493 * t - 0.076100 * t**2 + 0.0020936 * t**3
+    if year < 1961:
+        t = year - 1950
+        return 29.07 + 0.407 * t - t**2 / 233 + t**3 / 2547
+    if year < 1986:
+        t = year - 1975
+        return 45.45 + 1.067 * t - t**2 / 260 - t**3 / 718
+    if year < 2005:
+        t = year - 2000
+        return 63.86 + 0.3345 * t - 0.060374 * t**2 + 0.0017275 * t**3 + 0.000651814 * t**4 + 0.00002373599 * t**5
+    if year < 2050:
+        t = year - 2000
+        return 62.92 + 0.32217 * t + 0.005589 * t**2
+    return -20 + 32 * ((year - 1820) / 100) ** 2 - 0.5628 * (2150 - year)
+
+
+def term_instant(year: int, term: int) -> float:
+    """UTC epoch seconds of a solar term, solved by Newton iteration on the sun's longitude."""
+    target = term_longitude(term)
+    start = datetime(year, 1, 5, 12, tzinfo=timezone.utc) + timedelta(days=15.2184 * term)
+    jde = start.timestamp() / 86400.0 + _UNIX_EPOCH_JD
+    for _ in range(20):
+        diff = (target - sun_apparent_longitude(jde) + 180.0) % 360.0 - 180.0
+        jde += diff / _DEGREES_PER_DAY
+        if abs(diff) < 1e-7:
+            break
+    jd_ut = jde - delta_t(year + term / 24.0) / 86400.0
+    return (jd_ut - _UNIX_EPOCH_JD) * 86400.0
+
+
+def build_table(first_year: int = FIRST_YEAR, last_year: int = LAST_YEAR) -> np.ndarray:
+    """Compute every solar term instant (int64 UTC epoch seconds) for the year range."""
+    return np.array([round(term_instant(y, k)) for y in range(first_year, last_year + 1) for k in range(24)], dtype=np.int64)
+
+
+_table: Optional[np.ndarray] = None
+
+
+def get_table() -> np.ndarray:
+    """Return the shipped table (memory-mapped), computing it only if the file is missing."""
+    global _table
+    if _table is None:
+        # ndarray view of the memmap: same pages, without the subclass overhead on every lookup
+        _table = np.asarray(np.load(TABLE_PATH, mmap_mode="r")) if TABLE_PATH.exists() else build_table()
+    return _table
+
+
+def term_index(ts: float) -> int:
+    """Index of the latest solar term at or before `ts` (UTC epoch seconds), or -1 when out of range."""
+    table = get_table()
+    # 整数秒で検索する（float のままだと検索のたびにテーブル全体が float に変換される）
+    i = int(table.searchsorted(math.floor(ts), side="right")) - 1
+    return i if i < len(table) - 1 else -1
+
+
+def term_at(ts: float) -> Optional[tuple[int, str]]:
+    """Return `(year, term name)` of the solar term period containing `ts`."""
+    i = term_index(ts)
+    if i < 0:
+        return None
+    return FIRST_YEAR + i // 24, TERM_NAMES[i % 24]
+
+
+def sekki_month(ts: float) -> Optional[tuple[int, int]]:
+    """Return `(pillar year, month index)` for `ts`, or None outside the table.
+
+    Months change at the 節 (even terms) and the pillar year at 立春; the month
+    index counts from 寅月 = 0 (立春) to 丑月 = 11 (小寒).
+    """
+    i = term_index(ts)
+    if i < 0:
+        return None
+    year, sekki = FIRST_YEAR + i // 24, (i % 24) // 2
+    return (year if sekki >= 1 else year - 1), (sekki - 1) % 12
+
+
+def sekki_month_many(ts: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Vectorized `sekki_month`: `(pillar years, month indexes, in-range mask)`."""
+    table = get_table()
+    i = table.searchsorted(np.floor(ts).astype(np.int64), side="right") - 1
+    valid = (i >= 0) & (i < len(table) - 1)
+    i = np.where(valid, i, 0)
+    year, sekki = FIRST_YEAR + i // 24, (i % 24) // 2
+    return np.where(sekki >= 1, year, year - 1), (sekki - 1) % 12, valid
+
+
+def _bench(n: int = 100_000) -> None:
+    table = get_table()
+    rng = np.random.default_rng(0)
+    samples = rng.integers(int(table[0]), int(table[-1]), size=n).tolist()
+    start = time.perf_counter()
+    for ts in samples:
+        sekki_month(ts)
+    scalar = (time.perf_counter() - start) / n
+    arr = np.array(samples)
+    start = time.perf_counter()
+    sekki_month_many(arr)
+    vector = (time.perf_counter() - start) / n
+    print(f"sekki_month: {scalar * 1e6:.2f} us/lookup, sekki_month_many: {vector * 1e6:.3f} us/lookup ({n} samples)")
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "bench"
+    if command == "build":
+        TABLE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        np.save(TABLE_PATH, build_table())
+        print(f"wrote {TABLE_PATH}")
+    elif command == "bench":
+        _bench()
+    else:
+        sys.exit("usage: python -m app.services.solar_terms [build|bench]")
@@ -6,6 +6,8 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 
 async def get_user_by_id(db: AsyncSession, user_id: int) -> Optional[User]:
+    # Callers that modify the returned user, or must see the user's own recent
+    # writes (/auth/me after signup / confirm-email), pass a primary session.
     q = await db.execute(select(User).where(User.id == user_id))
     return q.scalars().first()
 
@@ -32,10 +34,11 @@ async def create_user(db: AsyncSession, username: str, password: str, email: Opt
         if existing_email:
             raise ValueError("email already exists")
 
-    # Import hashing function lazily to avoid circular imports at module import time
-    from app.auth import get_password_hash
+    # Import lazily to avoid circular imports at module import time
+    from app.services import password_service
 
-    pw_hash = get_password_hash(password)
+    # hashed on the password executor so the event loop keeps serving other requests
+    pw_hash = await password_service.hash_password(password)
     user = User(username=username, email=email, password_hash=pw_hash, display_name=display_name)
     db.add(user)
     await db.commit()
@@ -1,15 +1,18 @@
 from __future__ import annotations
 
+import asyncio
+import logging
+import os
 from datetime import date, datetime
-from typing import Any
+from typing import Any, Awaitable
 from zoneinfo import ZoneInfo
 
 from app import db, models
-from app.services import litellm_adapter
-from app.services.calc_birth_analysis import synthesize_reading
-from app.services.calc_gogyo import calc_wuxing_balance
-from app.services.calc_meishiki import get_meishiki
+from app.services import job_events, litellm_adapter, llm_stream
+from app.services.birth_reading import get_birth_reading
 from app.services.calc_name_analysis import get_gogaku
+from app.services.job_service import ENRICH_TASK, LLM_QUEUE_NAME
+from app.services.kanji_lookup import StrokesMemo, get_lookup_service, strokes_pairs
 from app.services.make_story import render_life_analysis
 from app.services.prompts.template_life_analysis import (
     TEMPLATE_DETAIL_SYSTEM,
@@ -19,13 +22,126 @@ from app.services.prompts.template_life_analysis_summary import (
     TEMPLATE_SUMMARY_SYSTEM,
     TEMPLATE_SUMMARY_USER,
 )
+from arq.jobs import JobStatus
+from arq.worker import Retry
 
+logger = logging.getLogger(__name__)
 
-async def process_analysis(ctx: Any, user_id: int, name_sei: str, name_mei: str, birth_date: str, birth_hour: int, birth_tz: str = "Asia/Tokyo") -> dict[str, Any]:
-    """Arq worker task: perform the analysis and persist result.
 
-    Returns a dict summary for convenience.
+def _env_timeout(name: str) -> float | None:
+    value = float(os.getenv(name, "0") or 0)
+    return value if value > 0 else None
+
+
+# 鑑定文・サマリの LLM 呼び出しは並行実行する
+# - LLM_DETAIL_TIMEOUT / LLM_SUMMARY_TIMEOUT: 呼び出しごとのタイムアウト秒（0 または未設定で無制限）
+# - LLM_CANCEL_ON_FAILURE: 片方が失敗したらもう片方をキャンセルする（既定: true）
+# - LLM_PERSIST_PARTIAL: 片方だけ成功した場合も鑑定結果を保存する（既定: false）。
+#   有効なら残りの呼び出しの成功を待つ必要があるので、LLM_CANCEL_ON_FAILURE に関わらずキャンセルしない
+LLM_DETAIL_TIMEOUT = _env_timeout("LLM_DETAIL_TIMEOUT")
+LLM_SUMMARY_TIMEOUT = _env_timeout("LLM_SUMMARY_TIMEOUT")
+LLM_CANCEL_ON_FAILURE = os.getenv("LLM_CANCEL_ON_FAILURE", "1").lower() in ("1", "true", "yes")
+LLM_PERSIST_PARTIAL = os.getenv("LLM_PERSIST_PARTIAL", "0").lower() in ("1", "true", "yes")
+
+# 鑑定は 2 段に分ける
+# 1. process_analysis（既定キュー）: 命式・五行・五格を計算してすぐに保存する
+# 2. enrich_analysis（LLM キュー）: 鑑定文・サマリを生成して 1 の行に書き込む
+# - LLM_QUEUE_NAME: LLM 段のキュー名（専用ワーカー `LlmWorkerSettings` が処理する。API のバッチ集計でも使うので job_service で定義）
+# - LLM_MAX_TRIES: LLM 段の最大試行回数（失敗時は LLM_RETRY_BACKOFF 秒 × 2^(n-1) 後に再試行）
+LLM_MAX_TRIES = int(os.getenv("LLM_MAX_TRIES", "3"))
+LLM_RETRY_BACKOFF = float(os.getenv("LLM_RETRY_BACKOFF", "5"))
+
+
+async def _run_llm_calls(
+    calls: dict[str, tuple[Awaitable[models.LLMResponse], float | None]],
+    cancel_on_failure: bool,
+    persist_partial: bool,
+) -> dict[str, models.LLMResponse | None]:
+    """Run the LLM calls concurrently, each with its own timeout.
+
+    Returns `{name: response}`; a failed call maps to None only when
+    `persist_partial` is set and at least one call succeeded, otherwise the
+    first error is raised. `cancel_on_failure` is ignored with `persist_partial`:
+    cancelling the siblings would leave no partial result to keep.
     """
+    tasks = {name: asyncio.ensure_future(asyncio.wait_for(coro, timeout)) for name, (coro, timeout) in calls.items()}
+    cancel_on_failure = cancel_on_failure and not persist_partial
+    try:
+        await asyncio.wait(tasks.values(), return_when=asyncio.FIRST_EXCEPTION if cancel_on_failure else asyncio.ALL_COMPLETED)
+    finally:
+        pending = [t for t in tasks.values() if not t.done()]
+        for t in pending:
+            t.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    results: dict[str, models.LLMResponse | None] = {}
+    errors: dict[str, BaseException] = {}
+    for name, t in tasks.items():
+        if t.cancelled():
+            errors[name] = asyncio.CancelledError(f"{name} cancelled after sibling failure")
+        elif t.exception() is not None:
+            errors[name] = t.exception()  # type: ignore[assignment]
+        else:
+            results[name] = t.result()
+
+    if errors:
+        for name, err in errors.items():
+            logger.error("llm call %s failed: %r", name, err)
+        first = next((e for e in errors.values() if not isinstance(e, asyncio.CancelledError)), next(iter(errors.values())))
+        if not persist_partial or not results:
+            raise first
+        results.update(dict.fromkeys(errors))
+    return results
+
+
+async def _notify(ctx: Any, status: str, result: Any = None) -> None:
+    """Publish a job status event for the API's long-poll / SSE waiters."""
+    if isinstance(ctx, dict) and ctx.get("job_id") and ctx.get("redis"):
+        await job_events.publish_job_event(ctx["redis"], ctx["job_id"], status, result)
+
+
+async def process_analysis(
+    ctx: Any,
+    user_id: int,
+    name_sei: str,
+    name_mei: str,
+    birth_date: str,
+    birth_hour: int,
+    birth_tz: str = "Asia/Tokyo",
+    kanji_strokes: StrokesMemo | None = None,
+) -> dict[str, Any]:
+    """Arq worker task (stage 1): compute the deterministic results and persist them.
+
+    `kanji_strokes` is the lookup memo filled by the enqueue endpoint; characters
+    already in it are not looked up again.
+
+    The analysis row is saved right away with `summary` / `detail` empty; the LLM
+    enrichment (`enrich_analysis`) is enqueued on the LLM queue and fills them in.
+    Returns `{"id", "name", "enrich_job_id"}`. Any error (or a timeout) publishes
+    a failed event so long-poll / SSE waiters return right away.
+    """
+    await _notify(ctx, str(JobStatus.in_progress))
+    try:
+        ret = await _analyze_and_save(ctx, user_id, name_sei, name_mei, birth_date, birth_hour, birth_tz, kanji_strokes)
+    except (Exception, asyncio.CancelledError):
+        await _notify(ctx, job_events.STATUS_FAILED, {"error": "analysis failed"})
+        raise
+    # arq はタスクが戻ってから結果を保存するので、完了通知には結果を同梱する
+    await _notify(ctx, str(JobStatus.complete), ret)
+    return ret
+
+
+async def _analyze_and_save(
+    ctx: Any,
+    user_id: int,
+    name_sei: str,
+    name_mei: str,
+    birth_date: str,
+    birth_hour: int,
+    birth_tz: str,
+    kanji_strokes: StrokesMemo | None,
+) -> dict[str, Any]:
     # birth_date(YYYY-MM-dd) + birth_hour
     birth_date_obj = date.fromisoformat(birth_date)
     # datetime 🌟タイムゾーンの扱いに注意が必要
@@ -35,67 +151,49 @@ async def process_analysis(ctx: Any, user_id: int, name_sei: str, name_mei: str,
         tz = ZoneInfo("Asia/Tokyo")
     birth_dt = datetime(year=birth_date_obj.year, month=birth_date_obj.month, day=birth_date_obj.day, hour=birth_hour, tzinfo=tz)
 
-    meishiki = get_meishiki(dt=birth_dt)
-    gogyo_balance = calc_wuxing_balance(meishiki)
-    birth_analysis = synthesize_reading(meishiki, gogyo_balance)
+    # 命式〜総合鑑定は四柱の組み合わせごとにメモ化された読み取り専用の構造を共有する
+    reading = get_birth_reading(birth_dt)
+    meishiki = reading.meishiki
+    gogyo_balance = reading.gogyo
+
+    # kanji strokes: reuse the enqueue-time memo, the rest comes from one bulk lookup
+    strokes = await get_lookup_service().get_strokes(name_sei + name_mei, dict(kanji_strokes or {}))
+    gogaku = get_gogaku(strokes_pairs(name_sei, strokes), strokes_pairs(name_mei, strokes))
 
-    # fetch kanji strokes using async session
+    # LLM に渡すプロンプトはここで描画してしまい、LLM 段はプロンプトだけを受け取る
+    ctx_data = reading.reading | gogaku
+    prompts_detail_user = render_life_analysis(ctx_data, TEMPLATE_DETAIL_USER)
+    prompts_summary_user = render_life_analysis(ctx_data, TEMPLATE_SUMMARY_USER)
+
+    birth_analysis = {
+        "meishiki": {
+            "year": meishiki.get("年柱"),
+            "month": meishiki.get("月柱"),
+            "day": meishiki.get("日柱"),
+            "hour": meishiki.get("時柱"),
+            "summary": "",
+        },
+        "gogyo": {
+            "wood": gogyo_balance.get("木", 0),
+            "fire": gogyo_balance.get("火", 0),
+            "earth": gogyo_balance.get("土", 0),
+            "metal": gogyo_balance.get("金", 0),
+            "water": gogyo_balance.get("水", 0),
+        },
+        "summary": "",
+    }
+    name_analysis = {
+        "tenkaku": gogaku["五格"]["天格"]["吉凶ポイント"],
+        "jinkaku": gogaku["五格"]["人格"]["吉凶ポイント"],
+        "chikaku": gogaku["五格"]["地格"]["吉凶ポイント"],
+        "gaikaku": gogaku["五格"]["外格"]["吉凶ポイント"],
+        "soukaku": gogaku["五格"]["総格"]["吉凶ポイント"],
+        "summary": None,
+    }
+
+    # persist Analysis（鑑定文・サマリは LLM 段で埋める）
     async with db.SessionLocal() as session:
         try:
-
-            async def _get_strokes(chars: list[str]):
-                out = []
-                for ch in chars:
-                    if not ch or not ch.strip():
-                        continue
-                    c = ch[0]
-                    k = await session.get(models.Kanji, c)
-                    out.append((ch, int(k.strokes_min) if (k and k.strokes_min is not None) else 0))
-                return out
-
-            strokes_sei = await _get_strokes(list(name_sei))
-            strokes_mei = await _get_strokes(list(name_mei))
-
-            gogaku = get_gogaku(strokes_sei, strokes_mei)
-
-            ctx_data = birth_analysis | gogaku
-            prompts_detail_user = render_life_analysis(ctx_data, TEMPLATE_DETAIL_USER)
-            prompts_summary_user = render_life_analysis(ctx_data, TEMPLATE_SUMMARY_USER)
-
-            # 結果取得。LOGは別セッションで👇の方で実施
-            adapter_detail = litellm_adapter.LiteLlmAdapter(provider="vertex_ai", model="gemini/gemini-2.5-flash")  # model="gemini/gemini-2.5-pro"
-            llm_response_detail = await adapter_detail.make_analysis(user_id=user_id, system_prompt=TEMPLATE_DETAIL_SYSTEM, user_prompt=prompts_detail_user)
-
-            adapter_summary = litellm_adapter.LiteLlmAdapter(provider="vertex_ai", model="gemini/gemini-2.5-flash-lite")
-            llm_response_summary = await adapter_summary.make_analysis(user_id=user_id, system_prompt=TEMPLATE_SUMMARY_SYSTEM, user_prompt=prompts_summary_user)
-
-            birth_analysis = {
-                "meishiki": {
-                    "year": meishiki.get("年柱"),
-                    "month": meishiki.get("月柱"),
-                    "day": meishiki.get("日柱"),
-                    "hour": meishiki.get("時柱"),
-                    "summary": "",
-                },
-                "gogyo": {
-                    "wood": gogyo_balance.get("木", 0),
-                    "fire": gogyo_balance.get("火", 0),
-                    "earth": gogyo_balance.get("土", 0),
-                    "metal": gogyo_balance.get("金", 0),
-                    "water": gogyo_balance.get("水", 0),
-                },
-                "summary": "",
-            }
-            name_analysis = {
-                "tenkaku": gogaku["五格"]["天格"]["吉凶ポイント"],
-                "jinkaku": gogaku["五格"]["人格"]["吉凶ポイント"],
-                "chikaku": gogaku["五格"]["地格"]["吉凶ポイント"],
-                "gaikaku": gogaku["五格"]["外格"]["吉凶ポイント"],
-                "soukaku": gogaku["五格"]["総格"]["吉凶ポイント"],
-                "summary": None,
-            }
-
-            # persist Analysis
             obj = models.Analysis(
                 user_id=user_id,
                 name=name_sei + " " + name_mei,
@@ -103,32 +201,104 @@ async def process_analysis(ctx: Any, user_id: int, name_sei: str, name_mei: str,
                 birth_tz=birth_tz,
                 result_birth=birth_analysis,
                 result_name=name_analysis,
-                summary=llm_response_summary.response_text if llm_response_summary else None,
-                detail=llm_response_detail.response_text if llm_response_detail else None,
+                summary=None,
+                detail=None,
             )
             session.add(obj)
             await session.commit()
-
-            ret = {"id": obj.id, "name": obj.name}
-
-            # Arq のワーカーは「1 ジョブ＝1 タスク」create_task() しても同じイベントループ内で動くだけなので結局同じプロセス・同じワーカーで実行される
-            # TODO: LOGは再エンキューする
-            async with db.SessionLocal() as session_log:
-                try:
-                    session_log.add(llm_response_detail)
-                    session_log.add(llm_response_summary)
-                    await session_log.commit()
-                except Exception:
-                    await session_log.rollback()
-
-                finally:
-                    await session_log.close()
-
+            ret: dict[str, Any] = {"id": obj.id, "name": obj.name}
         except Exception:
             await session.rollback()
             raise
-
         finally:
             await session.close()
 
+    enrich_args = (ret["id"], user_id, prompts_detail_user, prompts_summary_user)
+    redis = ctx.get("redis") if isinstance(ctx, dict) else None
+    if redis is not None:
+        job = await redis.enqueue_job(ENRICH_TASK, *enrich_args, _queue_name=LLM_QUEUE_NAME)
+        ret["enrich_job_id"] = job.job_id if job is not None else None
+    else:
+        # ワーカー外（スクリプト・テスト）から呼ばれた場合はその場で LLM 段まで実行する
+        await enrich_analysis(ctx, *enrich_args)
+        ret["enrich_job_id"] = None
+    return ret
+
+
+async def _stream_publisher(ctx: Any) -> llm_stream.StreamPublisher | None:
+    """Streaming mode: a publisher for the job's Redis stream (read by the SSE endpoint), else None."""
+    if not (llm_stream.LLM_STREAMING and isinstance(ctx, dict) and ctx.get("job_id") and ctx.get("redis")):
+        return None
+    publisher = llm_stream.StreamPublisher(ctx["redis"], ctx["job_id"])
+    # 再試行では失敗した試行の途中までのチャンクを消してからやり直す
+    if ctx.get("job_try", 1) > 1:
+        await publisher.reset(ctx["job_try"])
+    return publisher
+
+
+async def enrich_analysis(ctx: Any, analysis_id: int, user_id: int, prompt_detail: str, prompt_summary: str) -> dict[str, Any]:
+    """Arq worker task (stage 2): generate the detail / summary texts and store them on the analysis.
+
+    Runs on the LLM queue (`LLM_QUEUE_NAME`). A failed attempt is retried with
+    backoff up to `LLM_MAX_TRIES`; the stage-1 results stay as they are.
+    """
+    await _notify(ctx, str(JobStatus.in_progress))
+
+    publisher = await _stream_publisher(ctx)
+
+    try:
+        # 結果取得（鑑定文とサマリを並行実行）。LOGは別セッションで👇の方で実施
+        adapter_detail = litellm_adapter.LiteLlmAdapter(provider="vertex_ai", model="gemini/gemini-2.5-flash")  # model="gemini/gemini-2.5-pro"
+        adapter_summary = litellm_adapter.LiteLlmAdapter(provider="vertex_ai", model="gemini/gemini-2.5-flash-lite")
+        detail_kwargs = {"on_chunk": publisher.chunk_writer("detail")} if publisher else {}
+        summary_kwargs = {"on_chunk": publisher.chunk_writer("summary")} if publisher else {}
+        llm_results = await _run_llm_calls(
+            {
+                "detail": (
+                    adapter_detail.make_analysis(user_id=user_id, system_prompt=TEMPLATE_DETAIL_SYSTEM, user_prompt=prompt_detail, **detail_kwargs),
+                    LLM_DETAIL_TIMEOUT,
+                ),
+                "summary": (
+                    adapter_summary.make_analysis(user_id=user_id, system_prompt=TEMPLATE_SUMMARY_SYSTEM, user_prompt=prompt_summary, **summary_kwargs),
+                    LLM_SUMMARY_TIMEOUT,
+                ),
+            },
+            cancel_on_failure=LLM_CANCEL_ON_FAILURE,
+            persist_partial=LLM_PERSIST_PARTIAL,
+        )
+        llm_response_detail = llm_results["detail"]
+        llm_response_summary = llm_results["summary"]
+
+        async with db.SessionLocal() as session:
+            try:
+                obj = await session.get(models.Analysis, analysis_id)
+                if obj is None:
+                    # 鑑定が削除済みなら書き込むものは無い
+                    ret: dict[str, Any] = {"id": analysis_id, "enriched": False}
+                else:
+                    obj.summary = llm_response_summary.response_text if llm_response_summary else None
+                    obj.detail = llm_response_detail.response_text if llm_response_detail else None
+                    for llm_response in (llm_response_detail, llm_response_summary):
+                        if llm_response is not None:
+                            session.add(llm_response)
+                    await session.commit()
+                    ret = {"id": analysis_id, "enriched": True}
+            except Exception:
+                await session.rollback()
+                raise
+            finally:
+                await session.close()
+    except Exception as e:
+        job_try = ctx.get("job_try", 1) if isinstance(ctx, dict) else LLM_MAX_TRIES
+        if job_try < LLM_MAX_TRIES:
+            logger.warning("llm enrichment for analysis %s failed (try %d/%d): %r", analysis_id, job_try, LLM_MAX_TRIES, e)
+            raise Retry(defer=LLM_RETRY_BACKOFF * 2 ** (job_try - 1)) from e
+        if publisher:
+            await publisher.end("failed")
+        await _notify(ctx, job_events.STATUS_FAILED, {"error": "analysis failed"})
+        raise
+
+    if publisher:
+        await publisher.end("complete")
+    await _notify(ctx, str(JobStatus.complete), ret)
     return ret
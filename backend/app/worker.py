@@ -1,21 +1,66 @@
+import os
 import shutil
+import signal
 import subprocess
 import sys
+import time
+
+from app.services.job_service import LLM_QUEUE_NAME
+from arq.constants import default_queue_name
+
+# 起動する arq ワーカープロセス数（"auto" で CPU 数）。各プロセスの同時実行数は WORKER_MAX_JOBS
+WORKER_PROCESSES = os.getenv("WORKER_PROCESSES", "1")
+# LLM 段（LlmWorkerSettings）のワーカープロセス数（0 なら起動しない。別コンテナで動かす場合など）
+# LLM_QUEUE_NAME が既定キューなら 1 段目のワーカーが LLM 段も処理するので、この値に関わらず起動しない
+LLM_WORKER_PROCESSES = os.getenv("LLM_WORKER_PROCESSES", "1")
+
+
+def _process_count(value: str, minimum: int = 1) -> int:
+    if value.strip().lower() == "auto":
+        return os.cpu_count() or 1
+    return max(minimum, int(value))
 
 
 def main():
-    """Start an Arq worker via the `arq` CLI, connecting to the `redis` host.
+    """Start `WORKER_PROCESSES` Arq workers (plus `LLM_WORKER_PROCESSES` for the LLM queue) via the `arq` CLI and supervise them.
 
     Using the CLI avoids depending on the exact Python API signature of
     run_worker across arq versions.
+
+    SIGTERM / SIGINT are forwarded to every worker, which stop taking jobs and
+    finish the running ones (`WORKER_SHUTDOWN_WAIT`). If one worker exits on its
+    own, the others are stopped too so the container restarts as a whole.
     """
     arq_cmd = shutil.which("arq") or "arq"
-    env = dict(**__import__("os").environ)
-    # Set ARQ_REDIS_URL so arq CLI connects to the compose redis service
-    env["ARQ_REDIS_URL"] = env.get("ARQ_REDIS_URL")
+    env = dict(os.environ)
     # point the CLI to the settings class which registers functions
-    args = [arq_cmd, "app.worker_settings.WorkerSettings"]
-    return subprocess.call(args, env=env)
+    commands = [[arq_cmd, "app.worker_settings.WorkerSettings"]] * _process_count(WORKER_PROCESSES)
+    if LLM_QUEUE_NAME != default_queue_name:
+        commands += [[arq_cmd, "app.worker_settings.LlmWorkerSettings"]] * _process_count(LLM_WORKER_PROCESSES, minimum=0)
+    procs = [subprocess.Popen(args, env=env) for args in commands]
+
+    stopping = False
+    signalled: set[int] = set()
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for i, p in enumerate(procs):
+            if p.poll() is None:
+                p.send_signal(signum)
+                signalled.add(i)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    while any(p.poll() is None for p in procs):
+        if not stopping and any(p.returncode is not None for p in procs):
+            stop(signal.SIGTERM, None)
+        time.sleep(0.5)
+
+    # workers stopped by the forwarded signal are not failures; one killed by anything else is
+    codes = [abs(p.returncode) for i, p in enumerate(procs) if p.returncode > 0 or (p.returncode < 0 and i not in signalled)]
+    return max(codes, default=0)
 
 
 if __name__ == "__main__":
@@ -1,11 +1,112 @@
+import logging
+import os
+from typing import Any
+
+from app import tasks
 from arq.connections import RedisSettings
+from arq.constants import default_queue_name
+from arq.worker import Function, func
+
+logger = logging.getLogger(__name__)
+
+# ワーカー設定（環境変数で上書き可能）
+# - WORKER_MAX_JOBS: 1 プロセスで同時に実行するジョブ数（LLM 待ちが大半なので 1 より大きくする）
+# - WORKER_JOB_TIMEOUT: 1 ジョブのタイムアウト秒
+# - WORKER_KEEP_RESULT: ジョブ結果を Redis に保持する秒数（GET /jobs/{id} で参照）
+# - WORKER_POLL_DELAY: キューをポーリングする間隔（秒）
+# - WORKER_SHUTDOWN_WAIT: SIGTERM / SIGINT 受信後、実行中のジョブの完了を待つ秒数（0 なら即キャンセル）
+WORKER_MAX_JOBS = int(os.getenv("WORKER_MAX_JOBS", "10"))
+WORKER_JOB_TIMEOUT = float(os.getenv("WORKER_JOB_TIMEOUT", "300"))
+WORKER_KEEP_RESULT = float(os.getenv("WORKER_KEEP_RESULT", "3600"))
+WORKER_POLL_DELAY = float(os.getenv("WORKER_POLL_DELAY", "0.5"))
+WORKER_SHUTDOWN_WAIT = int(os.getenv("WORKER_SHUTDOWN_WAIT", "25"))
+# 1 段目は再試行しない。鑑定行の INSERT 後に中断されたジョブを再実行すると履歴が二重に登録されるため、
+# タイムアウト・停止で中断されたジョブは失敗として返し、クライアントが再度投入する
+ANALYSIS_MAX_TRIES = 1
+
+# LLM 段（app.tasks.enrich_analysis）のワーカー設定。キューは app.tasks.LLM_QUEUE_NAME
+# - LLM_WORKER_MAX_JOBS: 1 プロセスで同時に実行する LLM ジョブ数（プロバイダーのレート制限に合わせる）
+# - LLM_WORKER_JOB_TIMEOUT: LLM ジョブ 1 回あたりのタイムアウト秒
+# 再試行回数・間隔は LLM_MAX_TRIES / LLM_RETRY_BACKOFF（app.tasks）
+LLM_WORKER_MAX_JOBS = int(os.getenv("LLM_WORKER_MAX_JOBS", "10"))
+LLM_WORKER_JOB_TIMEOUT = float(os.getenv("LLM_WORKER_JOB_TIMEOUT", "300"))
+# LLM_QUEUE_NAME を既定キュー（arq:queue）にすると LLM 段も 1 段目のワーカーが同じプロセスで処理する
+# （メモリの小さいデモ環境向け。app.worker は LlmWorkerSettings のプロセスを起動しない）
+SHARED_QUEUE = tasks.LLM_QUEUE_NAME == default_queue_name
+
+
+def redis_settings() -> RedisSettings:
+    url = os.getenv("ARQ_REDIS_URL")
+    # connect to redis service in docker-compose unless ARQ_REDIS_URL is set
+    return RedisSettings.from_dsn(url) if url else RedisSettings(host="redis")
+
+
+async def startup(ctx: dict[str, Any]) -> None:
+    """Open the DB pool and load process-wide read-only data before the worker starts taking jobs."""
+    from app import db
+    from app.services import kanji_index
+
+    await db.init_engine()
+    await kanji_index.get_index()
+
+
+async def llm_startup(ctx: dict[str, Any]) -> None:
+    """Open the DB pool (the LLM stage needs no kanji data)."""
+    from app import db
+
+    await db.init_engine()
+
+
+async def shutdown(ctx: dict[str, Any]) -> None:
+    """Log the DB connection hold times seen by this worker process and close the pool."""
+    from app import db
+
+    logger.info("db pool stats: %s", db.pool_stats())
+    await db.dispose_engine()
+
+
+def stage1_functions() -> list[str | Function]:
+    functions: list[str | Function] = ["app.tasks.process_analysis"]
+    if SHARED_QUEUE:
+        # 同じワーカーでも LLM 段の試行回数・タイムアウトを使う
+        functions.append(func(tasks.ENRICH_TASK, max_tries=tasks.LLM_MAX_TRIES, timeout=LLM_WORKER_JOB_TIMEOUT))
+    return functions
 
 
 class WorkerSettings:
-    max_jobs = 1  # default: 5
+    """Stage 1: deterministic analysis (default queue), plus stage 2 when SHARED_QUEUE."""
+
+    max_jobs = WORKER_MAX_JOBS
+    job_timeout = WORKER_JOB_TIMEOUT
+    keep_result = WORKER_KEEP_RESULT
+    poll_delay = WORKER_POLL_DELAY
+    max_tries = ANALYSIS_MAX_TRIES
+    # stop taking new jobs on SIGTERM and let running ones finish (see app.worker)
+    job_completion_wait = WORKER_SHUTDOWN_WAIT
 
     # list of task functions the worker should register
-    functions = ["app.tasks.process_analysis"]
+    functions = stage1_functions()
+
+    on_startup = startup
+    on_shutdown = shutdown
+
+    redis_settings = redis_settings()
+
+
+class LlmWorkerSettings:
+    """Stage 2: LLM enrichment (LLM queue), with its own concurrency and retries."""
+
+    queue_name = tasks.LLM_QUEUE_NAME
+    max_jobs = LLM_WORKER_MAX_JOBS
+    job_timeout = LLM_WORKER_JOB_TIMEOUT
+    keep_result = WORKER_KEEP_RESULT
+    poll_delay = WORKER_POLL_DELAY
+    max_tries = tasks.LLM_MAX_TRIES
+    job_completion_wait = WORKER_SHUTDOWN_WAIT
+
+    functions = ["app.tasks.enrich_analysis"]
+
+    on_startup = llm_startup
+    on_shutdown = shutdown
 
-    # connect to redis service in docker-compose
-    redis_settings = RedisSettings(host="redis")
+    redis_settings = redis_settings()
@@ -1,17 +1,39 @@
 """Import kanji stroke counts from `ucs-strokes.txt,v` into the `kanji` table.
 
 Usage:
-  PYTHONPATH=./backend python backend/import_kanji.py
+  PYTHONPATH=./backend python backend/import_kanji.py [path] [--full] [--force]
 
 This script looks for the file at `backend/app/migrations/ucs-strokes.txt,v` (or
 `backend/app/migrations/ucs-strokes.txt`) and imports entries of the form
 `U+4E00\t1` or `U+4E3D\t7,8` into Postgres using the app `db.engine`.
+
+The file is streamed in batches of KANJI_IMPORT_BATCH_SIZE rows (default 5000):
+each batch is COPYed into a temporary staging table and merged into `kanji`
+with a single `INSERT ... SELECT ... ON CONFLICT` in its own transaction.
+
+By default the import is incremental: a file whose sha256 matches the last
+import is skipped, otherwise the current rows are loaded in one scan and only
+new, changed and removed characters are written. `--full` upserts every row.
+
+When rows change the `kanji_meta.version` row is bumped so worker processes
+reload their in-process stroke index (see `app.services.kanji_index`), and
+the changed / removed characters are deleted from the Redis `kanji:strokes`
+hash used by KANJI_LOOKUP_BACKEND=redis (the whole hash after `--full`).
 """
 
+import hashlib
+import itertools
 import os
 import re
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Iterable, Iterator
 
 from app import db
+from app.services import kanji_lookup
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
 from sqlalchemy import text
 
 DEFAULT_PATHS = [
@@ -19,6 +41,40 @@ DEFAULT_PATHS = [
     os.path.join(os.path.dirname(__file__), "migrations", "ucs-strokes.txt"),
 ]
 
+# kanji_meta keys: import version (checked by stroke caches) and sha256 of the last imported file
+META_VERSION_KEY = "version"
+META_FINGERPRINT_KEY = "source_sha256"
+
+# Rows per COPY + upsert transaction
+IMPORT_BATCH_SIZE = int(os.getenv("KANJI_IMPORT_BATCH_SIZE", "5000"))
+
+STAGING_TABLE = "kanji_staging"
+# `seq` is the source line number: when a character appears twice, the later line wins
+STAGING_COLUMNS = ["seq", "char", "codepoint", "strokes_text", "strokes_min", "strokes_max", "source"]
+STAGING_DDL = f"""
+    CREATE TEMP TABLE IF NOT EXISTS {STAGING_TABLE} (
+        seq BIGINT NOT NULL,
+        char TEXT NOT NULL,
+        codepoint TEXT NOT NULL,
+        strokes_text TEXT,
+        strokes_min INTEGER,
+        strokes_max INTEGER,
+        source TEXT
+    ) ON COMMIT DELETE ROWS
+"""
+UPSERT_FROM_STAGING = f"""
+    INSERT INTO kanji (char, codepoint, strokes_text, strokes_min, strokes_max, source)
+    SELECT DISTINCT ON (char) char, codepoint, strokes_text, strokes_min, strokes_max, source
+      FROM {STAGING_TABLE}
+     ORDER BY char, seq DESC
+    ON CONFLICT (char) DO UPDATE
+      SET codepoint = EXCLUDED.codepoint,
+          strokes_text = EXCLUDED.strokes_text,
+          strokes_min = EXCLUDED.strokes_min,
+          strokes_max = EXCLUDED.strokes_max,
+          source = EXCLUDED.source
+"""
+
 
 def find_file():
     for p in DEFAULT_PATHS:
@@ -59,55 +115,214 @@ def parse_line(line: str):
     }
 
 
-async def import_file(path: str, source_label: str | None = None) -> None:
-    print(f"Importing from {path}...")
-    inserted = 0
+def iter_records(path: str, source_label: str | None = None) -> Iterator[tuple]:
+    """Stream `kanji` rows (in STAGING_COLUMNS order) from the source file without loading it whole."""
     with open(path, "r", encoding="utf-8", errors="ignore") as f:
-        for line in f:
+        for seq, line in enumerate(f):
             line = line.strip()
             if not line:
                 continue
             rec = parse_line(line)
             if not rec:
                 continue
-            # insert/update
-            async with db.engine.begin() as conn:
-                await conn.execute(
-                    text(
-                        """
-                        INSERT INTO kanji (char, codepoint, strokes_text, strokes_min, strokes_max, source)
-                        VALUES (:char, :codepoint, :strokes_text, :strokes_min, :strokes_max, :source)
-                        ON CONFLICT (char) DO UPDATE
-                          SET codepoint = EXCLUDED.codepoint,
-                              strokes_text = EXCLUDED.strokes_text,
-                              strokes_min = EXCLUDED.strokes_min,
-                              strokes_max = EXCLUDED.strokes_max,
-                              source = EXCLUDED.source
-                        """
-                    ),
-                    {
-                        "char": rec["char"],
-                        "codepoint": rec["codepoint"],
-                        "strokes_text": rec["strokes_text"],
-                        "strokes_min": rec["strokes_min"],
-                        "strokes_max": rec["strokes_max"],
-                        "source": source_label,
-                    },
-                )
-            inserted += 1
-            if inserted % 1000 == 0:
-                print(f"Imported {inserted} rows...")
-
-    print(f"Done. Inserted/updated {inserted} rows.")
+            yield (seq, rec["char"], rec["codepoint"], rec["strokes_text"], rec["strokes_min"], rec["strokes_max"], source_label)
+
+
+def batched(records: Iterable[tuple], size: int) -> Iterator[list[tuple]]:
+    it = iter(records)
+    while batch := list(itertools.islice(it, size)):
+        yield batch
+
+
+async def _raw_connection(conn) -> Any:
+    raw = await conn.get_raw_connection()
+    return raw.driver_connection  # asyncpg.Connection (COPY is not exposed through SQLAlchemy)
+
+
+async def _copy_upsert(pg: Any, records: Iterable[tuple], batch_size: int, started: float) -> int:
+    """COPY `records` into the staging table and merge them into `kanji`, one transaction per batch."""
+    await pg.execute(STAGING_DDL)
+    done = 0
+    for batch in batched(records, batch_size):
+        async with pg.transaction():
+            await pg.copy_records_to_table(STAGING_TABLE, records=batch, columns=STAGING_COLUMNS)
+            await pg.execute(UPSERT_FROM_STAGING)
+        done += len(batch)
+        elapsed = max(time.monotonic() - started, 1e-6)
+        print(f"Imported {done} rows ({done / elapsed:.0f} rows/sec)...")
+    return done
+
+
+async def import_file(path: str, source_label: str | None = None, batch_size: int = IMPORT_BATCH_SIZE) -> int:
+    """COPY the file into a staging table batch by batch and upsert each batch with one statement.
+
+    Every batch is its own short transaction, so row locks on `kanji` are held
+    only for one batch. Returns the number of rows read from the file.
+    """
+    print(f"Importing from {path}...")
+    started = time.monotonic()
+    fingerprint = file_fingerprint(path)
+    async with db.get_engine().connect() as conn:
+        imported = await _copy_upsert(await _raw_connection(conn), iter_records(path, source_label), batch_size, started)
+
+    await bump_version(fingerprint=fingerprint)
+    await invalidate_redis_strokes()
+    elapsed = max(time.monotonic() - started, 1e-6)
+    print(f"Done. Inserted/updated {imported} rows in {elapsed:.1f}s ({imported / elapsed:.0f} rows/sec).")
+    return imported
+
+
+def file_fingerprint(path: str) -> str:
+    """sha256 of the source file, recorded in kanji_meta to skip re-importing an unchanged file."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(1 << 20):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+@dataclass
+class KanjiDiff:
+    upserts: list[tuple] = field(default_factory=list)  # staging records of new / changed characters
+    deletes: list[str] = field(default_factory=list)  # characters of this source no longer in the file
+    unchanged: int = 0
+
+    def __bool__(self) -> bool:
+        return bool(self.upserts or self.deletes)
+
+
+async def load_existing(pg: Any) -> dict[str, tuple]:
+    """char -> row content (codepoint, strokes_text, strokes_min, strokes_max, source), in one scan."""
+    rows = await pg.fetch("SELECT char, codepoint, strokes_text, strokes_min, strokes_max, source FROM kanji")
+    return {r["char"]: (r["codepoint"], r["strokes_text"], r["strokes_min"], r["strokes_max"], r["source"]) for r in rows}
+
+
+def diff_records(records: Iterable[tuple], existing: dict[str, tuple], source_label: str | None) -> KanjiDiff:
+    """Compare parsed records with the current rows.
+
+    Only rows imported from the same source are deleted when missing from
+    the file; rows added by other sources are left alone.
+    """
+    latest: dict[str, tuple] = {}
+    for rec in records:
+        latest[rec[1]] = rec  # later line wins
+    diff = KanjiDiff()
+    for char, rec in latest.items():
+        if existing.get(char) == rec[2:]:
+            diff.unchanged += 1
+        else:
+            diff.upserts.append(rec)
+    diff.deletes = [char for char, row in existing.items() if char not in latest and row[-1] == source_label]
+    return diff
+
+
+async def import_incremental(path: str, source_label: str | None = None, batch_size: int = IMPORT_BATCH_SIZE, force: bool = False) -> KanjiDiff | None:
+    """Apply only the inserts / updates / deletes between the file and the `kanji` table.
+
+    Skips the file entirely when its fingerprint matches the last import
+    (unless `force`). The version in kanji_meta is bumped only when rows
+    actually changed, so stroke caches are not invalidated by a no-op run.
+    Returns None when skipped.
+    """
+    started = time.monotonic()
+    fingerprint = file_fingerprint(path)
+    if not force and await read_meta(META_FINGERPRINT_KEY) == fingerprint:
+        print(f"{path} is unchanged since the last import (sha256 {fingerprint[:12]}); nothing to do.")
+        return None
+
+    print(f"Comparing {path} with the kanji table...")
+    async with db.get_engine().connect() as conn:
+        pg = await _raw_connection(conn)
+        diff = diff_records(iter_records(path, source_label), await load_existing(pg), source_label)
+        print(f"{len(diff.upserts)} new/changed, {len(diff.deletes)} removed, {diff.unchanged} unchanged")
+        await _copy_upsert(pg, diff.upserts, batch_size, started)
+        for batch in batched(diff.deletes, batch_size):
+            async with pg.transaction():
+                await pg.execute("DELETE FROM kanji WHERE char = ANY($1::text[])", batch)
+
+    if diff:
+        version = await bump_version(fingerprint=fingerprint)
+        print(f"Recorded kanji version {version}.")
+        await invalidate_redis_strokes([rec[1] for rec in diff.upserts] + diff.deletes)
+    else:
+        await write_meta({META_FINGERPRINT_KEY: fingerprint})
+    elapsed = max(time.monotonic() - started, 1e-6)
+    print(f"Done in {elapsed:.1f}s.")
+    return diff
+
+
+async def invalidate_redis_strokes(chars: list[str] | None = None) -> None:
+    """Delete `chars` (every entry when None) from the Redis strokes hash, which has no TTL.
+
+    A Redis that cannot be reached only prints a warning: the rows are
+    already committed and the hash is only read with KANJI_LOOKUP_BACKEND=redis.
+    """
+    redis = Redis.from_url(kanji_lookup.redis_url())
+    try:
+        await kanji_lookup.invalidate_redis_hash(redis, chars)
+    except (RedisError, OSError) as e:
+        print(f"Warning: could not clear the Redis stroke cache ({e}); run `DEL {kanji_lookup.REDIS_HASH_KEY}` if KANJI_LOOKUP_BACKEND=redis.")
+    finally:
+        await redis.aclose()
+
+
+async def read_meta(key: str) -> str | None:
+    async with db.SessionLocal() as session:
+        return (await session.execute(text("SELECT value FROM kanji_meta WHERE key = :key"), {"key": key})).scalar_one_or_none()
+
+
+async def write_meta(values: dict[str, str]) -> None:
+    """Upsert kanji_meta rows in one transaction."""
+    async with db.SessionLocal() as session:
+        await session.execute(
+            text(
+                """
+                INSERT INTO kanji_meta (key, value, updated_at)
+                VALUES (:key, :value, now())
+                ON CONFLICT (key) DO UPDATE
+                  SET value = EXCLUDED.value,
+                      updated_at = EXCLUDED.updated_at
+                """
+            ),
+            [{"key": key, "value": value} for key, value in values.items()],
+        )
+        await session.commit()
+
+
+async def bump_version(version: str | None = None, fingerprint: str | None = None) -> str:
+    """Record a new import version so in-process stroke caches reload."""
+    version = version or datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S.%fZ")
+    values = {META_VERSION_KEY: version}
+    if fingerprint:
+        values[META_FINGERPRINT_KEY] = fingerprint
+    await write_meta(values)
+    return version
 
 
 if __name__ == "__main__":
-    path = find_file()
+    import argparse
+    import asyncio
+
+    parser = argparse.ArgumentParser(description="Import kanji stroke counts into the kanji table.")
+    parser.add_argument("path", nargs="?", help="source file (default: the ucs-strokes file under migrations/)")
+    parser.add_argument("--full", action="store_true", help="upsert every row instead of applying only the differences")
+    parser.add_argument("--force", action="store_true", help="compare rows even if the file fingerprint is unchanged")
+    args = parser.parse_args()
+
+    path = args.path or find_file()
     if not path:
         print("Could not find ucs-strokes file in expected locations:")
         for p in DEFAULT_PATHS:
             print("  ", p)
         raise SystemExit(1)
-    import asyncio
 
-    asyncio.run(import_file(path, source_label=os.path.basename(path)))
+    async def _main() -> None:
+        try:
+            if args.full:
+                await import_file(path, source_label=os.path.basename(path))
+            else:
+                await import_incremental(path, source_label=os.path.basename(path), force=args.force)
+        finally:
+            await db.dispose_engine()
+
+    asyncio.run(_main())
@@ -50,13 +50,15 @@ async def _run_migration(conn: AsyncConnection, file_name: str) -> None:
 
 async def run_migrations_async(files: list[str]) -> None:
     try:
-        async with db.engine.begin() as conn:
+        async with db.get_engine().begin() as conn:
             for file_name in files:
                 await _run_migration(conn, file_name)
 
         print("Migrations applied successfully.")
     except Exception as e:
         print("Failed to apply migrations:", e)
+    finally:
+        await db.dispose_engine()
 
 
 def run_migrations(files: list[str]) -> None:
@@ -28,6 +28,8 @@ CREATE TABLE IF NOT EXISTS analyses (
     detail TEXT,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT now()
 );
+-- 履歴一覧のキーセットページング (WHERE user_id = ? AND (created_at, id) < (?, ?) ORDER BY created_at DESC, id DESC)
+CREATE INDEX IF NOT EXISTS idx_analyses_user_created ON analyses(user_id, created_at DESC, id DESC);
 COMMENT ON COLUMN analyses.user_id IS 'users.id への外部キー';
 COMMENT ON COLUMN analyses.name IS '姓名';
 COMMENT ON COLUMN analyses.birth_datetime IS 'UTCで保存';
@@ -56,6 +58,16 @@ COMMENT ON COLUMN kanji.strokes_min IS '最小画数';
 COMMENT ON COLUMN kanji.strokes_max IS '最大画数';
 COMMENT ON COLUMN kanji.source IS 'データソース情報';
 
+-- kanji table metadata (import version checked by in-process stroke caches)
+CREATE TABLE IF NOT EXISTS kanji_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+COMMENT ON COLUMN kanji_meta.key IS 'メタデータのキー (例: ''version'', ''source_sha256'')';
+COMMENT ON COLUMN kanji_meta.value IS 'メタデータの値';
+COMMENT ON COLUMN kanji_meta.updated_at IS '更新日時';
+
 CREATE TABLE IF NOT EXISTS llm_responses (
     id SERIAL PRIMARY KEY,
     user_id INTEGER  NOT NULL REFERENCES users(id),
@@ -68,8 +80,12 @@ CREATE TABLE IF NOT EXISTS llm_responses (
     response_text TEXT,
     usage JSONB,
     raw JSONB,
+    cache_hit BOOLEAN NOT NULL DEFAULT FALSE,
     created_at TIMESTAMPTZ DEFAULT now()
 );
+-- for databases created before cache_hit existed
+ALTER TABLE llm_responses ADD COLUMN IF NOT EXISTS cache_hit BOOLEAN NOT NULL DEFAULT FALSE;
+CREATE INDEX IF NOT EXISTS idx_llm_responses_prompt_hash ON llm_responses(prompt_hash);
 
 COMMENT ON COLUMN llm_responses.user_id IS 'users.id への外部キー';
 COMMENT ON COLUMN llm_responses.request_id IS 'LLM request identifier for relation with user request';
@@ -81,4 +97,5 @@ COMMENT ON COLUMN llm_responses.prompt_hash IS 'Hash of the prompt for deduplica
 COMMENT ON COLUMN llm_responses.response_text IS 'Textual response from the LLM';
 COMMENT ON COLUMN llm_responses.usage IS 'Token usage statistics';
 COMMENT ON COLUMN llm_responses.raw IS 'Raw JSON response from the LLM provider';
+COMMENT ON COLUMN llm_responses.cache_hit IS 'True when the response was served from the prompt_hash cache';
 COMMENT ON COLUMN llm_responses.user_id IS 'users.id への外部キー';
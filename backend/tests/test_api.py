@@ -67,14 +67,14 @@ async def test_get_analyses_empty(logged_in_client):
     async def fake_get_db() -> AsyncGenerator[Any, Any]:
         yield FakeAsyncSession(query_result=[])
 
-    app.dependency_overrides[db_module.get_db] = fake_get_db
+    app.dependency_overrides[db_module.get_read_db] = fake_get_db
     try:
         # perform a real login first so cookies/headers are set
         r = await logged_in_client.get(URL_PREFIX + "/analyses")
         assert r.status_code == 200
         assert r.json() == []
     finally:
-        app.dependency_overrides.pop(db_module.get_db, None)
+        app.dependency_overrides.pop(db_module.get_read_db, None)
 
 
 @pytest.mark.anyio
@@ -106,3 +106,77 @@ async def test_delete_analysis_deleted(logged_in_client):
         assert r.json() == {"status": "deleted"}
     finally:
         app.dependency_overrides.pop(db_module.get_db, None)
+
+
+@pytest.fixture
+async def demo_analyses():
+    """Five analyses of the demo user; two share created_at so the id tie-break is exercised."""
+    from datetime import datetime, timedelta, timezone
+
+    from app import models
+    from app.services.user_service import get_user_by_username
+    from sqlalchemy import delete
+
+    base = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    async with db_module.SessionLocal() as session:
+        user = await get_user_by_username(session, "demo")
+        rows = [
+            models.Analysis(
+                user_id=user.id,
+                name=f"履歴 {i}",
+                birth_datetime=datetime(1990, 1, 1, 3, tzinfo=timezone.utc),
+                birth_tz="Asia/Tokyo",
+                result_birth={"i": i},
+                result_name={"i": i},
+                summary=f"summary {i}",
+                detail="detail " * 100,
+                created_at=base + timedelta(minutes=min(i, 3)),
+            )
+            for i in range(5)
+        ]
+        session.add_all(rows)
+        await session.commit()
+        ids = [r.id for r in rows]
+    yield ids
+    async with db_module.SessionLocal() as session:
+        await session.execute(delete(models.Analysis).where(models.Analysis.id.in_(ids)))
+        await session.commit()
+
+
+@pytest.mark.anyio
+async def test_list_analyses_keyset_pages(logged_in_client, demo_analyses):
+    seen: list[int] = []
+    cursor = None
+    while True:
+        params = {"limit": 2, "fields": "name,summary"}
+        if cursor:
+            params["cursor"] = cursor
+        r = await logged_in_client.get(URL_PREFIX + "/analyses", params=params)
+        assert r.status_code == 200
+        page = r.json()
+        assert all(set(item) == {"id", "name", "summary"} for item in page)
+        seen += [item["id"] for item in page if item["id"] in demo_analyses]
+        cursor = r.headers.get("x-next-cursor")
+        if not cursor:
+            break
+    # 新しい順（created_at が同じなら id の大きい順）、重複・抜けなし
+    assert seen == [demo_analyses[4], demo_analyses[3], demo_analyses[2], demo_analyses[1], demo_analyses[0]]
+
+
+@pytest.mark.anyio
+async def test_get_analysis_detail(logged_in_client, demo_analyses):
+    r = await logged_in_client.get(URL_PREFIX + f"/analyses/{demo_analyses[0]}")
+    assert r.status_code == 200
+    body = r.json()
+    assert body["detail"].startswith("detail ")
+    assert body["birth_date"] == "1990-01-01" and body["birth_hour"] == 12
+
+    r = await logged_in_client.get(URL_PREFIX + "/analyses/0")
+    assert r.status_code == 404
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("params", [{"cursor": "not-a-cursor"}, {"fields": "name,password"}, {"limit": 0}])
+async def test_list_analyses_rejects_bad_params(logged_in_client, params):
+    r = await logged_in_client.get(URL_PREFIX + "/analyses", params=params)
+    assert r.status_code == 422
@@ -0,0 +1,44 @@
+from datetime import datetime
+
+import pytest
+from app.services import birth_reading
+from app.services.calc_birth_analysis import synthesize_reading
+from app.services.calc_gogyo import calc_wuxing_balance
+from app.services.calc_meishiki import get_meishiki
+
+
+def test_birth_reading_is_shared_per_pillar_combination():
+    birth_reading.cache_clear()
+    first = birth_reading.get_birth_reading(datetime(1990, 5, 5, 5))
+    # 同じ日・同じ時支（5 時と 6 時はどちらも卯の刻）なら同じ構造を返す
+    second = birth_reading.get_birth_reading(datetime(1990, 5, 5, 6))
+    other = birth_reading.get_birth_reading(datetime(1990, 5, 6, 5))
+
+    assert second is first
+    assert other is not first
+    assert birth_reading.cache_info() == {"hits": 1, "misses": 2, "size": 2, "maxsize": birth_reading.BIRTH_READING_CACHE_SIZE}
+
+
+def test_birth_reading_matches_uncached_calculation():
+    dt = datetime(1985, 3, 1, 23)
+    meishiki = get_meishiki(dt)
+    balance = calc_wuxing_balance(meishiki)
+    reading = synthesize_reading(meishiki, balance)
+    cached = birth_reading.get_birth_reading(dt)
+
+    assert cached.meishiki == meishiki
+    assert cached.gogyo == balance
+    assert cached.reading == reading
+    # プロンプトに埋め込まれるリストの表記も変わらない
+    assert str(cached.reading["五行"]["課題"]) == str(reading["五行"]["課題"])
+
+
+def test_birth_reading_is_read_only():
+    reading = birth_reading.get_birth_reading(datetime(2000, 1, 1, 12)).reading
+    with pytest.raises(TypeError):
+        reading["五行"]["日主"] = "木"
+    with pytest.raises(TypeError):
+        reading.update({"x": 1})
+    with pytest.raises(AttributeError):
+        reading["総合テーマ"]["性格"].append("x")
+    assert (reading | {"x": 1})["x"] == 1
@@ -0,0 +1,72 @@
+from datetime import date, datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+import numpy as np
+from app.services.calc_meishiki import get_meishiki, get_meishiki_many
+from app.services.constants import HOUR_STEM_TABLE, JUNISHI, TENKAN
+
+_KANSHI = [TENKAN[i % 10] + JUNISHI[i % 12] for i in range(60)]
+
+
+def _reference_meishiki(dt: datetime) -> dict[str, str]:
+    # 文字列と index() で 1 柱ずつ求める以前の実装（立春 2/4 固定・暦月）
+    y = dt.year - 1 if dt.date() < date(dt.year, 2, 4) else dt.year
+    year_p = _KANSHI[(y - 1984) % 60]
+    month_index = (dt.month - 2) % 12 + 1
+    month_p = TENKAN[(TENKAN.index(year_p[0]) + month_index - 1) % 10] + JUNISHI[(2 + month_index - 1) % 12]
+    day_p = _KANSHI[(dt.date() - date(1984, 2, 2)).days % 60]
+    branch = JUNISHI[0 if dt.hour == 23 else ((dt.hour + 1) // 2) % 12]
+    hour_p = HOUR_STEM_TABLE[day_p[0]][JUNISHI.index(branch)] + branch
+    return {"年柱": year_p, "月柱": month_p, "日柱": day_p, "時柱": hour_p}
+
+
+def _sample_datetimes() -> list[datetime]:
+    start = datetime(1899, 12, 25)
+    return [start + timedelta(days=d * 7, hours=d % 24) for d in range(0, 12000)] + [
+        datetime(1985, 2, 3, 23),
+        datetime(1985, 2, 4, 0),
+        datetime(2024, 1, 31, 22),
+        datetime(2024, 2, 1, 1),
+    ]
+
+
+def test_get_meishiki_example():
+    assert get_meishiki(datetime(1984, 2, 5, 12)) == {"年柱": "甲子", "月柱": "甲寅", "日柱": "丁卯", "時柱": "己午"}
+
+
+def test_get_meishiki_matches_reference():
+    for dt in _sample_datetimes():
+        got, want = get_meishiki(dt), _reference_meishiki(dt)
+        assert (got["日柱"], got["時柱"]) == (want["日柱"], want["時柱"]), dt
+        # 節入り（毎月 4〜9 日頃）から離れた日と、節入りテーブルの範囲外は以前の近似と一致する
+        if 12 <= dt.day <= 25 or dt.year < 1900:
+            assert got == want, dt
+
+
+def test_year_and_month_pillars_change_at_lichun():
+    jst = timezone(timedelta(hours=9))
+    # 2024 年の立春は 2/4 17:27（日本時間）
+    before = get_meishiki(datetime(2024, 2, 4, 17, 20, tzinfo=jst))
+    after = get_meishiki(datetime(2024, 2, 4, 17, 35, tzinfo=jst))
+    assert (before["年柱"], before["月柱"][1]) == ("癸卯", "丑")
+    assert (after["年柱"], after["月柱"][1]) == ("甲辰", "寅")
+    # 2021 年の立春は 2/3 23:59、2/4 固定の近似では前年扱いになっていた日時
+    assert get_meishiki(datetime(2021, 2, 4, 0, 30))["年柱"] == "辛丑"
+    assert _reference_meishiki(datetime(2021, 2, 4, 0, 30))["年柱"] == "辛丑"
+    assert get_meishiki(datetime(2021, 2, 3, 23, 59, 30))["年柱"] == "辛丑"
+    # 啓蟄（2024-03-05 11:23）で卯月へ
+    assert get_meishiki(datetime(2024, 3, 5, 11, 0))["月柱"][1] == "寅"
+    assert get_meishiki(datetime(2024, 3, 5, 12, 0))["月柱"][1] == "卯"
+
+
+def test_get_meishiki_many_matches_scalar():
+    dts = _sample_datetimes()
+    assert get_meishiki_many(dts) == [get_meishiki(dt) for dt in dts]
+
+
+def test_get_meishiki_many_uses_wall_clock_time():
+    tz = ZoneInfo("Asia/Tokyo")
+    dts = [datetime(1990, 2, 4, 0, 30, tzinfo=tz), datetime(1990, 2, 3, 23, 59, tzinfo=tz)]
+    assert get_meishiki_many(dts) == [get_meishiki(dt) for dt in dts]
+    assert get_meishiki_many(np.array(["1990-02-04T00:30", "1990-02-03T23:59"], dtype="datetime64[m]")) == get_meishiki_many(dts)
+    assert get_meishiki_many([]) == []
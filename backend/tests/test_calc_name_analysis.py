@@ -55,3 +55,33 @@ def test_gogaku():
             },
         }
     }
+
+
+def test_gogaku_batch_matches_get_gogaku():
+    import random
+
+    from app.services.calc_name_analysis import (
+        GRID_NAMES,
+        get_gogaku_batch,
+        pad_strokes,
+    )
+
+    rng = random.Random(0)
+    names = [([rng.randint(0, 30) for _ in range(rng.randint(0, 3))], [rng.randint(0, 30) for _ in range(rng.randint(0, 3))]) for _ in range(500)]
+    batch = get_gogaku_batch(pad_strokes([s for s, _ in names]), pad_strokes([m for _, m in names]))
+
+    assert len(batch) == len(names)
+    for i, (sei, mei) in enumerate(names):
+        expected = get_gogaku([("x", v) for v in sei], [("y", v) for v in mei])
+        assert batch.entry(i) == expected
+        for j, grid in enumerate(GRID_NAMES):
+            point = expected["五格"][grid]["吉凶ポイント"]
+            assert batch.points[i, j] == (-1 if point is None else point)
+
+
+def test_gogaku_batch_broadcasts_one_surname():
+    from app.services.calc_name_analysis import get_gogaku_batch, pad_strokes
+
+    batch = get_gogaku_batch([[3, 5]], pad_strokes([[4, 9], [7]]))
+    assert batch.column("総格").tolist() == [21, 15]
+    assert batch.column("人格").tolist() == [9, 12]
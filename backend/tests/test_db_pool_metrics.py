@@ -0,0 +1,104 @@
+import asyncio
+
+import pytest
+from app import db
+from sqlalchemy import text
+
+
+def test_pool_metrics_hold_time_histogram():
+    metrics = db.PoolMetrics()
+
+    class Record:
+        def __init__(self):
+            self.info = {}
+
+    a, b = Record(), Record()
+    metrics.on_checkout(None, a, None)
+    metrics.on_checkout(None, b, None)
+    assert metrics.snapshot()["checked_out"] == 2
+
+    generation, started = a.info["checked_out_at"]
+    a.info["checked_out_at"] = (generation, started - 2.0)  # held for ~2 seconds
+    metrics.on_checkin(None, a)
+    metrics.on_checkin(None, b)
+    stats = metrics.snapshot()
+    assert stats["checkouts"] == 2
+    assert stats["checked_out"] == 0
+    assert stats["max_checked_out"] == 2
+    assert stats["hold_seconds_max"] >= 2.0
+    assert stats["hold_seconds_buckets"]["5.0"] == 1
+    assert stats["hold_seconds_buckets"]["0.01"] == 1
+    # checkin without a recorded checkout (e.g. invalidated connection) is ignored
+    metrics.on_checkin(None, Record())
+    assert metrics.snapshot()["checkouts"] == 2
+
+    # a connection checked out before reset() is not counted when it comes back
+    metrics.on_checkout(None, a, None)
+    metrics.reset()
+    metrics.on_checkin(None, a)
+    assert (metrics.snapshot()["checked_out"], metrics.snapshot()["hold_seconds_buckets"]["+Inf"]) == (0, 0)
+
+
+@pytest.mark.anyio
+async def test_session_checkout_is_measured(async_client):
+    db.get_engine()  # bind the pool to this test's loop (a loop change resets the metrics)
+    before = db.pool_metrics.snapshot()["checkouts"]
+    async with db.SessionLocal() as session:
+        await session.execute(text("SELECT 1"))
+        await asyncio.sleep(0.02)
+    stats = db.pool_stats()
+    assert stats["connections"]["checkouts"] == before + 1
+    assert stats["connections"]["hold_seconds_max"] >= 0.02
+
+    # pool sizing and load are not public
+    r = await async_client.get("/api/v1/health/db-pool")
+    assert r.status_code == 401
+    resp = await async_client.post("/api/v1/auth/login", data={"username": "demo", "password": "demo"})
+    assert resp.status_code == 200
+    r = await async_client.get("/api/v1/health/db-pool")
+    assert r.status_code == 200
+    assert r.json()["connections"]["checkouts"] >= before + 1
+
+
+def test_pooled_engine_survives_event_loop_changes():
+    async def query() -> int:
+        async with db.SessionLocal() as session:
+            return (await session.execute(text("SELECT 1"))).scalar_one()
+
+    # 別々のイベントループ（asyncio.run）から使っても、ループごとにプールを作り直す
+    assert asyncio.run(query()) == 1
+    first = db.get_engine()
+    assert asyncio.run(query()) == 1
+    assert db.get_engine() is not first
+    assert db.pool_stats()["pool"]["class"] == "AsyncAdaptedQueuePool"
+
+
+def test_loop_change_resets_the_checked_out_count():
+    class Record:
+        def __init__(self):
+            self.info = {}
+
+    async def query() -> int:
+        async with db.SessionLocal() as session:
+            return (await session.execute(text("SELECT 1"))).scalar_one()
+
+    assert asyncio.run(query()) == 1
+    # a connection still checked out when its loop ends is never checked in
+    db.pool_metrics.on_checkout(None, Record(), None)
+    assert db.pool_metrics.snapshot()["checked_out"] == 1
+    assert asyncio.run(query()) == 1
+    assert db.pool_metrics.snapshot()["checked_out"] == 0
+
+
+@pytest.mark.anyio
+async def test_engine_lifecycle_and_ready_db_check(async_client):
+    engine = await db.init_engine()
+    assert db.get_engine() is engine
+    async with db.get_engine().connect() as conn:
+        assert (await conn.execute(text("SELECT 1"))).scalar_one() == 1
+
+    r = await async_client.get("/api/v1/ready")
+    assert "db_error" not in r.json().get("detail", {}).get("details", {})
+
+    await db.dispose_engine()
+    assert db.get_engine() is not engine
@@ -0,0 +1,135 @@
+import import_kanji
+import pytest
+from app import db
+from sqlalchemy import text
+
+# 実データと衝突しないよう私用領域のコードポイントを使う
+SOURCE = """\
+# comment line
+U+E000\t1
+U+E001\t7,8
+
+U+E002\t-
+U+E003\t4
+U+E000\t2
+"""
+CHARS = [chr(cp) for cp in range(0xE000, 0xE004)]
+
+
+def test_iter_records_streams_parsed_rows(tmp_path):
+    path = tmp_path / "ucs-strokes.txt"
+    path.write_text(SOURCE, encoding="utf-8")
+
+    records = list(import_kanji.iter_records(str(path), "test"))
+    assert [r[1] for r in records] == ["", "", "", "", ""]
+    assert records[1][2:] == ("U+E001", "7,8", 7, 8, "test")
+    assert records[2][4:6] == (None, None)
+    assert [len(b) for b in import_kanji.batched(records, 2)] == [2, 2, 1]
+
+
+class FakeRedis:
+    """Records what the import removes from the `kanji:strokes` hash."""
+
+    def __init__(self):
+        self.hash = dict.fromkeys(CHARS, "1,1")
+        self.deleted = False
+
+    async def hdel(self, key, *fields):
+        for f in fields:
+            self.hash.pop(f, None)
+
+    async def delete(self, key):
+        self.hash.clear()
+        self.deleted = True
+
+    async def aclose(self):
+        pass
+
+
+@pytest.fixture
+def stroke_cache(monkeypatch):
+    redis = FakeRedis()
+    monkeypatch.setattr(import_kanji.Redis, "from_url", lambda url: redis)
+    return redis
+
+
+@pytest.fixture
+async def cleanup_kanji():
+    yield
+    async with db.get_engine().begin() as conn:
+        await conn.execute(text("DELETE FROM kanji WHERE char = ANY(:chars)"), {"chars": CHARS})
+        await conn.execute(text("DELETE FROM kanji_meta WHERE key = :key"), {"key": import_kanji.META_FINGERPRINT_KEY})
+
+
+async def _imported_rows() -> list[tuple]:
+    async with db.get_engine().connect() as conn:
+        rows = await conn.execute(text("SELECT char, strokes_text, strokes_min, strokes_max, source FROM kanji WHERE char = ANY(:chars) ORDER BY char"), {"chars": CHARS})
+        return [tuple(r) for r in rows]
+
+
+EXPECTED = [
+    ("\ue000", "2", 2, 2, "test"),
+    ("\ue001", "7,8", 7, 8, "test"),
+    ("\ue002", "-", None, None, "test"),
+    ("\ue003", "4", 4, 4, "test"),
+]
+
+
+@pytest.mark.anyio
+async def test_import_file_copies_and_upserts_in_batches(tmp_path, cleanup_kanji, capsys):
+    path = tmp_path / "ucs-strokes.txt"
+    path.write_text(SOURCE, encoding="utf-8")
+
+    # batch_size=2: the duplicate U+E000 lands in a later batch; 10: both copies are in one batch.
+    # Either way the later line wins.
+    for batch_size in (2, 10):
+        assert await import_kanji.import_file(str(path), source_label="test", batch_size=batch_size) == 5
+        assert "rows/sec" in capsys.readouterr().out
+        assert await _imported_rows() == EXPECTED
+
+
+def test_diff_records_only_touches_changed_rows_of_the_same_source():
+    records = [
+        (0, "山", "U+5C71", "3", 3, 3, "src"),
+        (1, "田", "U+7530", "5", 5, 5, "src"),
+        (2, "川", "U+5DDD", "3", 3, 3, "src"),
+    ]
+    existing = {
+        "山": ("U+5C71", "3", 3, 3, "src"),  # unchanged
+        "田": ("U+7530", "6", 6, 6, "src"),  # changed
+        "木": ("U+6728", "4", 4, 4, "src"),  # removed from the file
+        "火": ("U+706B", "4", 4, 4, "other"),  # another source: kept
+    }
+    diff = import_kanji.diff_records(records, existing, "src")
+    assert [r[1] for r in diff.upserts] == ["田", "川"]
+    assert diff.deletes == ["木"]
+    assert diff.unchanged == 1
+
+
+@pytest.mark.anyio
+async def test_import_incremental_applies_only_the_differences(tmp_path, cleanup_kanji, stroke_cache, capsys):
+    path = tmp_path / "ucs-strokes.txt"
+    path.write_text(SOURCE, encoding="utf-8")
+    await import_kanji.import_file(str(path), source_label="test")
+    # a full import drops the whole Redis hash
+    assert stroke_cache.deleted
+    stroke_cache.hash = dict.fromkeys(CHARS, "1,1")
+    version = await import_kanji.read_meta(import_kanji.META_VERSION_KEY)
+
+    # same file: skipped by the fingerprint, version untouched
+    assert await import_kanji.import_incremental(str(path), source_label="test") is None
+    # forced comparison without changes writes nothing and keeps the version
+    diff = await import_kanji.import_incremental(str(path), source_label="test", force=True)
+    assert not diff and diff.unchanged == 4
+    assert await import_kanji.read_meta(import_kanji.META_VERSION_KEY) == version
+
+    # U+E001 changed, U+E002 removed, U+E003 unchanged
+    path.write_text("U+E000\t2\nU+E001\t9\nU+E003\t4\n", encoding="utf-8")
+    diff = await import_kanji.import_incremental(str(path), source_label="test")
+    assert [r[1] for r in diff.upserts] == ["\ue001"]
+    assert diff.deletes == ["\ue002"]
+    assert await import_kanji.read_meta(import_kanji.META_VERSION_KEY) != version
+    assert await import_kanji.read_meta(import_kanji.META_FINGERPRINT_KEY) == import_kanji.file_fingerprint(str(path))
+    assert await _imported_rows() == [EXPECTED[0], ("\ue001", "9", 9, 9, "test"), EXPECTED[3]]
+    # only the changed and removed characters leave the Redis hash
+    assert sorted(stroke_cache.hash) == ["\ue000", "\ue003"]
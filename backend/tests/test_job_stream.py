@@ -0,0 +1,312 @@
+import asyncio
+
+import pytest
+from app import auth
+from app.main import app
+from app.services import job_events, job_service, litellm_adapter, llm_stream
+from httpx import ASGITransport, AsyncClient
+
+URL_PREFIX = "/api/v1"
+
+
+class FakeStreamRedis:
+    """Minimal XADD/XREAD on an in-memory list."""
+
+    def __init__(self):
+        self.entries: list[tuple[str, dict]] = []
+        self.expired: dict[str, int] = {}
+
+    async def xadd(self, key, fields, maxlen=None, approximate=True):
+        entry_id = f"{len(self.entries) + 1}-0"
+        self.entries.append((entry_id, {k.encode(): v.encode() for k, v in fields.items()}))
+        return entry_id
+
+    async def expire(self, key, ttl):
+        self.expired[key] = ttl
+
+    async def xread(self, streams, block=None, count=None):
+        (key, last_id), *_ = streams.items()
+        last = int(last_id.split("-")[0])
+        new = [(i.encode(), f) for i, f in self.entries if int(i.split("-")[0]) > last]
+        return [(key.encode(), new)] if new else []
+
+    async def exists(self, key):
+        return int(bool(self.entries))
+
+    async def aclose(self):
+        pass
+
+
+@pytest.fixture
+def signed_in():
+    app.dependency_overrides[auth.get_current_userid] = lambda: 1
+    yield
+    app.dependency_overrides.pop(auth.get_current_userid, None)
+
+
+@pytest.mark.anyio
+async def test_adapter_streams_chunks(monkeypatch):
+    real_acompletion = litellm_adapter.acompletion
+
+    async def mock_acompletion(**kwargs):
+        return await real_acompletion(mock_response="桃源の旅が始まる", **kwargs)
+
+    monkeypatch.setattr(litellm_adapter, "acompletion", mock_acompletion)
+    monkeypatch.setattr(litellm_adapter.llm_cache, "LLM_CACHE_BYPASS", True)
+
+    chunks: list[str] = []
+
+    async def on_chunk(text):
+        chunks.append(text)
+
+    adapter = litellm_adapter.LiteLlmAdapter(provider="vertex_ai", model="gemini/gemini-2.5-flash")
+    res = await adapter.make_analysis(1, system_prompt="sys", user_prompt="user", on_chunk=on_chunk)
+
+    assert "".join(chunks) == "桃源の旅が始まる"
+    assert res.response_text == "桃源の旅が始まる"
+
+
+@pytest.mark.anyio
+async def test_adapter_rejects_an_empty_stream(monkeypatch):
+    class EmptyStream:
+        def __aiter__(self):
+            return self
+
+        async def __anext__(self):
+            raise StopAsyncIteration
+
+    async def mock_acompletion(**kwargs):
+        return EmptyStream()
+
+    monkeypatch.setattr(litellm_adapter, "acompletion", mock_acompletion)
+
+    async def on_chunk(text):
+        pass
+
+    adapter = litellm_adapter.LiteLlmAdapter(provider="vertex_ai", model="gemini/gemini-2.5-flash")
+    with pytest.raises(RuntimeError, match="no chunks"):
+        await adapter._call_llm_stream(adapter.model, 0.0, 0, [{"role": "user", "content": "u"}], on_chunk)
+
+
+@pytest.mark.anyio
+async def test_stream_endpoint_relays_published_chunks(monkeypatch, signed_in):
+    monkeypatch.setattr(llm_stream, "LLM_STREAMING", True)
+    redis = FakeStreamRedis()
+    publisher = llm_stream.StreamPublisher(redis, "job-1")
+    await publisher.chunk_writer("detail")("桃源")
+    await publisher.chunk_writer("summary")("の旅")
+    await publisher.end("complete")
+    assert redis.expired == {"analysis:stream:job-1": llm_stream.STREAM_TTL}
+
+    async def fake_create_pool(*args, **kwargs):
+        return redis
+
+    async def fake_job_owner(self, job_id):
+        return 1
+
+    monkeypatch.setattr("app.services.job_service.create_pool", fake_create_pool)
+    monkeypatch.setattr("app.services.job_service._pool", None)
+    monkeypatch.setattr("app.services.job_service._stream_pool", None)
+    monkeypatch.setattr(job_service.JobService, "job_owner", fake_job_owner)
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        r = await ac.get(URL_PREFIX + "/jobs/job-1/stream", headers={"Last-Event-ID": "1-0"})
+
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/event-stream")
+    assert r.text == ('id: 2-0\nevent: chunk\ndata: {"part": "summary", "text": "の旅"}\n\nid: 3-0\nevent: end\ndata: {"status": "complete"}\n\n')
+
+
+class FakePubSubRedis:
+    """In-memory PUBLISH / PSUBSCRIBE (prefix patterns only)."""
+
+    def __init__(self):
+        self.subscribers: list[asyncio.Queue] = []
+        self.psubscribes = 0
+
+    async def publish(self, channel, data):
+        for q in self.subscribers:
+            q.put_nowait({"type": "pmessage", "channel": channel.encode(), "data": data.encode()})
+        return len(self.subscribers)
+
+    def pubsub(self):
+        redis = self
+
+        class _PubSub:
+            async def psubscribe(self, pattern):
+                redis.psubscribes += 1
+                await asyncio.sleep(0)  # a round trip: other waiters run meanwhile
+                self.queue = asyncio.Queue()
+                redis.subscribers.append(self.queue)
+
+            async def listen(self):
+                while True:
+                    yield await self.queue.get()
+
+            async def aclose(self):
+                redis.subscribers.remove(self.queue)
+
+        return _PubSub()
+
+    async def aclose(self):
+        pass
+
+
+@pytest.fixture
+def pubsub_redis(monkeypatch):
+    redis = FakePubSubRedis()
+
+    async def fake_create_pool(*args, **kwargs):
+        return redis
+
+    async def fake_get_job_status(self, job_id):
+        return {"status": "JobStatus.queued", "result": None}
+
+    async def fake_is_owner(self, job_id, user_id):
+        return job_id == "job-1" and user_id == 1
+
+    monkeypatch.setattr("app.services.job_service.create_pool", fake_create_pool)
+    monkeypatch.setattr("app.services.job_service._pool", None)
+    monkeypatch.setattr("app.services.job_service._stream_pool", None)
+    monkeypatch.setattr(job_service.JobService, "get_job_status", fake_get_job_status)
+    monkeypatch.setattr(job_service.JobService, "is_owner", fake_is_owner)
+    monkeypatch.setattr(job_events, "hub", job_events.JobEventHub())
+    return redis
+
+
+@pytest.mark.anyio
+async def test_long_poll_returns_on_published_completion(pubsub_redis):
+    async def finish_later():
+        while not job_events.hub._waiters:
+            await asyncio.sleep(0)
+        await job_events.publish_job_event(pubsub_redis, "other-job", "JobStatus.complete", {"id": 99})
+        await job_events.publish_job_event(pubsub_redis, "job-1", "JobStatus.complete", {"id": 1, "name": "山田 太郎"})
+
+    finisher = asyncio.create_task(finish_later())
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        r = await ac.get(URL_PREFIX + "/jobs/job-1", params={"wait": 30})
+    await finisher
+    await job_events.hub.close()
+
+    assert r.status_code == 200
+    assert r.json() == {"status": "JobStatus.complete", "result": {"id": 1, "name": "山田 太郎"}}
+    assert job_events.hub._waiters == {}
+
+
+@pytest.mark.anyio
+async def test_concurrent_waiters_share_one_subscription(pubsub_redis):
+    hub = job_events.hub
+    received = []
+
+    async def wait(job_id):
+        async with hub.subscribe(pubsub_redis, job_id) as events:
+            received.append(await asyncio.wait_for(events.get(), 1))
+
+    waiters = [asyncio.create_task(wait("job-1")) for _ in range(5)]
+    while sum(len(q) for q in hub._waiters.values()) < 5:
+        await asyncio.sleep(0)
+    await job_events.publish_job_event(pubsub_redis, "job-1", "JobStatus.complete")
+    await asyncio.gather(*waiters)
+    await hub.close()
+
+    assert pubsub_redis.psubscribes == 1
+    # every waiter got the event exactly once, and close() released the only connection
+    assert len(received) == 5
+    assert pubsub_redis.subscribers == []
+
+
+@pytest.mark.anyio
+async def test_long_poll_times_out_with_current_status(pubsub_redis, monkeypatch):
+    monkeypatch.setattr(job_service, "JOB_WAIT_MAX_SECONDS", 0.05)
+    res = await job_service.JobService().wait_for_status("job-1", 30)
+    await job_events.hub.close()
+
+    assert res == {"status": "JobStatus.queued", "result": None}
+
+
+@pytest.mark.anyio
+async def test_events_endpoint_pushes_status_changes(pubsub_redis, signed_in):
+    async def progress_later():
+        while not job_events.hub._waiters:
+            await asyncio.sleep(0)
+        await job_events.publish_job_event(pubsub_redis, "job-1", "JobStatus.in_progress")
+        await job_events.publish_job_event(pubsub_redis, "job-1", job_events.STATUS_FAILED, {"error": "analysis failed"})
+
+    task = asyncio.create_task(progress_later())
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        r = await ac.get(URL_PREFIX + "/jobs/job-1/events")
+    await task
+    await job_events.hub.close()
+
+    assert r.headers["content-type"].startswith("text/event-stream")
+    assert r.text == (
+        'event: status\ndata: {"status": "JobStatus.queued", "result": null}\n\n'
+        'event: status\ndata: {"status": "JobStatus.in_progress", "result": null}\n\n'
+        'event: status\ndata: {"status": "JobStatus.failed", "result": {"error": "analysis failed"}}\n\n'
+    )
+
+
+@pytest.mark.anyio
+async def test_stream_endpoints_refuse_early(monkeypatch, pubsub_redis, signed_in):
+    async def no_stream(self, job_id):
+        return False
+
+    monkeypatch.setattr(job_service.JobService, "stream_available", no_stream)
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        # streaming disabled: nothing will ever be written to the stream
+        monkeypatch.setattr(llm_stream, "LLM_STREAMING", False)
+        assert (await ac.get(URL_PREFIX + "/jobs/job-1/stream")).status_code == 404
+        # unknown job / finished job without a stream
+        monkeypatch.setattr(llm_stream, "LLM_STREAMING", True)
+        assert (await ac.get(URL_PREFIX + "/jobs/job-1/stream")).status_code == 404
+        assert (await ac.get(URL_PREFIX + "/jobs/other-job/events")).status_code == 404
+    assert job_events.hub._waiters == {}
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("path", ["/jobs/job-1/stream", "/jobs/job-1/events"])
+async def test_stream_endpoints_require_authentication(path):
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        assert (await ac.get(URL_PREFIX + path)).status_code == 401
+
+
+@pytest.mark.anyio
+async def test_stream_endpoints_hide_other_users_jobs(monkeypatch, pubsub_redis):
+    monkeypatch.setattr(llm_stream, "LLM_STREAMING", True)
+    app.dependency_overrides[auth.get_current_userid] = lambda: 2
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+            for path in ("/jobs/job-1/stream", "/jobs/job-1/events"):
+                assert (await ac.get(URL_PREFIX + path)).status_code == 404
+    finally:
+        app.dependency_overrides.pop(auth.get_current_userid, None)
+
+
+@pytest.mark.anyio
+async def test_job_owner_is_read_from_the_job_arguments(monkeypatch):
+    from arq.jobs import JobDef
+
+    jobs = {
+        "analysis": JobDef("app.tasks.process_analysis", (7, "太", "郎", "1990-01-01", 12), {}, 1, 0, None, "x"),
+        "enrich": JobDef("app.tasks.enrich_analysis", (99, 7, "detail", "summary"), {}, 1, 0, None, "x"),
+    }
+
+    class FakeJob:
+        def __init__(self, job_id, pool, _queue_name=None):
+            self.job_id = job_id
+
+        async def info(self):
+            return jobs.get(self.job_id)
+
+    async def fake_get_pool(host="redis"):
+        return None
+
+    monkeypatch.setattr(job_service, "get_pool", fake_get_pool)
+    monkeypatch.setattr(job_service, "Job", FakeJob)
+    service = job_service.JobService()
+
+    assert await service.job_owner("analysis") == 7
+    assert await service.job_owner("enrich") == 7
+    assert await service.job_owner("expired") is None
+    assert await service.is_owner("enrich", 7)
+    assert not await service.is_owner("enrich", 8)
@@ -0,0 +1,49 @@
+import pytest
+from app.services import kanji_index
+from app.services.kanji_index import KanjiStrokeIndex
+
+
+def test_index_lookup():
+    index = KanjiStrokeIndex.from_rows([("山", 3, 3), ("麗", 19, 20), ("〇", None, None)], version="v1")
+
+    assert len(index) == 3
+    assert index.version == "v1"
+    assert index.get("麗") == (19, 20)
+    assert index.get("〇") == (None, None)
+    assert index.get("田") is None
+    assert "〇" in index
+    assert "田" not in index
+    # 未登録・画数不明は 0 画として扱う（従来の DB 参照と同じ）
+    assert index.lookup("山 田〇") == [("山", 3), ("田", 0), ("〇", 0)]
+
+
+@pytest.mark.anyio
+async def test_get_index_reloads_when_version_changes(monkeypatch):
+    versions = iter(["v1", "v2"])
+
+    async def fake_fetch_version(session):
+        return next(versions)
+
+    async def fake_load_index(session):
+        return KanjiStrokeIndex.from_rows([("山", 3, 3)], version="v0")
+
+    class FakeSession:
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, exc_type, exc, tb):
+            return False
+
+    monkeypatch.setattr(kanji_index, "fetch_version", fake_fetch_version)
+    monkeypatch.setattr(kanji_index, "load_index", fake_load_index)
+    monkeypatch.setattr(kanji_index.db, "ReadSessionLocal", FakeSession)
+    monkeypatch.setattr(kanji_index, "CHECK_INTERVAL", 0)
+
+    kanji_index.set_index(KanjiStrokeIndex.from_rows([("田", 5, 5)], version="v1"))
+    try:
+        # same version -> keep the loaded index
+        assert "田" in await kanji_index.get_index()
+        # version changed -> reload
+        assert "山" in await kanji_index.get_index()
+    finally:
+        kanji_index.set_index(None)
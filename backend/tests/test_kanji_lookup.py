@@ -0,0 +1,84 @@
+import pytest
+from app.services.kanji_lookup import (
+    KanjiLookupService,
+    RedisHashBackend,
+    invalidate_redis_hash,
+    strokes_pairs,
+)
+
+
+class CountingBackend:
+    def __init__(self, table):
+        self.table = table
+        self.calls: list[set[str]] = []
+
+    async def fetch(self, chars):
+        self.calls.append(set(chars))
+        return {c: self.table[c] for c in chars if c in self.table}
+
+
+class FakeRedis:
+    def __init__(self):
+        self.hash: dict[str, str] = {}
+
+    async def hmget(self, key, fields):
+        return [self.hash.get(f) for f in fields]
+
+    async def hset(self, key, mapping):
+        self.hash.update(mapping)
+
+    async def hdel(self, key, *fields):
+        for f in fields:
+            self.hash.pop(f, None)
+
+    async def delete(self, key):
+        self.hash.clear()
+
+
+@pytest.mark.anyio
+async def test_get_strokes_shares_memo():
+    backend = CountingBackend({"山": (3, 3), "田": (5, 5), "太": (4, 4)})
+    service = KanjiLookupService(backend)
+    memo: dict = {}
+
+    # validation: one bulk fetch, unregistered chars are left out
+    found = await service.get_strokes("山田X", memo)
+    assert found == {"山": (3, 3), "田": (5, 5)}
+    assert memo["X"] is None
+
+    # scoring with the same memo: only the new character is fetched
+    found = await service.get_strokes("山田太", memo)
+    assert found == {"山": (3, 3), "田": (5, 5), "太": (4, 4)}
+    assert backend.calls == [{"山", "田", "X"}, {"太"}]
+
+    assert strokes_pairs("山 X", found) == [("山", 3), ("X", 0)]
+
+
+@pytest.mark.anyio
+async def test_redis_backend_reads_through():
+    fallback = CountingBackend({"山": (3, 3), "〇": (None, None)})
+    redis = FakeRedis()
+    backend = RedisHashBackend(redis, fallback)
+
+    assert await backend.fetch({"山", "〇"}) == {"山": (3, 3), "〇": (None, None)}
+    assert redis.hash == {"山": "3,3", "〇": ","}
+    # second call is served from the hash
+    assert await backend.fetch({"山", "〇"}) == {"山": (3, 3), "〇": (None, None)}
+    assert len(fallback.calls) == 1
+
+
+@pytest.mark.anyio
+async def test_invalidated_chars_are_read_again():
+    fallback = CountingBackend({"山": (3, 3), "田": (5, 5)})
+    redis = FakeRedis()
+    backend = RedisHashBackend(redis, fallback)
+    await backend.fetch({"山", "田"})
+
+    # the import changed 山: only that entry is dropped and re-read
+    fallback.table["山"] = (4, 4)
+    await invalidate_redis_hash(redis, ["山"])
+    assert await backend.fetch({"山", "田"}) == {"山": (4, 4), "田": (5, 5)}
+    assert fallback.calls[-1] == {"山"}
+
+    await invalidate_redis_hash(redis)
+    assert redis.hash == {}
@@ -2,9 +2,83 @@ import pytest
 from app.services.litellm_adapter import LiteLlmAdapter
 
 
-@pytest.mark.asyncio
+@pytest.mark.anyio
 async def test_make_analysis_detail_with_ci_fixture():
     lite_llm_adapter = LiteLlmAdapter(provider="vertex_ai", model="gemini/gemini-2.5-flash")
     llm_response = await lite_llm_adapter.make_analysis(1, system_prompt="システム＿プロンプト", user_prompt="ユーザープロンプト")
 
     assert llm_response.response_text == "[FAKE RESP] model=gemini/gemini-2.5-flash system_prompt=システム＿プロンプト user_prompt=ユーザープロンプト"
+
+
+@pytest.mark.anyio
+async def test_call_llm_async_is_bounded_per_model(monkeypatch):
+    import asyncio
+
+    from app.services import litellm_adapter
+    from tests.utils.fake_llm_response import fake_llm_response
+
+    in_flight = 0
+    peak = 0
+
+    async def fake_acompletion(model, messages, temperature, num_retries):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return fake_llm_response(model=model, messages=messages)
+
+    monkeypatch.setattr(litellm_adapter, "acompletion", fake_acompletion)
+    monkeypatch.setattr(litellm_adapter, "LLM_MAX_CONCURRENCY", 2)
+
+    adapter = LiteLlmAdapter(provider="vertex_ai", model="gemini/test-bounded")
+    messages = [{"role": "system", "content": "s"}, {"role": "user", "content": "u"}]
+    results = await asyncio.gather(*(adapter._call_llm_async(adapter.model, 0.8, 0, messages) for _ in range(6)))
+
+    assert len(results) == 6
+    assert peak == 2
+
+
+@pytest.mark.anyio
+async def test_make_analysis_uses_prompt_hash_cache(monkeypatch):
+    from app.services import litellm_adapter, llm_cache
+    from tests.utils.fake_llm_response import fake_llm_response
+
+    calls = 0
+
+    async def counting_call_llm(self, model, temperature, num_retries, messages):
+        nonlocal calls
+        calls += 1
+        return fake_llm_response(model=model, messages=messages)
+
+    monkeypatch.setattr(litellm_adapter.LiteLlmAdapter, "_call_llm", counting_call_llm)
+    monkeypatch.setattr(llm_cache, "LLM_CACHE_BACKEND", "memory")
+    monkeypatch.setattr(llm_cache, "_cache", llm_cache.MemoryLLMCache(maxsize=10, ttl=60))
+
+    adapter = LiteLlmAdapter(provider="vertex_ai", model="gemini/gemini-2.5-flash")
+    first = await adapter.make_analysis(1, system_prompt="sys", user_prompt="山田太郎")
+    second = await adapter.make_analysis(1, system_prompt="sys", user_prompt="山田太郎")
+    bypassed = await adapter.make_analysis(1, system_prompt="sys", user_prompt="山田太郎", bypass_cache=True)
+
+    assert calls == 2
+    assert first.cache_hit is False and bypassed.cache_hit is False
+    assert second.cache_hit is True
+    assert second.prompt_hash == first.prompt_hash and len(first.prompt_hash) == 64
+    assert second.response_text == first.response_text
+
+
+@pytest.mark.anyio
+async def test_memory_llm_cache_lru_and_ttl():
+    from app.services.llm_cache import MemoryLLMCache
+
+    cache = MemoryLLMCache(maxsize=2, ttl=60)
+    await cache.set("a", {"v": 1})
+    await cache.set("b", {"v": 2})
+    assert await cache.get("a") == {"v": 1}  # a is now most recently used
+    await cache.set("c", {"v": 3})
+    assert await cache.get("b") is None
+    assert await cache.get("a") == {"v": 1}
+
+    expired = MemoryLLMCache(maxsize=2, ttl=-1)
+    await expired.set("a", {"v": 1})
+    assert await expired.get("a") is None
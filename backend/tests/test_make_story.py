@@ -0,0 +1,43 @@
+import sys
+
+from app.services import make_story
+
+TEMPLATE = "{{四柱.年柱.干支}} / {{五格.総格.値}}"
+CONTEXT = {"四柱": {"年柱": {"干支": "甲子"}}, "五格": {"総格": {"値": 21}}}
+
+
+def _real_jinja(monkeypatch):
+    # conftest は jinja2 をスタブに差し替えているので、本物を読み込み直す
+    monkeypatch.delitem(sys.modules, "jinja2")
+    import jinja2
+
+    return jinja2
+
+
+def test_registry_compiles_each_template_once():
+    registry = make_story.TemplateRegistry()
+
+    first = registry.get(TEMPLATE)
+    assert registry.get("".join(list(TEMPLATE))) is first
+    assert registry.get(TEMPLATE + " ") is not first
+    assert len(registry) == 2
+
+
+def test_render_many_matches_single_render(monkeypatch):
+    jinja2 = _real_jinja(monkeypatch)
+    monkeypatch.setattr(make_story, "registry", make_story.TemplateRegistry(jinja2.Environment()))
+
+    assert make_story.render_life_analysis(CONTEXT, TEMPLATE) == "甲子 / 21"
+    assert make_story.render_many([CONTEXT, {**CONTEXT, "五格": {"総格": {"値": 5}}}], TEMPLATE) == ["甲子 / 21", "甲子 / 5"]
+
+
+def test_precompiled_templates_are_loaded(monkeypatch, tmp_path):
+    jinja2 = _real_jinja(monkeypatch)
+    keys = make_story.precompile([TEMPLATE], str(tmp_path))
+    assert keys == [make_story.template_key(TEMPLATE)]
+
+    registry = make_story.TemplateRegistry(jinja2.Environment(), precompiled_dir=str(tmp_path))
+    compiled = registry.get(TEMPLATE)
+    assert compiled.render(**CONTEXT) == "甲子 / 21"
+    # 事前コンパイルに無いテンプレートは実行時にコンパイルする
+    assert registry.get("{{ x }}").render(x=1) == "1"
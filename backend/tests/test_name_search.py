@@ -0,0 +1,68 @@
+import json
+
+import pytest
+from app.services import kanji_index, name_search
+from app.services.calc_name_analysis import get_gogaku
+from app.services.kanji_index import KanjiStrokeIndex
+
+ROWS = [("山", 3, 3), ("田", 5, 5), ("一", 1, 1), ("人", 2, 2), ("大", 3, 3), ("太", 4, 4), ("正", 5, 5), ("光", 6, 6), ("花", 7, 7), ("〇", None, None)]
+
+
+def _brute_force(sei: list[int], groups: dict[int, tuple[str, ...]], length: int) -> dict[str, int]:
+    import itertools
+
+    chars = [(ch, s) for s, group in groups.items() for ch in group]
+    scores = {}
+    for combo in itertools.product(chars, repeat=length):
+        gogaku = get_gogaku([("", s) for s in sei], [("", s) for _, s in combo])["五格"]
+        scores["".join(ch for ch, _ in combo)] = sum(max(gogaku[g]["吉凶ポイント"] or 0, 0) for g in name_search.SCORED_GRIDS)
+    return scores
+
+
+def test_search_names_returns_top_k_in_score_order():
+    index = KanjiStrokeIndex.from_rows(ROWS)
+    groups = name_search.build_stroke_groups(index.iter_strokes())
+    assert "〇" not in {ch for chars in groups.values() for ch in chars}
+
+    found = list(name_search.search_names([3, 5], groups, length=2, k=10))
+    expected = _brute_force([3, 5], groups, 2)
+
+    assert len(found) == 10
+    assert [c.score for c in found] == sorted((c.score for c in found), reverse=True)
+    assert found[0].score == max(expected.values())
+    for c in found:
+        assert c.score == expected[c.mei]
+        assert c.gogaku["地格"]["値"] == sum(c.strokes)
+    # k 件目より点数の高い名はすべて含まれている
+    assert {m for m, s in expected.items() if s > found[-1].score} <= {c.mei for c in found}
+
+
+def test_search_names_stroke_bounds_and_min_point():
+    groups = name_search.build_stroke_groups([("一", 1), ("人", 2), ("大", 3), ("花", 7)])
+
+    assert name_search.enumerate_patterns([1, 2, 3, 7], 2, 9, 10).tolist() == [[2, 7], [3, 7], [7, 2], [7, 3]]
+    # 地格 4〜5 画のうち、人格・地格・外格・総格すべてが 3 点（半吉）以上なのは (2, 3) / (3, 2) だけ
+    found = list(name_search.search_names([3, 5], groups, length=2, k=100, min_total=4, max_total=5, min_point=3))
+    assert {c.mei for c in found} == {"人大", "大人"}
+    assert all(c.score == 16 for c in found)
+
+
+@pytest.mark.anyio
+async def test_name_search_endpoint_streams_ndjson(logged_in_client):
+    kanji_index.set_index(KanjiStrokeIndex.from_rows(ROWS))
+    try:
+        resp = await logged_in_client.post("/api/v1/names/search", json={"name_sei": "山田", "length": 1, "k": 3})
+        assert resp.status_code == 200
+        assert resp.headers["content-type"].startswith("application/x-ndjson")
+        lines = [json.loads(line) for line in resp.text.splitlines()]
+        assert len(lines) == 3
+        assert [c["score"] for c in lines] == sorted((c["score"] for c in lines), reverse=True)
+        assert set(lines[0]) == {"mei", "strokes", "score", "五格"}
+
+        resp = await logged_in_client.post("/api/v1/names/search", json={"name_sei": "山田", "chars": "一人", "k": 10})
+        assert {c["mei"] for c in map(json.loads, resp.text.splitlines())} == {"一一", "一人", "人一", "人人"}
+
+        resp = await logged_in_client.post("/api/v1/names/search", json={"name_sei": "山本"})
+        assert resp.status_code == 422
+    finally:
+        kanji_index.set_index(None)
@@ -0,0 +1,108 @@
+import asyncio
+import time
+
+import pytest
+from app import auth, db
+from app.services import password_service
+from app.services.password_service import PasswordHasher, PasswordHasherBusy
+from passlib.context import CryptContext
+from sqlalchemy import text
+
+# 固定コストの pbkdf2 だけの context（bcrypt の有無に左右されないように）
+ROUNDS = 2000
+
+
+@pytest.fixture
+def pbkdf2_context(monkeypatch):
+    ctx = CryptContext(schemes=["pbkdf2_sha256"], pbkdf2_sha256__default_rounds=ROUNDS, pbkdf2_sha256__min_rounds=ROUNDS)
+    monkeypatch.setattr(auth, "pwd_context", ctx)
+    monkeypatch.setattr(auth, "verify_password", ctx.verify)
+    monkeypatch.setattr(auth, "get_password_hash", ctx.hash)
+    monkeypatch.setattr(auth, "_rehash_unavailable", False)
+    return ctx
+
+
+def slow_hash(password: str) -> str:
+    time.sleep(0.2)
+    return f"testhash:{password}"
+
+
+@pytest.mark.anyio
+async def test_hashing_does_not_block_the_event_loop(monkeypatch):
+    monkeypatch.setattr(auth, "get_password_hash", slow_hash)
+    hasher = PasswordHasher(workers=2)
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            ticks += 1
+            await asyncio.sleep(0.01)
+
+    task = asyncio.ensure_future(ticker())
+    try:
+        assert await asyncio.gather(hasher.hash("a"), hasher.hash("b")) == ["testhash:a", "testhash:b"]
+    finally:
+        task.cancel()
+        hasher.shutdown()
+    assert ticks >= 10
+    assert hasher.stats()["completed"] == 2
+
+
+@pytest.mark.anyio
+async def test_pending_requests_are_bounded(monkeypatch):
+    monkeypatch.setattr(auth, "get_password_hash", slow_hash)
+    hasher = PasswordHasher(workers=1, max_pending=1)
+    try:
+        first = asyncio.ensure_future(hasher.hash("a"))
+        second = asyncio.ensure_future(hasher.hash("b"))
+        await asyncio.sleep(0.05)
+        assert (hasher.running, hasher.pending) == (1, 1)
+        with pytest.raises(PasswordHasherBusy):
+            await hasher.hash("c")
+        await asyncio.gather(first, second)
+    finally:
+        hasher.shutdown()
+    stats = hasher.stats()
+    assert (stats["completed"], stats["rejected"], stats["max_pending_seen"]) == (2, 1, 1)
+    assert stats["wait_seconds_max"] >= 0.1
+
+
+def test_verify_and_update_upgrades_outdated_hashes(pbkdf2_context):
+    outdated = pbkdf2_context.hash("pw", rounds=1000)
+    verified, new_hash = auth.verify_and_update_password("pw", outdated)
+    assert verified and new_hash and not auth.password_needs_rehash(new_hash)
+
+    assert auth.verify_and_update_password("pw", new_hash) == (True, None)
+    assert auth.verify_and_update_password("wrong", outdated) == (False, None)
+
+
+@pytest.mark.anyio
+async def test_login_rehashes_outdated_password(pbkdf2_context, async_client):
+    outdated = pbkdf2_context.hash("secret", rounds=1000)
+    async with db.SessionLocal() as session:
+        await session.execute(text('DELETE FROM "users" WHERE username = :u'), {"u": "rehash_user"})
+        await session.execute(text('INSERT INTO "users" (username, password_hash) VALUES (:u, :h)'), {"u": "rehash_user", "h": outdated})
+        await session.commit()
+    try:
+        r = await async_client.post("/api/v1/auth/login", data={"username": "rehash_user", "password": "secret"})
+        assert r.status_code == 200
+        async with db.SessionLocal() as session:
+            stored = (await session.execute(text('SELECT password_hash FROM "users" WHERE username = :u'), {"u": "rehash_user"})).scalar_one()
+        assert stored != outdated
+        assert pbkdf2_context.verify("secret", stored) and not auth.password_needs_rehash(stored)
+    finally:
+        async with db.SessionLocal() as session:
+            await session.execute(text('DELETE FROM "users" WHERE username = :u'), {"u": "rehash_user"})
+            await session.commit()
+
+
+@pytest.mark.anyio
+async def test_busy_hasher_returns_503(monkeypatch, async_client):
+    async def busy(plain, hashed):
+        raise PasswordHasherBusy("busy")
+
+    monkeypatch.setattr(password_service, "verify_and_update", busy)
+    r = await async_client.post("/api/v1/auth/login", data={"username": "demo", "password": "demo"})
+    assert r.status_code == 503
+    assert r.headers["retry-after"] == "1"
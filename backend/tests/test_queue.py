@@ -1,3 +1,4 @@
+import json
 from typing import Any, AsyncGenerator
 
 import pytest
@@ -6,6 +7,7 @@ from app import models
 from app import tasks as tasks_module
 from app.main import app
 from app.models import LLMResponse
+from app.services import kanji_index
 from httpx import ASGITransport, AsyncClient
 
 URL_PREFIX = "/api/v1"
@@ -30,6 +32,7 @@ async def test_analyze_enqueue_returns_job_id(monkeypatch: pytest.MonkeyPatch, l
         return FakePool()
 
     monkeypatch.setattr("app.services.job_service.create_pool", fake_create_pool)
+    monkeypatch.setattr("app.services.job_service._pool", None)
 
     class FakeAsyncSession:
         def __init__(self, existing_chars):
@@ -52,13 +55,13 @@ async def test_analyze_enqueue_returns_job_id(monkeypatch: pytest.MonkeyPatch, l
     async def fake_get_db() -> AsyncGenerator[Any, Any]:
         yield FakeAsyncSession(existing_chars={"山", "田", "太", "郎"})
 
-    app.dependency_overrides[db_module.get_db] = fake_get_db
+    app.dependency_overrides[db_module.get_read_db] = fake_get_db
     try:
         r = await logged_in_client.post(URL_PREFIX + "/analyze/enqueue", json={"name_sei": "太", "name_mei": "郎", "birth_date": "1990-01-01", "birth_hour": 12})
         assert r.status_code == 200
         assert r.json().get("job_id") == "fake-job-1"
     finally:
-        app.dependency_overrides.pop(db_module.get_db, None)
+        app.dependency_overrides.pop(db_module.get_read_db, None)
 
 
 @pytest.mark.anyio
@@ -72,6 +75,7 @@ async def test_get_job_status_returns_complete_and_result(monkeypatch: pytest.Mo
 
         async def result_info(self):
             class R:
+                success = True
                 result = {"id": 1, "name": "太 郎"}
 
             return R()
@@ -84,6 +88,7 @@ async def test_get_job_status_returns_complete_and_result(monkeypatch: pytest.Mo
         return P()
 
     monkeypatch.setattr("app.services.job_service.create_pool", fake_create_pool)
+    monkeypatch.setattr("app.services.job_service._pool", None)
     monkeypatch.setattr("app.services.job_service.Job", FakeJob)
 
     async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
@@ -95,6 +100,55 @@ async def test_get_job_status_returns_complete_and_result(monkeypatch: pytest.Mo
     assert body["result"] == {"id": 1, "name": "太 郎"}
 
 
+@pytest.mark.anyio
+async def test_get_job_status_reports_a_raised_job_as_failed(monkeypatch: pytest.MonkeyPatch) -> None:
+    from app.services import job_events
+    from app.services import job_service as job_service_module
+    from arq.jobs import JobStatus
+
+    class FailedJob:
+        def __init__(self, job_id, pool):
+            pass
+
+        async def status(self):
+            return JobStatus.complete  # arq: a result exists
+
+        async def result_info(self):
+            class R:
+                success = False
+                result = ValueError("bad date")
+
+            return R()
+
+    async def fake_get_pool(host="redis"):
+        return None
+
+    monkeypatch.setattr(job_service_module, "get_pool", fake_get_pool)
+    monkeypatch.setattr(job_service_module, "Job", FailedJob)
+
+    res = await job_service_module.JobService().get_job_status("job-1")
+    assert res == {"status": job_events.STATUS_FAILED, "result": {"error_type": "ValueError", "error": "bad date"}}
+
+
+@pytest.mark.anyio
+async def test_process_analysis_publishes_failed_on_any_error(fake_kanji_index) -> None:
+    from app.services import job_events
+
+    class FakeRedis:
+        def __init__(self):
+            self.events = []
+
+        async def publish(self, channel, message):
+            self.events.append(json.loads(message)["status"])
+            return 1
+
+    redis = FakeRedis()
+    # an invalid date fails before anything is saved
+    with pytest.raises(ValueError):
+        await tasks_module.process_analysis({"redis": redis, "job_id": "job-1"}, 1, "太", "郎", "1990-13-01", 12)
+    assert redis.events == ["JobStatus.in_progress", job_events.STATUS_FAILED]
+
+
 @pytest.fixture
 def fake_llm(monkeypatch: pytest.MonkeyPatch) -> None:
     class FakeLLMResponse:
@@ -184,10 +238,451 @@ def fake_session_local(monkeypatch: pytest.MonkeyPatch, fake_session: type) -> N
     monkeypatch.setattr(tasks_module.db, "SessionLocal", fake_sessionlocal)
 
 
+@pytest.fixture
+def fake_kanji_index():
+    kanji_index.set_index(kanji_index.KanjiStrokeIndex.from_rows([("太", 4, 4), ("郎", 9, 9)]))
+    yield
+    kanji_index.set_index(None)
+
+
 @pytest.mark.anyio
-async def test_process_analysis_creates_and_returns_id(fake_llm, fake_session_local) -> None:
+async def test_process_analysis_creates_and_returns_id(fake_llm, fake_session_local, fake_kanji_index) -> None:
     res = await tasks_module.process_analysis(1, {}, "太", "郎", "1990-01-01", 12)
 
     assert isinstance(res, dict)
     assert res.get("id") == 99999
     assert "name" in res
+
+
+@pytest.mark.anyio
+async def test_process_analysis_persists_then_enqueues_llm_stage(monkeypatch: pytest.MonkeyPatch, fake_session: type, fake_kanji_index) -> None:
+    sessions = []
+
+    def fake_sessionlocal():
+        sessions.append(fake_session())
+        return sessions[-1]
+
+    monkeypatch.setattr(tasks_module.db, "SessionLocal", fake_sessionlocal)
+
+    class FakeRedis:
+        def __init__(self):
+            self.enqueued = []
+
+        async def enqueue_job(self, function, *args, **kwargs):
+            self.enqueued.append((function, args, kwargs))
+
+            class J:
+                job_id = "enrich-1"
+
+            return J()
+
+        async def publish(self, channel, message):
+            return 0
+
+    redis = FakeRedis()
+    res = await tasks_module.process_analysis({"redis": redis, "job_id": "job-1"}, 1, "太", "郎", "1990-01-01", 12)
+
+    # 決定的な結果だけを保存し、LLM 段は LLM キューへ
+    assert res == {"id": 99999, "name": "太 郎", "enrich_job_id": "enrich-1"}
+    saved = sessions[0].added
+    assert saved.summary is None and saved.detail is None
+    assert saved.result_name["soukaku"] is not None
+    (function, args, kwargs) = redis.enqueued[0]
+    assert function == "app.tasks.enrich_analysis"
+    assert kwargs == {"_queue_name": tasks_module.LLM_QUEUE_NAME}
+    assert args[:2] == (99999, 1)
+
+
+@pytest.mark.anyio
+async def test_no_db_session_is_open_during_llm_calls(monkeypatch: pytest.MonkeyPatch, fake_session: type, fake_kanji_index) -> None:
+    open_sessions = []
+
+    class TrackedSession(fake_session):
+        async def __aenter__(self):
+            open_sessions.append(self)
+            return self
+
+        async def __aexit__(self, exc_type, exc, tb):
+            open_sessions.remove(self)
+            return False
+
+    seen_during_llm = []
+
+    class CheckingAdapter:
+        def __init__(self, provider, model):
+            pass
+
+        async def make_analysis(self, user_id, system_prompt, user_prompt, **kwargs):
+            seen_during_llm.append(len(open_sessions))
+            return LLMResponse(user_id=user_id, response_text="text")
+
+    monkeypatch.setattr(tasks_module.db, "SessionLocal", TrackedSession)
+    monkeypatch.setattr(tasks_module.litellm_adapter, "LiteLlmAdapter", CheckingAdapter)
+
+    await tasks_module.process_analysis(None, 1, "太", "郎", "1990-01-01", 12)
+    assert seen_during_llm == [0, 0]
+    assert open_sessions == []
+
+
+@pytest.mark.anyio
+async def test_enrich_analysis_retries_with_backoff(monkeypatch: pytest.MonkeyPatch, fake_session_local) -> None:
+    from arq.worker import Retry
+
+    class FailingAdapter:
+        def __init__(self, provider, model):
+            pass
+
+        async def make_analysis(self, **kwargs):
+            raise RuntimeError("provider down")
+
+    monkeypatch.setattr(tasks_module.litellm_adapter, "LiteLlmAdapter", FailingAdapter)
+    monkeypatch.setattr(tasks_module, "LLM_MAX_TRIES", 3)
+
+    with pytest.raises(Retry):
+        await tasks_module.enrich_analysis({"job_try": 2}, 1, 1, "detail", "summary")
+    # 最後の試行では失敗をそのまま返す
+    with pytest.raises(RuntimeError):
+        await tasks_module.enrich_analysis({"job_try": 3}, 1, 1, "detail", "summary")
+
+
+@pytest.mark.anyio
+async def test_enrich_retry_resets_the_llm_stream(monkeypatch: pytest.MonkeyPatch, fake_session_local) -> None:
+    from app.services import llm_stream
+    from arq.worker import Retry
+
+    class FakeStreamRedis:
+        def __init__(self):
+            self.entries: list[dict] = []
+
+        async def xadd(self, key, fields, maxlen=None, approximate=True):
+            self.entries.append(fields)
+
+        async def delete(self, key):
+            self.entries.clear()
+
+        async def expire(self, key, ttl):
+            pass
+
+        async def publish(self, channel, message):
+            return 0
+
+    attempt = {"n": 1}
+
+    class FlakyStreamingAdapter:
+        def __init__(self, provider, model):
+            self.part = "summary" if "lite" in model else "detail"
+
+        async def make_analysis(self, user_id, system_prompt, user_prompt, on_chunk=None):
+            await on_chunk(f"{self.part}-{attempt['n']}")
+            if self.part == "detail" and attempt["n"] == 1:
+                raise RuntimeError("stream cut")
+            return LLMResponse(user_id=user_id, response_text=self.part)
+
+    monkeypatch.setattr(tasks_module.litellm_adapter, "LiteLlmAdapter", FlakyStreamingAdapter)
+    monkeypatch.setattr(llm_stream, "LLM_STREAMING", True)
+    redis = FakeStreamRedis()
+
+    with pytest.raises(Retry):
+        await tasks_module.enrich_analysis({"job_try": 1, "redis": redis, "job_id": "enrich-1"}, 1, 1, "detail", "summary")
+    assert "detail-1" in [e.get("text") for e in redis.entries]
+
+    attempt["n"] = 2
+    await tasks_module.enrich_analysis({"job_try": 2, "redis": redis, "job_id": "enrich-1"}, 1, 1, "detail", "summary")
+    # the failed attempt's partial text is gone; clients see a reset before the retried chunks
+    assert redis.entries[0] == {"event": "reset", "attempt": "2"}
+    assert sorted(e["text"] for e in redis.entries[1:3]) == ["detail-2", "summary-2"]
+    assert redis.entries[3] == {"event": "end", "status": "complete"}
+    assert len(redis.entries) == 4
+
+
+@pytest.mark.anyio
+async def test_enrich_persists_partial_result_with_default_cancel_setting(monkeypatch: pytest.MonkeyPatch, fake_session: type) -> None:
+    import asyncio
+
+    class HalfFailingAdapter:
+        def __init__(self, provider, model):
+            self.model = model
+
+        async def make_analysis(self, user_id, system_prompt, user_prompt, **kwargs):
+            if "lite" in self.model:
+                await asyncio.sleep(0.05)  # the summary finishes after the detail has failed
+                return LLMResponse(user_id=user_id, response_text="summary")
+            raise RuntimeError("detail failed")
+
+    class Analysis:
+        summary = detail = None
+
+    analysis = Analysis()
+
+    class Session(fake_session):
+        async def get(self, model, key):
+            return analysis
+
+    monkeypatch.setattr(tasks_module.litellm_adapter, "LiteLlmAdapter", HalfFailingAdapter)
+    monkeypatch.setattr(tasks_module.db, "SessionLocal", Session)
+    monkeypatch.setattr(tasks_module, "LLM_CANCEL_ON_FAILURE", True)  # default
+    monkeypatch.setattr(tasks_module, "LLM_PERSIST_PARTIAL", True)
+
+    assert await tasks_module.enrich_analysis(None, 1, 1, "detail", "summary") == {"id": 1, "enriched": True}
+    assert (analysis.summary, analysis.detail) == ("summary", None)
+
+
+@pytest.mark.anyio
+async def test_run_llm_calls_is_concurrent_and_cancels_sibling() -> None:
+    import asyncio
+
+    started = []
+
+    async def ok(name, delay):
+        started.append(name)
+        await asyncio.sleep(delay)
+        return name
+
+    async def boom():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("fatal")
+
+    # both calls run concurrently
+    res = await tasks_module._run_llm_calls({"detail": (ok("detail", 0.05), None), "summary": (ok("summary", 0.05), None)}, cancel_on_failure=True, persist_partial=False)
+    assert res == {"detail": "detail", "summary": "summary"}
+
+    # a failure cancels the sibling and is raised
+    slow = ok("slow", 10)
+    with pytest.raises(RuntimeError):
+        await asyncio.wait_for(tasks_module._run_llm_calls({"detail": (slow, None), "summary": (boom(), None)}, cancel_on_failure=True, persist_partial=False), 1)
+
+    # partial persistence with the default cancel-on-failure: the sibling is not cancelled and its result is kept
+    res = await tasks_module._run_llm_calls({"detail": (boom(), None), "summary": (ok("summary", 0.05), None)}, cancel_on_failure=True, persist_partial=True)
+    assert res == {"detail": None, "summary": "summary"}
+
+    # partial persistence keeps the successful result, per-call timeout applies
+    res = await tasks_module._run_llm_calls({"detail": (ok("detail", 10), 0.01), "summary": (ok("summary", 0), None)}, cancel_on_failure=False, persist_partial=True)
+    assert res == {"detail": None, "summary": "summary"}
+
+
+@pytest.mark.anyio
+async def test_job_service_reuses_one_pool(monkeypatch: pytest.MonkeyPatch) -> None:
+    from app.services import job_service as job_service_module
+
+    created = []
+
+    class FakePool:
+        closed = False
+
+        async def enqueue_job(self, *args, **kwargs):
+            return type("J", (), {"job_id": "j"})()
+
+        async def aclose(self):
+            self.closed = True
+
+    async def fake_create_pool(*args, **kwargs):
+        created.append(FakePool())
+        return created[-1]
+
+    monkeypatch.setattr("app.services.job_service.create_pool", fake_create_pool)
+    monkeypatch.setattr("app.services.job_service._pool", None)
+
+    service = job_service_module.JobService()
+    for _ in range(3):
+        await service.enqueue_analysis(1, "太", "郎", "1990-01-01", 12)
+    assert len(created) == 1
+
+    await job_service_module.close_pool()
+    assert created[0].closed
+
+
+@pytest.mark.anyio
+async def test_request_pool_waits_for_connections_and_checks_health(monkeypatch: pytest.MonkeyPatch) -> None:
+    from app.services import job_service as job_service_module
+    from arq.connections import ArqRedis
+    from redis.asyncio import BlockingConnectionPool
+
+    async def fake_ping(self, **kwargs):
+        return True
+
+    monkeypatch.setattr(ArqRedis, "ping", fake_ping)
+    redis = await job_service_module.create_pool("redis", max_connections=3)
+    pool = redis.connection_pool
+    assert isinstance(pool, BlockingConnectionPool)
+    assert pool.max_connections == 3
+    assert pool.timeout == job_service_module.REDIS_POOL_TIMEOUT
+    assert pool.connection_kwargs["health_check_interval"] == job_service_module.REDIS_HEALTH_CHECK_INTERVAL
+    await redis.aclose()
+
+
+@pytest.mark.anyio
+async def test_long_lived_readers_use_their_own_pool(monkeypatch: pytest.MonkeyPatch) -> None:
+    from app.services import job_service as job_service_module
+
+    created: list[tuple[int, object]] = []
+
+    class FakePool:
+        closed = False
+
+        async def xread(self, streams, block=None, count=None):
+            return [(b"k", [(b"1-0", {b"event": b"end", b"status": b"complete"})])]
+
+        async def aclose(self):
+            self.closed = True
+
+    async def fake_create_pool(host="redis", max_connections=0):
+        created.append((max_connections, FakePool()))
+        return created[-1][1]
+
+    monkeypatch.setattr("app.services.job_service.create_pool", fake_create_pool)
+    monkeypatch.setattr("app.services.job_service._pool", None)
+    monkeypatch.setattr("app.services.job_service._stream_pool", None)
+
+    request_pool = await job_service_module.get_pool()
+    events = [e async for e in job_service_module.JobService().stream_events("job-1")]
+    assert events and events[-1].startswith("id: 1-0\nevent: end")
+    assert [n for n, _ in created] == [job_service_module.REDIS_MAX_CONNECTIONS, job_service_module.REDIS_STREAM_MAX_CONNECTIONS]
+    assert await job_service_module.get_stream_pool() is not request_pool
+
+    # a pool left over from another event loop is closed before it is replaced
+    monkeypatch.setattr("app.services.job_service._pool_loop", object())
+    assert await job_service_module.get_pool() is not request_pool
+    assert request_pool.closed
+
+    await job_service_module.close_pool()
+    assert all(p.closed for _, p in created)
+
+
+class FakeBatchPipeline:
+    """Buffers commands and runs them on execute()."""
+
+    def __init__(self, redis: "FakeBatchRedis"):
+        self.redis = redis
+        self.commands: list = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def psetex(self, key, ms, value):
+        self.commands.append(lambda: self.redis.store.__setitem__(key, value))
+
+    def set(self, key, value, ex=None):
+        self.commands.append(lambda: self.redis.store.__setitem__(key, value))
+
+    def zadd(self, name, mapping):
+        self.commands.append(lambda: self.redis.queues.setdefault(name, {}).update(mapping))
+
+    def get(self, key):
+        self.commands.append(lambda: self.redis.store.get(key))
+
+    def exists(self, key):
+        self.commands.append(lambda: int(key in self.redis.store))
+
+    def zscore(self, name, member):
+        self.commands.append(lambda: self.redis.queues.get(name, {}).get(member))
+
+    async def execute(self):
+        self.redis.executed += 1
+        return [command() for command in self.commands]
+
+
+class FakeBatchRedis:
+    """In-memory strings / sorted sets for the batch enqueue and status pipelines."""
+
+    default_queue_name = "arq:queue"
+    expires_extra_ms = 86_400_000
+    job_serializer = None
+    job_deserializer = None
+
+    def __init__(self):
+        self.store: dict[str, Any] = {}
+        self.queues: dict[str, dict[str, float]] = {}
+        self.executed = 0
+
+    def pipeline(self, transaction: bool = True) -> FakeBatchPipeline:
+        return FakeBatchPipeline(self)
+
+    async def get(self, key):
+        return self.store.get(key)
+
+    async def aclose(self):
+        pass
+
+
+@pytest.mark.anyio
+async def test_analyze_batch_enqueues_in_one_pipeline_and_reports_status(monkeypatch: pytest.MonkeyPatch, logged_in_client) -> None:
+    from app.services import job_service as job_service_module
+    from arq.jobs import deserialize_job, serialize_result
+
+    redis = FakeBatchRedis()
+
+    async def fake_create_pool(*args, **kwargs):
+        return redis
+
+    monkeypatch.setattr("app.services.job_service.create_pool", fake_create_pool)
+    monkeypatch.setattr("app.services.job_service._pool", None)
+    kanji_index.set_index(kanji_index.KanjiStrokeIndex.from_rows([("山", 3, 3), ("田", 5, 5), ("太", 4, 4), ("郎", 9, 9)]))
+    monkeypatch.setenv("KANJI_LOOKUP_BACKEND", "memory")
+    try:
+        items = [
+            {"name_sei": "山田", "name_mei": "太郎", "birth_date": "1990-01-01", "birth_hour": 12},
+            {"name_sei": "山", "name_mei": "太", "birth_date": "1991-02-03", "birth_hour": 5},
+            {"name_sei": "田", "name_mei": "郎", "birth_date": "1992-03-04", "birth_hour": 23},
+        ]
+        # JSON 配列
+        r = await logged_in_client.post(URL_PREFIX + "/analyze/batch", json=items)
+        assert r.status_code == 200
+        body = r.json()
+        assert len(body["job_ids"]) == 3
+        assert redis.executed == 1
+        job = deserialize_job(redis.store["arq:job:" + body["job_ids"][1]])
+        assert job.function == "app.tasks.process_analysis"
+        assert job.args[1:] == ("山", "太", "1991-02-03", 5, "Asia/Tokyo")
+        assert job.kwargs == {"kanji_strokes": {"山": (3, 3), "太": (4, 4)}}
+
+        # NDJSON でも同じように受け付ける
+        ndjson = "\n".join(json.dumps(item, ensure_ascii=False) for item in items[:2]) + "\n"
+        r = await logged_in_client.post(URL_PREFIX + "/analyze/batch", content=ndjson.encode(), headers={"content-type": "application/x-ndjson"})
+        assert r.status_code == 200
+        assert len(r.json()["job_ids"]) == 2
+
+        # 1 件でも未登録の文字があればバッチ全体を拒否する
+        bad = items + [{"name_sei": "鈴木", "name_mei": "太", "birth_date": "1990-01-01", "birth_hour": 1}]
+        r = await logged_in_client.post(URL_PREFIX + "/analyze/batch", json=bad)
+        assert r.status_code == 422
+        assert r.json()["detail"]["items"] == [3]
+
+        # 集計：1 件完了・1 件実行中・1 件待ち
+        done_id, running_id, queued_id = body["job_ids"]
+        stage1_result = {"id": 7, "name": "山田 太郎", "enrich_job_id": "enrich-7"}
+        redis.store["arq:result:" + done_id] = serialize_result("app.tasks.process_analysis", (), {}, 1, 0, True, stage1_result, 0, 0, "ref", "arq:queue", done_id)
+        redis.store["arq:in-progress:" + running_id] = b"1"
+        redis.queues[job_service_module.LLM_QUEUE_NAME] = {"enrich-7": 1.0}
+        batch_url = URL_PREFIX + f"/analyze/batch/{body['batch_id']}"
+        r = await logged_in_client.get(batch_url, params={"include_jobs": "true"})
+        assert r.status_code == 200
+        status = r.json()
+        assert status["total"] == 3
+        assert status["counts"] == {"queued": 1, "in_progress": 1, "complete": 1, "failed": 0, "not_found": 0}
+        assert status["enrich_counts"] == {"queued": 1, "in_progress": 0, "complete": 0, "failed": 0, "not_found": 0}
+        assert status["done"] is False
+        assert status["jobs"][0] == {"job_id": done_id, "status": "JobStatus.complete", "result": stage1_result, "enrich": {"job_id": "enrich-7", "status": "JobStatus.queued"}}
+        assert status["jobs"][1]["enrich"] is None
+
+        # 1 段目がすべて終わっても、LLM 段が待っている間は done にならない
+        for job_id in (running_id, queued_id):
+            redis.store["arq:result:" + job_id] = serialize_result("app.tasks.process_analysis", (), {}, 1, 0, False, RuntimeError("bad"), 0, 0, "ref", "arq:queue", job_id)
+        del redis.store["arq:in-progress:" + running_id]
+        status = (await logged_in_client.get(batch_url)).json()
+        assert status["counts"] == {"queued": 0, "in_progress": 0, "complete": 1, "failed": 2, "not_found": 0}
+        assert status["done"] is False
+
+        # LLM 段が最終的に失敗した時点で done
+        redis.queues[job_service_module.LLM_QUEUE_NAME] = {}
+        redis.store["arq:result:enrich-7"] = serialize_result("app.tasks.enrich_analysis", (), {}, 3, 0, False, RuntimeError("provider down"), 0, 0, "ref", "arq:queue:llm", "enrich-7")
+        status = (await logged_in_client.get(batch_url)).json()
+        assert status["enrich_counts"]["failed"] == 1
+        assert status["done"] is True
+
+        r = await logged_in_client.get(URL_PREFIX + "/analyze/batch/unknown")
+        assert r.status_code == 404
+    finally:
+        kanji_index.set_index(None)
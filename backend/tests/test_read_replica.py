@@ -0,0 +1,59 @@
+import os
+
+import pytest
+from app import db
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+
+# 2 台目の Postgres（レプリカ）があれば TEST_DATABASE_READ_URL で指定する。
+# 未指定なら同じサーバーを読み取り専用接続のレプリカとして使う。
+READ_URL = os.getenv("TEST_DATABASE_READ_URL") or db.DATABASE_URL
+
+
+@pytest.fixture
+async def replica(monkeypatch):
+    monkeypatch.setattr(db, "DATABASE_READ_URL", db._normalize_url(READ_URL))
+    db.read_pool_metrics.reset()
+    yield
+    if db._replica is not None:
+        await db._replica.dispose()
+    monkeypatch.setattr(db, "_replica", None)
+
+
+@pytest.mark.anyio
+async def test_read_sessions_use_the_read_only_replica(replica):
+    assert db.get_read_engine() is not db.get_engine()
+
+    async with db.ReadSessionLocal() as session:
+        assert (await session.execute(text("SELECT 1"))).scalar_one() == 1
+        with pytest.raises(DBAPIError, match="read-only"):
+            await session.execute(text("UPDATE users SET display_name = display_name WHERE false"))
+
+    # 書き込みはプライマリ
+    async with db.SessionLocal() as session:
+        await session.execute(text("UPDATE users SET display_name = display_name WHERE false"))
+        await session.commit()
+
+    stats = db.pool_stats()
+    assert stats["read"]["connections"]["checkouts"] == 1
+
+
+@pytest.mark.anyio
+async def test_only_lag_tolerant_reads_are_routed_to_the_replica(replica, logged_in_client):
+    before = db.read_pool_metrics.snapshot()["checkouts"]
+    r = await logged_in_client.get("/api/v1/analyses")
+    assert r.status_code == 200
+    assert db.read_pool_metrics.snapshot()["checkouts"] == before + 1
+
+    # read-your-own-write: the profile (after signup / confirm-email) and a just-finished analysis
+    r = await logged_in_client.get("/api/v1/auth/me")
+    assert r.status_code == 200
+    r = await logged_in_client.get("/api/v1/analyses/0")
+    assert r.status_code == 404
+    assert db.read_pool_metrics.snapshot()["checkouts"] == before + 1
+
+
+def test_without_replica_reads_use_the_primary(monkeypatch):
+    monkeypatch.setattr(db, "DATABASE_READ_URL", "")
+    assert db.get_read_engine() is db.get_engine()
+    assert "read" not in db.pool_stats()
@@ -0,0 +1,42 @@
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+from app.services import solar_terms
+
+JST = timezone(timedelta(hours=9))
+
+
+def test_term_instants_match_published_times():
+    # 国立天文台 暦要項（日本時間、分単位）
+    published = {
+        (2000, "春分"): datetime(2000, 3, 20, 16, 35, tzinfo=JST),
+        (2021, "立春"): datetime(2021, 2, 3, 23, 59, tzinfo=JST),
+        (2023, "冬至"): datetime(2023, 12, 22, 12, 27, tzinfo=JST),
+        (2024, "立春"): datetime(2024, 2, 4, 17, 27, tzinfo=JST),
+        (2024, "春分"): datetime(2024, 3, 20, 12, 6, tzinfo=JST),
+    }
+    for (year, name), dt in published.items():
+        instant = solar_terms.term_instant(year, solar_terms.TERM_NAMES.index(name))
+        assert abs(instant - dt.timestamp()) < 120, (year, name)
+
+
+def test_shipped_table_matches_algorithm():
+    table = solar_terms.get_table()
+    assert len(table) == (solar_terms.LAST_YEAR - solar_terms.FIRST_YEAR + 1) * 24
+    assert np.all(np.diff(table) > 0)
+    for year in (1900, 1984, 2100):
+        start = (year - solar_terms.FIRST_YEAR) * 24
+        assert table[start : start + 24].tolist() == solar_terms.build_table(year, year).tolist()
+
+
+def test_sekki_month_lookup():
+    lichun = datetime(2024, 2, 4, 17, 27, tzinfo=JST).timestamp()
+    assert solar_terms.sekki_month(lichun - 600) == (2023, 11)
+    assert solar_terms.sekki_month(lichun + 600) == (2024, 0)
+    assert solar_terms.term_at(lichun + 600) == (2024, "立春")
+    assert solar_terms.sekki_month(datetime(1899, 12, 31, tzinfo=JST).timestamp()) is None
+
+    ts = np.array([lichun - 600, lichun + 600, datetime(2101, 1, 1, tzinfo=JST).timestamp()])
+    years, months, valid = solar_terms.sekki_month_many(ts)
+    assert valid.tolist() == [True, True, False]
+    assert (years[:2].tolist(), months[:2].tolist()) == ([2023, 2024], [11, 0])
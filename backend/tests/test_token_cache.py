@@ -0,0 +1,70 @@
+from datetime import timedelta
+
+import pytest
+from app import auth
+from fastapi import HTTPException
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache(monkeypatch):
+    monkeypatch.setattr(auth, "token_cache", auth.TokenCache(maxsize=2))
+    yield auth.token_cache
+
+
+def test_repeated_tokens_are_served_from_the_cache(monkeypatch, fresh_cache):
+    token = auth.create_access_token("42")
+    assert auth.decode_token(token)["sub"] == "42"
+
+    def fail(token):
+        raise AssertionError("signature verified again")
+
+    monkeypatch.setattr(auth, "_verify_signature", fail)
+    payload = auth.decode_token(token)
+    assert payload["sub"] == "42"
+    # callers get their own copy
+    payload["sub"] = "other"
+    assert auth.decode_token(token)["sub"] == "42"
+    assert fresh_cache.stats() | {"backend": None} == {
+        "backend": None,
+        "size": 1,
+        "maxsize": 2,
+        "hits": 2,
+        "misses": 1,
+        "hit_rate": 0.6667,
+        "expired": 0,
+        "evictions": 0,
+    }
+
+
+def test_cached_token_expires_at_its_exp(monkeypatch, fresh_cache):
+    token = auth.create_access_token("42", expires_delta=timedelta(seconds=60))
+    auth.decode_token(token)
+    now = auth.time.time()
+    monkeypatch.setattr(auth.time, "time", lambda: now + 61)
+    with pytest.raises(HTTPException) as exc:
+        auth.decode_token(token)
+    assert exc.value.status_code == 401
+    assert fresh_cache.expired == 1 and len(fresh_cache) == 0
+
+
+def test_cache_is_bounded_and_rejects_are_not_cached(fresh_cache):
+    tokens = [auth.create_access_token(str(i)) for i in range(3)]
+    for token in tokens:
+        auth.decode_token(token)
+    assert len(fresh_cache) == 2 and fresh_cache.evictions == 1
+
+    with pytest.raises(HTTPException):
+        auth.decode_token(tokens[0] + "x")
+    with pytest.raises(HTTPException):
+        auth.decode_token(auth.create_access_token("1", expires_delta=timedelta(seconds=-1)))
+    assert len(fresh_cache) == 2
+
+
+@pytest.mark.parametrize("backend", ["jose", "pyjwt"])
+def test_backends_accept_the_same_tokens(monkeypatch, backend):
+    if backend == "pyjwt":
+        pytest.importorskip("jwt")
+    monkeypatch.setattr(auth, "jwt_backend", backend)
+    assert auth.decode_token(auth.create_refresh_token("7"))["type"] == "refresh"
+    with pytest.raises(HTTPException):
+        auth.decode_token(auth.jwt.encode({"sub": "7", "exp": "9999999999"}, "wrong-secret", algorithm=auth.ALGORITHM))
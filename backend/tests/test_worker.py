@@ -0,0 +1,186 @@
+import importlib
+import signal
+
+import pytest
+from app import worker, worker_settings
+
+
+class FakeProc:
+    def __init__(self, args, env=None):
+        self.args = args
+        self.env = env
+        self.returncode = None
+        self.signals: list[int] = []
+
+    def poll(self):
+        return self.returncode
+
+    def send_signal(self, signum):
+        self.signals.append(signum)
+        self.returncode = -signum
+
+
+@pytest.fixture
+def launcher(monkeypatch):
+    """Runs `worker.main()` against fake children; `state.on_sleep` drives them from the supervise loop."""
+
+    class State:
+        procs: list[FakeProc] = []
+        handlers: dict = {}
+        on_sleep = None
+        exit_immediately = False
+
+    state = State()
+
+    def fake_popen(args, env=None):
+        proc = FakeProc(args, env)
+        if state.exit_immediately:
+            proc.returncode = 0
+        state.procs.append(proc)
+        return proc
+
+    def fake_sleep(seconds):
+        if state.on_sleep is not None:
+            state.on_sleep(state)
+            state.on_sleep = None
+
+    monkeypatch.setattr(worker.subprocess, "Popen", fake_popen)
+    monkeypatch.setattr(worker.signal, "signal", lambda signum, handler: state.handlers.__setitem__(signum, handler))
+    monkeypatch.setattr(worker.time, "sleep", fake_sleep)
+    monkeypatch.setattr(worker.shutil, "which", lambda name: "/usr/bin/arq")
+    return state
+
+
+def test_process_count_parsing(monkeypatch):
+    monkeypatch.setattr(worker.os, "cpu_count", lambda: 6)
+    assert worker._process_count("3") == 3
+    assert worker._process_count(" Auto ") == 6
+    assert worker._process_count("0") == 1
+    assert worker._process_count("0", minimum=0) == 0
+    with pytest.raises(ValueError):
+        worker._process_count("many")
+
+
+@pytest.mark.parametrize(
+    ("processes", "llm_processes", "expected"),
+    [
+        ("3", "1", ["WorkerSettings"] * 3 + ["LlmWorkerSettings"]),
+        ("2", "0", ["WorkerSettings"] * 2),
+        ("0", "2", ["WorkerSettings"] + ["LlmWorkerSettings"] * 2),
+    ],
+)
+def test_main_starts_one_child_per_process(monkeypatch, launcher, processes, llm_processes, expected):
+    monkeypatch.setattr(worker, "WORKER_PROCESSES", processes)
+    monkeypatch.setattr(worker, "LLM_WORKER_PROCESSES", llm_processes)
+    launcher.exit_immediately = True
+
+    assert worker.main() == 0
+    assert [p.args for p in launcher.procs] == [["/usr/bin/arq", f"app.worker_settings.{name}"] for name in expected]
+    assert all(p.env is not None for p in launcher.procs)
+
+
+@pytest.mark.parametrize("signum", [signal.SIGTERM, signal.SIGINT])
+def test_main_forwards_signals_to_every_child(monkeypatch, launcher, signum):
+    monkeypatch.setattr(worker, "WORKER_PROCESSES", "2")
+    monkeypatch.setattr(worker, "LLM_WORKER_PROCESSES", "1")
+    launcher.on_sleep = lambda state: state.handlers[signum](signum, None)
+
+    # children stopped by the forwarded signal are not failures
+    assert worker.main() == 0
+    assert set(launcher.handlers) == {signal.SIGTERM, signal.SIGINT}
+    assert [p.signals for p in launcher.procs] == [[signum]] * 3
+
+
+def test_main_stops_the_others_and_fails_when_a_child_exits(monkeypatch, launcher):
+    monkeypatch.setattr(worker, "WORKER_PROCESSES", "2")
+    monkeypatch.setattr(worker, "LLM_WORKER_PROCESSES", "1")
+
+    def crash(state):
+        state.procs[1].returncode = 3
+
+    launcher.on_sleep = crash
+
+    assert worker.main() == 3
+    assert [p.signals for p in launcher.procs] == [[signal.SIGTERM], [], [signal.SIGTERM]]
+
+
+def test_main_reports_a_child_killed_before_shutdown(monkeypatch, launcher):
+    monkeypatch.setattr(worker, "WORKER_PROCESSES", "1")
+    monkeypatch.setattr(worker, "LLM_WORKER_PROCESSES", "1")
+
+    def killed(state):
+        state.procs[0].returncode = -signal.SIGKILL
+
+    launcher.on_sleep = killed
+
+    assert worker.main() == signal.SIGKILL
+
+
+@pytest.fixture
+def reload_settings(monkeypatch):
+    yield lambda: importlib.reload(worker_settings)
+    monkeypatch.undo()
+    importlib.reload(worker_settings)
+
+
+def test_worker_settings_read_the_environment(monkeypatch, reload_settings):
+    monkeypatch.setenv("WORKER_MAX_JOBS", "3")
+    monkeypatch.setenv("WORKER_JOB_TIMEOUT", "12.5")
+    monkeypatch.setenv("WORKER_KEEP_RESULT", "60")
+    monkeypatch.setenv("WORKER_POLL_DELAY", "0.1")
+    monkeypatch.setenv("WORKER_SHUTDOWN_WAIT", "7")
+    monkeypatch.setenv("LLM_WORKER_MAX_JOBS", "4")
+    monkeypatch.setenv("LLM_WORKER_JOB_TIMEOUT", "90")
+    monkeypatch.setenv("ARQ_REDIS_URL", "redis://cache:6380/2")
+    settings = reload_settings()
+
+    stage1 = settings.WorkerSettings
+    assert (stage1.max_jobs, stage1.job_timeout, stage1.keep_result, stage1.poll_delay) == (3, 12.5, 60.0, 0.1)
+    assert stage1.job_completion_wait == 7
+    assert stage1.functions == ["app.tasks.process_analysis"]
+
+    llm = settings.LlmWorkerSettings
+    assert (llm.max_jobs, llm.job_timeout, llm.keep_result, llm.job_completion_wait) == (4, 90.0, 60.0, 7)
+    assert llm.queue_name == worker_settings.tasks.LLM_QUEUE_NAME
+    assert llm.functions == ["app.tasks.enrich_analysis"]
+
+    for cls in (stage1, llm):
+        assert (cls.redis_settings.host, cls.redis_settings.port, cls.redis_settings.database) == ("cache", 6380, 2)
+
+
+def test_worker_settings_defaults(monkeypatch, reload_settings):
+    for name in ("WORKER_MAX_JOBS", "WORKER_JOB_TIMEOUT", "WORKER_SHUTDOWN_WAIT", "LLM_WORKER_MAX_JOBS", "ARQ_REDIS_URL"):
+        monkeypatch.delenv(name, raising=False)
+    settings = reload_settings()
+
+    assert (settings.WorkerSettings.max_jobs, settings.WorkerSettings.job_timeout, settings.WorkerSettings.job_completion_wait) == (10, 300.0, 25)
+    assert settings.LlmWorkerSettings.max_jobs == 10
+    assert settings.WorkerSettings.redis_settings.host == "redis"
+
+
+def test_stage1_is_not_retried(monkeypatch, reload_settings):
+    # a retry after the analysis row is inserted would add a second history row
+    monkeypatch.setenv("WORKER_MAX_TRIES", "5")
+    settings = reload_settings()
+
+    assert settings.WorkerSettings.max_tries == 1
+    assert settings.LlmWorkerSettings.max_tries == worker_settings.tasks.LLM_MAX_TRIES
+
+
+def test_shared_queue_runs_both_stages_in_one_process(monkeypatch, launcher, reload_settings):
+    # LLM_QUEUE_NAME=arq:queue (demo): no LLM worker processes, the stage-1 worker registers enrich_analysis too
+    monkeypatch.setattr(worker, "LLM_QUEUE_NAME", "arq:queue")
+    monkeypatch.setattr(worker, "WORKER_PROCESSES", "1")
+    monkeypatch.setattr(worker, "LLM_WORKER_PROCESSES", "1")
+    launcher.exit_immediately = True
+
+    assert worker.main() == 0
+    assert [p.args[1] for p in launcher.procs] == ["app.worker_settings.WorkerSettings"]
+
+    monkeypatch.setattr(worker_settings.tasks, "LLM_QUEUE_NAME", "arq:queue")
+    settings = reload_settings()
+    process_analysis, enrich = settings.WorkerSettings.functions
+    assert process_analysis == "app.tasks.process_analysis"
+    assert (enrich.name, enrich.max_tries) == ("app.tasks.enrich_analysis", worker_settings.tasks.LLM_MAX_TRIES)
+    # stage 1 itself is still tried once
+    assert settings.WorkerSettings.max_tries == 1
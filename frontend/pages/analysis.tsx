@@ -56,7 +56,7 @@ type AnalysisOut = {
     result_birth: BirthAnalysis
     result_name: NameAnalysis
     summary: string
-    detail: string
+    detail?: string
     created_at: string
 }
 
@@ -169,55 +169,22 @@ export default function Analysis(): JSX.Element {
             }
 
             const { job_id } = await enqueueRes.json()
-            // poll job status until complete (or timeout)
-            const apiBase = '/api/v1'
-            const timeoutMs = 300_000 // 5 minutes
-            const intervalMs = 5_000 // 5 seconds
-
+            // 1st stage: meishiki / gogyo / gogaku are saved within moments
             const start = Date.now()
-            let finalResult: any = null
-
-            while (Date.now() - start < timeoutMs) {
-                await new Promise((r) => setTimeout(r, intervalMs))
-                try {
-                    const st = await apiFetch(`${apiBase}/jobs/${job_id}`)
-                    if (!st.ok) {
-                        // continue polling on transient errors
-                        continue
-                    }
-                    const body = await st.json()
-                    // status may be like "JobStatus.complete" or "complete"
-                    const status = String(body.status)
-                    if (status.includes('complete')) {
-                        finalResult = body.result
-                        break
-                    }
-                } catch (e) {
-                    // ignore and continue polling
-                }
-            }
+            const finalResult = await waitForJob(job_id, start)
 
             // finalResultが空のオブジェクトだった場合もエラー扱いとする
             if (finalResult === null || (typeof finalResult === 'object' && Object.keys(finalResult).length === 0)) {
                 alert('鑑定中にエラーが発生しました。後でもう一度お試しください。')
             } else {
-                // refresh history and select + show the new record if available
-                const arr = await fetchHistory()
-                if (finalResult && finalResult.id && arr) {
-                    const id = Number(finalResult.id)
-                    const found = arr.find((h) => h.id === id)
-                    if (found) {
-                        // setSelected(found)
-                        setResult({
-                            birth_analysis: {
-                                meishiki: found.result_birth?.meishiki,
-                                gogyo: found.result_birth?.gogyo,
-                                summary: found.summary,
-                            },
-                            name_analysis: found.result_name,
-                            summary: found.summary || '',
-                            detail: found.detail || '',
-                        })
+                // show the structured results now, then the texts once the LLM stage finishes
+                await showAnalysis(finalResult)
+                if (finalResult.enrich_job_id) {
+                    const enriched = await waitForJob(finalResult.enrich_job_id, start)
+                    if (enriched === null) {
+                        alert('鑑定文の作成中にエラーが発生しました。後でもう一度お試しください。')
+                    } else {
+                        await showAnalysis(finalResult, true)
                     }
                 }
             }
@@ -229,9 +196,83 @@ export default function Analysis(): JSX.Element {
         }
     }
 
+    // long-poll a job's status until it finishes (or times out); returns its result or null on failure
+    // the server holds each request until the status changes (up to waitSec seconds)
+    async function waitForJob(jobId: string, start: number): Promise<any> {
+        const apiBase = '/api/v1'
+        const timeoutMs = 300_000 // 5 minutes
+        const waitSec = 25
+        const retryMs = 1_000 // pause after errors only
+
+        while (Date.now() - start < timeoutMs) {
+            try {
+                const st = await apiFetch(`${apiBase}/jobs/${jobId}?wait=${waitSec}`)
+                if (!st.ok) {
+                    // continue polling on transient errors
+                    await new Promise((r) => setTimeout(r, retryMs))
+                    continue
+                }
+                const body = await st.json()
+                // status may be like "JobStatus.complete" or "complete"
+                const status = String(body.status)
+                if (status.includes('complete')) {
+                    return body.result
+                }
+                if (status.includes('failed')) {
+                    return null
+                }
+            } catch (e) {
+                // ignore and continue polling
+                await new Promise((r) => setTimeout(r, retryMs))
+            }
+        }
+        return null
+    }
+
+    // refresh history and select + show the new record if available
+    // the history is read from a replica, so a just-saved record may appear a moment later
+    async function showAnalysis(jobResult: any, withText = false) {
+        if (!jobResult || !jobResult.id) return
+        const id = Number(jobResult.id)
+        let found: AnalysisOut | null = null
+        for (let attempt = 0; attempt < 5; attempt++) {
+            // the read replica may lag behind the worker's write for a moment
+            found = await fetchAnalysis(id)
+            if (found && (!withText || found.detail)) break
+            await new Promise((r) => setTimeout(r, 500))
+        }
+        fetchHistory()
+        if (found) {
+            // setSelected(found)
+            setResult({
+                birth_analysis: {
+                    meishiki: found.result_birth?.meishiki,
+                    gogyo: found.result_birth?.gogyo,
+                    summary: found.summary,
+                },
+                name_analysis: found.result_name,
+                summary: found.summary || '',
+                detail: found.detail || '',
+            })
+        }
+    }
+
+    async function fetchAnalysis(id: number): Promise<AnalysisOut | null> {
+        try {
+            const res = await apiFetch(`/api/v1/analyses/${id}`)
+            if (res.ok) return await res.json()
+        } catch (e) {
+            // ignore
+        }
+        return null
+    }
+
+    // the list skips the long detail text; it is loaded when an item is opened
+    const HISTORY_FIELDS = 'id,name,birth_date,birth_hour,birth_tz,result_birth,result_name,summary,created_at'
+
     async function fetchHistory(): Promise<AnalysisOut[] | null> {
         try {
-            const res = await apiFetch('/api/v1/analyses')
+            const res = await apiFetch(`/api/v1/analyses?fields=${HISTORY_FIELDS}`)
             if (res.status === 401) return null
             if (res.ok) {
                 const arr: AnalysisOut[] = await res.json()
@@ -244,6 +285,12 @@ export default function Analysis(): JSX.Element {
         return null
     }
 
+    async function openHistoryItem(h: AnalysisOut) {
+        setSelected(h)
+        const full = await fetchAnalysis(h.id)
+        if (full) setSelected((cur) => (cur?.id === h.id ? full : cur))
+    }
+
     async function deleteAnalysis(id: number) {
         if (!confirm('この鑑定を削除しますか？')) return
         try {
@@ -362,11 +409,11 @@ export default function Analysis(): JSX.Element {
                             <div
                                 key={h.id}
                                 className="history-item"
-                                onClick={() => setSelected(h)}
+                                onClick={() => openHistoryItem(h)}
                                 role="button"
                                 aria-haspopup="dialog"
                                 tabIndex={0}
-                                onKeyDown={(e) => { if (e.key === 'Enter' || e.key === ' ') setSelected(h) }}
+                                onKeyDown={(e) => { if (e.key === 'Enter' || e.key === ' ') openHistoryItem(h) }}
                             >
                                 <button
                                     className="history-delete"
@@ -408,7 +455,7 @@ export default function Analysis(): JSX.Element {
                         <FiveGridRadarChart analysis={selected.result_name} />
                     </div>
                     <div className="detail" style={{ marginTop: 50 }}>
-                        <TextWithBr text={selected.detail} />
+                        <TextWithBr text={selected.detail || ''} />
                     </div>
                 </Modal>
             )}